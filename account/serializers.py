@@ -1,5 +1,7 @@
 from django.contrib.auth import get_user_model
-from rest_framework.serializers import ModelSerializer
+from rest_framework.serializers import ModelSerializer, SerializerMethodField
+from orders.models import OrderStats
+from orders.serializers import OrderStatsSerializer
 
 CustomUser = get_user_model()
 
@@ -34,6 +36,12 @@ class RegisterUserSerializer(ModelSerializer):
 
 
 class UserProfileSerializer(ModelSerializer):
+    order_stats = SerializerMethodField()
+
+    def get_order_stats(self, user):
+        stats = getattr(user, "order_stats", None) or OrderStats(user=user)
+        return OrderStatsSerializer(stats).data
+
     class Meta:
         model = CustomUser
         fields = [
@@ -45,5 +53,6 @@ class UserProfileSerializer(ModelSerializer):
             "address",
             "profile_picture",
             "role",
+            "order_stats",
         ]
         read_only_fields = ["id", "email", "role"]
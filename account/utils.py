@@ -1,13 +1,13 @@
 from django.utils.http import urlsafe_base64_encode
 from django.contrib.auth.tokens import default_token_generator
 from django.contrib.sites.shortcuts import get_current_site
-from .tasks import send_email_task
+from outbox.relay import publish
 
 
 def send_welcome_email(user, request):
     subject = "به وب‌سایت SwiftOrder خوش آمدید!"
     message = f"سلام {user.first_name} عزیز،\n\nخوشحالیم که به خانواده SwiftOrder پیوسته‌اید. امیدواریم تجربه خوبی از استفاده از پلتفرم ما داشته باشید.\n\nبا احترام,\nتیم SwiftOrder"
-    send_email_task.delay(subject, message, [user.email])
+    publish("send_email_to_user", args=[subject, message, [user.email]])
 
 
 def send_verification_email(user, request):
@@ -18,7 +18,7 @@ def send_verification_email(user, request):
     subject = "Verify your email address"
     message = f"Click the link to verify your email: {link}"
 
-    send_email_task.delay(subject, message, [user.email])
+    publish("send_email_to_user", args=[subject, message, [user.email]])
 
 
 def send_password_reset_email(user, request):
@@ -44,4 +44,4 @@ def send_password_reset_email(user, request):
     تیم پشتیبانی
     """
 
-    send_email_task.delay(subject, message, [user.email])
+    publish("send_email_to_user", args=[subject, message, [user.email]])
@@ -11,6 +11,7 @@ from django.contrib.auth import get_user_model
 from django.utils.http import urlsafe_base64_decode
 from django.utils.encoding import force_str
 from django.shortcuts import get_object_or_404
+from django.db import transaction
 
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
@@ -49,10 +50,11 @@ class RegisterAPI(mixins.CreateModelMixin, generics.GenericAPIView):
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        user = self.perform_create(serializer)
-
-        send_welcome_email(user, request)
-        send_verification_email(user, request)
+        # The emails go through the outbox, so they commit with the user.
+        with transaction.atomic():
+            user = self.perform_create(serializer)
+            send_welcome_email(user, request)
+            send_verification_email(user, request)
 
         headers = self.get_success_headers(serializer.data)
         return Response(
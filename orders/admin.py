@@ -1,5 +1,9 @@
 from django.contrib import admin
-from .models import Order, OrderItem, Cart, CartItem
+from django.db.models import Q
+from django.http import QueryDict
+from .models import ArchivedOrder, Order, OrderItem, OrderStats, Cart, CartItem, CheckoutJob
+from .services import transition_orders
+from .sharding import is_sharded, order_shards
 
 
 class OrderItemInline(admin.TabularInline):
@@ -8,20 +12,124 @@ class OrderItemInline(admin.TabularInline):
     readonly_fields = ('order_item_price', 'quantity')
 
 
+class ShardListFilter(admin.SimpleListFilter):
+    """Picks the order shard to browse; ShardedModelAdmin applies it."""
+
+    title = 'shard'
+    parameter_name = 'shard'
+
+    def lookups(self, request, model_admin):
+        return [(shard, shard) for shard in order_shards()]
+
+    def has_output(self):
+        return len(self.lookup_choices) > 1
+
+    def queryset(self, request, queryset):
+        return queryset
+
+    def choices(self, changelist):
+        current = self.value() or order_shards()[0]
+        for shard, title in self.lookup_choices:
+            yield {
+                'selected': shard == current,
+                'query_string': changelist.get_query_string({self.parameter_name: shard}),
+                'display': title,
+            }
+
+
+class ShardedModelAdmin(admin.ModelAdmin):
+    """
+    Admin for a model on the order shards, browsed one shard at a time.
+
+    Relations to models on ``default`` can't be joined from another shard,
+    so they are prefetched per page (``list_prefetch_related``) and searched
+    by looking up matching ids on ``default`` first.
+    """
+
+    list_select_related = ()
+    list_prefetch_related = ()
+
+    def get_shard(self, request):
+        # Change and delete pages keep the changelist filters in
+        # _changelist_filters, so object ids resolve on the shard browsed.
+        filters = QueryDict(request.GET.get('_changelist_filters', ''))
+        shard = request.GET.get('shard') or filters.get('shard')
+        return shard if shard in order_shards() else order_shards()[0]
+
+    def get_queryset(self, request):
+        return (
+            super().get_queryset(request)
+            .using(self.get_shard(request))
+            .prefetch_related(*self.list_prefetch_related)
+        )
+
+    def get_formset_kwargs(self, request, obj, inline, prefix):
+        kwargs = super().get_formset_kwargs(request, obj, inline, prefix)
+        kwargs['queryset'] = inline.get_queryset(request).using(self.get_shard(request))
+        return kwargs
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        query = Q()
+        for path in self.search_fields:
+            name, _, rest = path.partition('__')
+            field = self.model._meta.get_field(name)
+            if rest and field.is_relation and not is_sharded(field.related_model):
+                ids = field.related_model._base_manager.filter(
+                    **{f'{rest}__icontains': search_term}
+                ).values_list('pk', flat=True)
+                query |= Q(**{f'{field.attname}__in': list(ids[:1000])})
+            else:
+                query |= Q(**{f'{path}__icontains': search_term})
+        return queryset.filter(query), False
+
+
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(ShardedModelAdmin):
     list_display = ('user', 'tracking_code', 'payment_status', 'total_price', 'created_at')
-    list_filter = ('payment_status', 'created_at')
+    list_filter = (ShardListFilter, 'payment_status', 'created_at')
     search_fields = ('user__username', 'tracking_code')
-    readonly_fields = ('created_at', 'tracking_code', 'token')
+    # Status changes go through the actions, which keep stock, stats and
+    # rollups in step.
+    readonly_fields = ('payment_status', 'created_at', 'tracking_code', 'token')
+    list_prefetch_related = ('user',)
     inlines = [OrderItemInline]
+    actions = ('mark_complete', 'mark_failed')
+
+    def transition(self, request, queryset, to_status):
+        results = transition_orders(
+            queryset.values_list('id', flat=True), to_status, using=queryset.db
+        )
+        updated = sum(result == 'updated' for result in results.values())
+        skipped = len(results) - updated
+        self.message_user(request, f'{updated} orders updated, {skipped} skipped.')
+
+    @admin.action(description='Mark selected orders as completed')
+    def mark_complete(self, request, queryset):
+        self.transition(request, queryset, Order.PAYMENT_STATUS_COMPLETE)
+
+    @admin.action(description='Mark selected orders as failed')
+    def mark_failed(self, request, queryset):
+        self.transition(request, queryset, Order.PAYMENT_STATUS_FAILED)
 
 
 @admin.register(OrderItem)
-class OrderItemAdmin(admin.ModelAdmin):
+class OrderItemAdmin(ShardedModelAdmin):
     list_display = ('order', 'product', 'order_item_price', 'quantity')
-    list_filter = ('order', 'product')
+    list_filter = (ShardListFilter, 'order__payment_status')
+    list_prefetch_related = ('order__user__order_stats', 'product')
     search_fields = ('order__tracking_code', 'product__name')
+    raw_id_fields = ('order', 'product')
+
+
+@admin.register(OrderStats)
+class OrderStatsAdmin(ShardedModelAdmin):
+    list_display = ('user', 'order_count', 'total_spent', 'last_order_at')
+    list_filter = (ShardListFilter,)
+    list_prefetch_related = ('user',)
+    search_fields = ('user__username',)
+    readonly_fields = ('user', 'order_count', 'total_spent', 'last_order_at')
 
 
 @admin.register(Cart)
@@ -34,4 +142,28 @@ class CartAdmin(admin.ModelAdmin):
 class CartItemAdmin(admin.ModelAdmin):
     list_display = ('cart', 'product', 'quantity')
     list_filter = ('cart', 'product')
-    search_fields = ('cart__id', 'product__name')
\ No newline at end of file
+    search_fields = ('cart__id', 'product__name')
+
+
+@admin.register(CheckoutJob)
+class CheckoutJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'status', 'order', 'created_at', 'processed_at')
+    list_filter = ('status',)
+    readonly_fields = ('id', 'user', 'cart_id', 'order', 'error', 'created_at', 'processed_at')
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(ShardedModelAdmin):
+    list_display = ('id', 'user', 'tracking_code', 'payment_status', 'total_price', 'created_at')
+    list_filter = (ShardListFilter, 'payment_status')
+    list_prefetch_related = ('user',)
+    search_fields = ('tracking_code',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
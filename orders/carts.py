@@ -0,0 +1,611 @@
+"""
+Cart storage backends.
+
+Views, serializers and checkout talk to carts through ``get_cart_store()``
+so carts can live either in the database (``ORMCartStore``, the default) or
+in Redis hashes (``RedisCartStore``) selected by ``CART_STORE_BACKEND``.
+Both return ``Cart``/``CartItem`` instances with products attached, so the
+cart serializers render them the same way.
+"""
+import time
+from abc import ABC, abstractmethod
+from functools import lru_cache, partial
+from uuid import UUID, uuid4
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F, Prefetch, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from products.models import Product
+from .models import Cart, CartItem
+
+# Cart lines store their quantity in a smallint column.
+MAX_CART_QUANTITY = 32767
+
+
+class CartNotFound(Exception):
+    pass
+
+
+class CartQuantityError(Exception):
+    def __init__(self, detail):
+        self.detail = detail
+        super().__init__(detail)
+
+
+def parse_cart_id(cart_id):
+    try:
+        return cart_id if isinstance(cart_id, UUID) else UUID(str(cart_id))
+    except ValueError:
+        return None
+
+
+def cart_version(cart_id):
+    """
+    Return the cache token for the current state of a cart.
+
+    The token changes whenever the cart changes (see ``bump_cart_version``)
+    and keys both the cached representation and the response ETag.
+    """
+    key = f"cart-version:{cart_id}"
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid4().hex, settings.CART_CACHE_TTL)
+        version = cache.get(key)
+    return version
+
+
+def bump_cart_version(cart_id):
+    cache.set(f"cart-version:{cart_id}", uuid4().hex, settings.CART_CACHE_TTL)
+
+
+def forget_cart_versions(cart_ids):
+    # A missing version is replaced by a fresh one on the next read, so this
+    # retires every cached representation of the carts in one round trip.
+    cache.delete_many([f"cart-version:{cart_id}" for cart_id in cart_ids])
+
+
+class CartClaimed(Exception):
+    """Another checkout holds the cart."""
+
+
+class CartStore(ABC):
+    def changed(self, cart_id):
+        # Readers that commit in between cache the old state under the old
+        # version, so only switch versions once the change is visible.
+        transaction.on_commit(lambda: bump_cart_version(parse_cart_id(cart_id)))
+
+    @abstractmethod
+    def create_cart(self):
+        ...
+
+    @abstractmethod
+    def exists(self, cart_id):
+        ...
+
+    @abstractmethod
+    def get_cart(self, cart_id):
+        """Return the cart with its items prefetched, or None."""
+
+    @abstractmethod
+    def delete_cart(self, cart_id):
+        ...
+
+    @abstractmethod
+    def has_items(self, cart_id):
+        ...
+
+    @abstractmethod
+    def get_items(self, cart_id):
+        """Return the cart's items with products, ordered by product id."""
+
+    @abstractmethod
+    def get_item(self, cart_id, item_id):
+        ...
+
+    @abstractmethod
+    def add_item(self, cart_id, product_id, quantity):
+        """Add ``quantity`` of a product, merging with an existing line."""
+
+    @abstractmethod
+    def set_quantity(self, cart_id, item_id, quantity):
+        ...
+
+    @abstractmethod
+    def set_items(self, cart_id, quantities):
+        """
+        Set the quantity of many products at once from ``{product_id: quantity}``;
+        a quantity of 0 removes the line. Stock is checked by the caller.
+        """
+
+    @abstractmethod
+    def remove_item(self, cart_id, item_id):
+        ...
+
+    @abstractmethod
+    def claim(self, cart_id):
+        """
+        Take the cart's lines for checkout in the current transaction and
+        return them like ``get_items``. The claimed lines are removed when
+        the transaction commits; lines added meanwhile stay in the cart.
+        Raises CartNotFound, or CartClaimed while another checkout holds
+        the cart. Call ``release_claim`` if the transaction rolls back.
+        """
+
+    def release_claim(self, cart_id):
+        """Give up a claim whose transaction rolled back."""
+
+    def held_stock(self, cart_id, product_ids):
+        """Return ``{product_id: units}`` held for carts other than this one."""
+        return {}
+
+
+class ORMCartStore(CartStore):
+    def items_queryset(self, cart_id):
+        return (
+            CartItem.objects.filter(cart_id=cart_id)
+            .select_related("product")
+            .annotate(line_total=F("quantity") * F("product__price"))
+            .order_by("product_id")
+        )
+
+    def create_cart(self):
+        return Cart.objects.create()
+
+    def touch(self, cart_id):
+        """Mark the cart changed; returns False if it doesn't exist."""
+        touched = Cart.objects.filter(pk=cart_id).update(last_update=timezone.now())
+        self.changed(cart_id)
+        return touched > 0
+
+    def exists(self, cart_id):
+        cart_id = parse_cart_id(cart_id)
+        return bool(cart_id) and Cart.objects.filter(pk=cart_id).exists()
+
+    def get_cart(self, cart_id):
+        cart_id = parse_cart_id(cart_id)
+        if not cart_id:
+            return None
+        return (
+            Cart.objects.annotate(
+                total_price=Coalesce(
+                    Sum(F("items__quantity") * F("items__product__price")), 0
+                )
+            )
+            .prefetch_related(Prefetch("items", queryset=self.items_queryset(cart_id)))
+            .filter(pk=cart_id)
+            .first()
+        )
+
+    def delete_cart(self, cart_id):
+        cart_id = parse_cart_id(cart_id)
+        if not cart_id:
+            return False
+        self.changed(cart_id)
+        return Cart.objects.filter(pk=cart_id).delete()[0] > 0
+
+    def has_items(self, cart_id):
+        cart_id = parse_cart_id(cart_id)
+        return bool(cart_id) and CartItem.objects.filter(cart_id=cart_id).exists()
+
+    def get_items(self, cart_id):
+        cart_id = parse_cart_id(cart_id)
+        return list(self.items_queryset(cart_id)) if cart_id else []
+
+    def get_item(self, cart_id, item_id):
+        cart_id = parse_cart_id(cart_id)
+        if not cart_id or not str(item_id).isdigit():
+            return None
+        return self.items_queryset(cart_id).filter(pk=item_id).first()
+
+    def add_item(self, cart_id, product_id, quantity):
+        """
+        Insert the line or add to its quantity in a single statement.
+
+        The stock guard is part of the same upsert, so concurrent adds to one
+        line serialize on its row and can neither lose increments nor push
+        the quantity past the product's stock.
+        """
+        cart_id = parse_cart_id(cart_id)
+        if not cart_id:
+            raise CartNotFound
+        table = connection.ops.quote_name(CartItem._meta.db_table)
+        carts = connection.ops.quote_name(Cart._meta.db_table)
+        products = connection.ops.quote_name(Product._meta.db_table)
+        least = "MIN" if connection.vendor == "sqlite" else "LEAST"
+        with transaction.atomic(), connection.cursor() as cursor:
+            # The update locks the cart row until commit, so the cart can't
+            # be deleted between this check and the insert below.
+            if not self.touch(cart_id):
+                raise CartNotFound
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (cart_id, product_id, quantity)
+                SELECT c.id, p.id, %s FROM {carts} c, {products} p
+                WHERE c.id = %s AND p.id = %s AND p.stock >= %s
+                ON CONFLICT (cart_id, product_id) DO UPDATE SET
+                    quantity = {table}.quantity + EXCLUDED.quantity
+                WHERE {table}.quantity + EXCLUDED.quantity <= (
+                    SELECT {least}(stock, %s) FROM {products}
+                    WHERE id = EXCLUDED.product_id
+                )
+                RETURNING id, quantity
+                """,
+                [
+                    quantity,
+                    Cart._meta.pk.get_db_prep_value(cart_id, connection),
+                    product_id,
+                    quantity,
+                    MAX_CART_QUANTITY,
+                ],
+            )
+            row = cursor.fetchone()
+        if row is None:
+            raise CartQuantityError(
+                "The selected quantity exceeds the available inventory."
+            )
+        return CartItem(
+            id=row[0], cart_id=cart_id, product_id=product_id, quantity=row[1]
+        )
+
+    def set_quantity(self, cart_id, item_id, quantity):
+        item = self.get_item(cart_id, item_id)
+        if item is None:
+            raise CartNotFound
+        if item.product.stock < quantity:
+            raise CartQuantityError(
+                f"Only {item.product.stock} of this product are available."
+            )
+        with transaction.atomic():
+            self.touch(cart_id)
+            item.quantity = quantity
+            item.save(update_fields=["quantity"])
+        return item
+
+    def set_items(self, cart_id, quantities):
+        if not self.exists(cart_id):
+            raise CartNotFound
+        with transaction.atomic():
+            self.touch(cart_id)
+            CartItem.objects.bulk_create(
+                [
+                    CartItem(cart_id=cart_id, product_id=product_id, quantity=quantity)
+                    for product_id, quantity in quantities.items()
+                    if quantity
+                ],
+                update_conflicts=True,
+                unique_fields=["cart", "product"],
+                update_fields=["quantity"],
+            )
+            removed = [
+                product_id for product_id, quantity in quantities.items() if not quantity
+            ]
+            if removed:
+                CartItem.objects.filter(cart_id=cart_id, product_id__in=removed).delete()
+
+    def remove_item(self, cart_id, item_id):
+        item = self.get_item(cart_id, item_id)
+        if item is None:
+            return False
+        with transaction.atomic():
+            self.touch(cart_id)
+            item.delete()
+        return True
+
+    def claim(self, cart_id):
+        # The row lock makes a second checkout, and any cart change, wait
+        # until this transaction ends; by then the lines are gone.
+        cart_id = parse_cart_id(cart_id)
+        if not cart_id or not Cart.objects.select_for_update().filter(pk=cart_id).exists():
+            raise CartNotFound
+        items = self.get_items(cart_id)
+        if items:
+            deleted = CartItem.objects.filter(pk__in=[item.pk for item in items]).delete()
+            if deleted[0] != len(items):
+                raise CartClaimed
+            self.changed(cart_id)
+        return items
+
+
+# KEYS[1] = cart hash; ARGV = field, quantity, stock, ttl
+ADD_ITEM_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return -1 end
+local quantity = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0') + tonumber(ARGV[2])
+if quantity > tonumber(ARGV[3]) then return -2 end
+redis.call('HSET', KEYS[1], ARGV[1], quantity)
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return quantity
+"""
+
+# KEYS[1] = cart hash; ARGV = field, quantity, ttl
+SET_QUANTITY_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 0 then return -1 end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return tonumber(ARGV[2])
+"""
+
+# KEYS[1] = cart hash; ARGV = ttl, then field/quantity pairs (0 removes)
+SET_ITEMS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return -1 end
+for i = 2, #ARGV, 2 do
+    if tonumber(ARGV[i + 1]) > 0 then
+        redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+    else
+        redis.call('HDEL', KEYS[1], ARGV[i])
+    end
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+# KEYS[1] = cart hash; ARGV = field, ttl
+REMOVE_ITEM_SCRIPT = """
+local removed = redis.call('HDEL', KEYS[1], ARGV[1])
+if removed == 1 then redis.call('EXPIRE', KEYS[1], ARGV[2]) end
+return removed
+"""
+
+# KEYS[1] = cart hash; ARGV = now, claim timeout
+# Returns -1 for a missing cart, -2 while another live claim holds it,
+# otherwise the field/quantity pairs of the claimed lines.
+CLAIM_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return -1 end
+local claimed = tonumber(redis.call('HGET', KEYS[1], 'checkout') or '0')
+if claimed > tonumber(ARGV[1]) - tonumber(ARGV[2]) then return -2 end
+redis.call('HSET', KEYS[1], 'checkout', ARGV[1])
+local lines = {}
+local fields = redis.call('HGETALL', KEYS[1])
+for i = 1, #fields, 2 do
+    if string.sub(fields[i], 1, 2) == 'p:' then
+        table.insert(lines, fields[i])
+        table.insert(lines, fields[i + 1])
+    end
+end
+return lines
+"""
+
+# KEYS[1] = cart hash; ARGV = field/quantity pairs claimed by the checkout
+# Subtracts what was checked out, so lines added meanwhile survive.
+FINISH_CLAIM_SCRIPT = """
+for i = 1, #ARGV, 2 do
+    local left = tonumber(redis.call('HGET', KEYS[1], ARGV[i]) or '0') - tonumber(ARGV[i + 1])
+    if left > 0 then
+        redis.call('HSET', KEYS[1], ARGV[i], left)
+    else
+        redis.call('HDEL', KEYS[1], ARGV[i])
+    end
+end
+redis.call('HDEL', KEYS[1], 'checkout')
+return 1
+"""
+
+
+class RedisCartStore(CartStore):
+    """
+    Carts as Redis hashes: ``cart:<uuid>`` maps ``p:<product_id>`` fields to
+    quantities plus a ``created`` marker, and expires after
+    ``CART_REDIS_TTL`` seconds without changes. Item ids are product ids.
+    Mutations run as Lua scripts so concurrent requests can't lose updates.
+    A checkout marks the cart with a ``checkout`` field while it runs; marks
+    older than ``claim_timeout`` seconds are left by a crashed worker and
+    can be taken over.
+    """
+
+    claim_timeout = 60
+
+    def __init__(self, client=None):
+        from swiftorder.redis_client import get_redis
+
+        self.redis = client or get_redis(settings.CART_REDIS_URL)
+        self.ttl = settings.CART_REDIS_TTL
+        self.add_script = self.redis.register_script(ADD_ITEM_SCRIPT)
+        self.set_script = self.redis.register_script(SET_QUANTITY_SCRIPT)
+        self.set_items_script = self.redis.register_script(SET_ITEMS_SCRIPT)
+        self.remove_script = self.redis.register_script(REMOVE_ITEM_SCRIPT)
+        self.claim_script = self.redis.register_script(CLAIM_SCRIPT)
+        self.finish_claim_script = self.redis.register_script(FINISH_CLAIM_SCRIPT)
+
+    def key(self, cart_id):
+        return f"cart:{cart_id}"
+
+    def build_items(self, cart_id, fields):
+        quantities = {
+            int(field[2:]): int(value)
+            for field, value in fields.items()
+            if field.startswith("p:")
+        }
+        products = Product.objects.in_bulk(quantities)
+        return [
+            CartItem(
+                id=product_id,
+                cart_id=cart_id,
+                product=products[product_id],
+                quantity=quantities[product_id],
+            )
+            for product_id in sorted(quantities)
+            if product_id in products
+        ]
+
+    def create_cart(self):
+        cart = Cart(id=uuid4())
+        self.redis.hset(self.key(cart.id), "created", int(time.time()))
+        self.redis.expire(self.key(cart.id), self.ttl)
+        cart._prefetched_objects_cache = {"items": []}
+        return cart
+
+    def exists(self, cart_id):
+        cart_id = parse_cart_id(cart_id)
+        return bool(cart_id) and bool(self.redis.exists(self.key(cart_id)))
+
+    def get_cart(self, cart_id):
+        cart_id = parse_cart_id(cart_id)
+        fields = self.redis.hgetall(self.key(cart_id)) if cart_id else {}
+        if not fields:
+            return None
+        cart = Cart(id=cart_id)
+        cart._prefetched_objects_cache = {"items": self.build_items(cart_id, fields)}
+        return cart
+
+    def delete_cart(self, cart_id):
+        cart_id = parse_cart_id(cart_id)
+        if not cart_id:
+            return False
+        self.changed(cart_id)
+        return bool(self.redis.delete(self.key(cart_id)))
+
+    def has_items(self, cart_id):
+        # Besides its item fields a cart hash holds a "created" field and,
+        # during checkout, a "checkout" field.
+        cart_id = parse_cart_id(cart_id)
+        return bool(cart_id) and any(
+            field.startswith("p:") for field in self.redis.hkeys(self.key(cart_id))
+        )
+
+    def get_items(self, cart_id):
+        cart_id = parse_cart_id(cart_id)
+        if not cart_id:
+            return []
+        return self.build_items(cart_id, self.redis.hgetall(self.key(cart_id)))
+
+    def get_item(self, cart_id, item_id):
+        cart_id = parse_cart_id(cart_id)
+        if not cart_id or not str(item_id).isdigit():
+            return None
+        quantity = self.redis.hget(self.key(cart_id), f"p:{item_id}")
+        if quantity is None:
+            return None
+        return self.build_items(cart_id, {f"p:{item_id}": quantity})[0]
+
+    def add_item(self, cart_id, product_id, quantity):
+        product = Product.objects.get(pk=product_id)
+        result = self.add_script(
+            keys=[self.key(cart_id)],
+            args=[
+                f"p:{product_id}",
+                quantity,
+                min(product.stock, MAX_CART_QUANTITY),
+                self.ttl,
+            ],
+        )
+        if result == -1:
+            raise CartNotFound
+        if result == -2:
+            raise CartQuantityError(
+                "The selected quantity exceeds the available inventory."
+            )
+        self.changed(cart_id)
+        return CartItem(id=product_id, cart_id=cart_id, product=product, quantity=result)
+
+    def set_quantity(self, cart_id, item_id, quantity):
+        item = self.get_item(cart_id, item_id)
+        if item is None:
+            raise CartNotFound
+        if item.product.stock < quantity:
+            raise CartQuantityError(
+                f"Only {item.product.stock} of this product are available."
+            )
+        if self.set_script(keys=[self.key(cart_id)], args=[f"p:{item_id}", quantity, self.ttl]) == -1:
+            raise CartNotFound
+        self.changed(cart_id)
+        item.quantity = quantity
+        return item
+
+    def set_items(self, cart_id, quantities):
+        args = [self.ttl]
+        for product_id, quantity in quantities.items():
+            args += [f"p:{product_id}", quantity]
+        if not parse_cart_id(cart_id) or self.set_items_script(
+            keys=[self.key(cart_id)], args=args
+        ) == -1:
+            raise CartNotFound
+        self.changed(cart_id)
+
+    def remove_item(self, cart_id, item_id):
+        if not parse_cart_id(cart_id):
+            return False
+        removed = self.remove_script(
+            keys=[self.key(cart_id)], args=[f"p:{item_id}", self.ttl]
+        )
+        if removed:
+            self.changed(cart_id)
+        return bool(removed)
+
+    def claim(self, cart_id):
+        cart_id = parse_cart_id(cart_id)
+        if not cart_id:
+            raise CartNotFound
+        lines = self.claim_script(
+            keys=[self.key(cart_id)], args=[int(time.time()), self.claim_timeout]
+        )
+        if lines == -1:
+            raise CartNotFound
+        if lines == -2:
+            raise CartClaimed
+        transaction.on_commit(
+            partial(self.finish_claim_script, keys=[self.key(cart_id)], args=lines)
+        )
+        self.changed(cart_id)
+        return self.build_items(cart_id, dict(zip(lines[::2], lines[1::2])))
+
+    def release_claim(self, cart_id):
+        cart_id = parse_cart_id(cart_id)
+        if cart_id:
+            self.redis.hdel(self.key(cart_id), "checkout")
+
+
+CART_STORE_ALIASES = {
+    "orm": "orders.carts.ORMCartStore",
+    "redis": "orders.carts.RedisCartStore",
+}
+
+
+@lru_cache(maxsize=None)
+def get_cart_store(path=None):
+    path = path or settings.CART_STORE_BACKEND
+    store = import_string(CART_STORE_ALIASES.get(path, path))()
+    if settings.CART_RESERVATIONS:
+        from .reservations import ReservingCartStore
+
+        store = ReservingCartStore(store)
+    return store
+
+
+def purge_abandoned_carts(older_than, chunk_size=1000, pause=0.5):
+    """
+    Delete database carts (and their items) not changed for ``older_than``.
+
+    Carts are removed in primary-key order, ``chunk_size`` at a time, each
+    chunk in its own short transaction followed by a ``pause`` in seconds,
+    so locks stay brief and replicas can keep up. Carts locked by an
+    in-flight request are skipped. Returns counts and the elapsed time.
+    """
+    cutoff = timezone.now() - older_than
+    result = {"carts": 0, "items": 0, "chunks": 0}
+    started = time.monotonic()
+    last_id = None
+    while True:
+        with transaction.atomic():
+            expired = Cart.objects.filter(last_update__lt=cutoff)
+            if last_id:
+                expired = expired.filter(pk__gt=last_id)
+            cart_ids = list(
+                expired.select_for_update(skip_locked=True)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:chunk_size]
+            )
+            if not cart_ids:
+                break
+            items = CartItem.objects.filter(cart_id__in=cart_ids)
+            result["items"] += items.delete()[0]
+            result["carts"] += Cart.objects.filter(pk__in=cart_ids).delete()[0]
+            transaction.on_commit(partial(forget_cart_versions, cart_ids))
+        result["chunks"] += 1
+        last_id = cart_ids[-1]
+        if len(cart_ids) < chunk_size:
+            break
+        time.sleep(pause)
+    result["seconds"] = round(time.monotonic() - started, 3)
+    return result
@@ -0,0 +1,91 @@
+import csv
+import json
+import zlib
+from datetime import datetime, time, timedelta
+from django.utils import timezone
+from .models import OrderItem
+from .sharding import order_shards
+
+EXPORT_FIELDS = {
+    "order_id": "order_id",
+    "tracking_code": "order__tracking_code",
+    "user_id": "order__user_id",
+    "payment_status": "order__payment_status",
+    "created_at": "order__created_at",
+    "total_price": "order__total_price",
+    "item_id": "id",
+    "product_id": "product_id",
+    "order_item_price": "order_item_price",
+    "quantity": "quantity",
+}
+EXPORT_FORMATS = ("csv", "ndjson")
+CONTENT_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+FLUSH_BYTES = 64 * 1024
+
+
+def export_rows(date_from=None, date_to=None, payment_status=None, chunk_size=2000):
+    """
+    Yield one tuple per order item, joined with its order, shard by shard
+    and in id order within each shard.
+
+    Rows are read through a server-side cursor so memory stays flat no
+    matter how many orders match. ``date_to`` is inclusive.
+    """
+    for shard in order_shards():
+        yield from shard_rows(shard, date_from, date_to, payment_status, chunk_size)
+
+
+def shard_rows(shard, date_from, date_to, payment_status, chunk_size):
+    items = OrderItem.objects.using(shard).order_by("id")
+    if date_from:
+        start = timezone.make_aware(datetime.combine(date_from, time.min))
+        items = items.filter(order__created_at__gte=start)
+    if date_to:
+        end = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min))
+        items = items.filter(order__created_at__lt=end)
+    if payment_status:
+        items = items.filter(order__payment_status=payment_status)
+    return items.values_list(*EXPORT_FIELDS.values()).iterator(chunk_size=chunk_size)
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_ndjson(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_FIELDS, row)), default=str) + "\n"
+
+
+def iter_export(rows, file_format, compress=False):
+    """
+    Encode ``rows`` as ``file_format`` and yield byte chunks of ~64KB,
+    gzip-compressed on the fly when ``compress`` is set.
+    """
+    lines = iter_csv(rows) if file_format == "csv" else iter_ndjson(rows)
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    buffer = []
+    size = 0
+    for line in lines:
+        data = line.encode()
+        buffer.append(data)
+        size += len(data)
+        if size >= FLUSH_BYTES:
+            chunk = b"".join(buffer)
+            buffer, size = [], 0
+            chunk = compressor.compress(chunk) if compressor else chunk
+            if chunk:
+                yield chunk
+    chunk = b"".join(buffer)
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
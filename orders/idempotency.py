@@ -0,0 +1,84 @@
+import hashlib
+import json
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+
+
+def get_idempotency_cache_key(request, key):
+    user = request.user.pk if request.user.is_authenticated else "anonymous"
+    digest = hashlib.sha256(f"{request.path}:{key}".encode()).hexdigest()
+    return f"idempotency:{user}:{digest}"
+
+
+def idempotent(view_method):
+    """
+    Make a viewset action safe to retry with an ``Idempotency-Key`` header.
+
+    The first request holds a short lock in the cache while it runs and its
+    final response is stored for ``IDEMPOTENCY_KEY_TTL`` seconds. Retries
+    with the same key replay that response without running the action again;
+    a retry that arrives while the first request is still running gets 409,
+    and reusing a key with a different body gets 422.
+    """
+
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+
+        cache_key = get_idempotency_cache_key(request, key)
+        lock_key = f"{cache_key}:lock"
+        fingerprint = hashlib.sha256(
+            json.dumps(request.data, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+        stored = cache.get(cache_key)
+        if stored is None:
+            if not cache.add(lock_key, fingerprint, settings.IDEMPOTENCY_LOCK_TIMEOUT):
+                return Response(
+                    {"detail": "A request with this Idempotency-Key is in progress."},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            # The first request may have stored its response and released
+            # the lock since the read above; replay it instead of running
+            # the action a second time.
+            stored = cache.get(cache_key)
+            if stored is not None:
+                cache.delete(lock_key)
+
+        if stored is None:
+            try:
+                response = view_method(self, request, *args, **kwargs)
+                if response.status_code < 500:
+                    cache.set(
+                        cache_key,
+                        {
+                            "fingerprint": fingerprint,
+                            "status": response.status_code,
+                            "data": response.data,
+                            "location": response.get("Location"),
+                        },
+                        settings.IDEMPOTENCY_KEY_TTL,
+                    )
+            finally:
+                cache.delete(lock_key)
+            return response
+
+        if stored["fingerprint"] != fingerprint:
+            return Response(
+                {"detail": "Idempotency-Key was already used with a different request."},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        headers = {"Idempotent-Replayed": "true"}
+        if stored["location"]:
+            headers["Location"] = stored["location"]
+        return Response(stored["data"], status=stored["status"], headers=headers)
+
+    return wrapper
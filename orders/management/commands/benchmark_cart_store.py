@@ -0,0 +1,44 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from orders.carts import CART_STORE_ALIASES, get_cart_store
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Compare cart store backends on a create/add/update/read/delete cycle."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--store",
+            action="append",
+            help="Store alias or dotted path (repeatable). Defaults to all aliases.",
+        )
+        parser.add_argument("--carts", type=int, default=200)
+        parser.add_argument("--items", type=int, default=5, help="Products per cart.")
+
+    def handle(self, *args, **options):
+        product_ids = list(
+            Product.objects.filter(stock__gte=2)
+            .order_by("id")
+            .values_list("id", flat=True)[: options["items"]]
+        )
+        if not product_ids:
+            raise CommandError("Need products with stock to add to carts.")
+
+        for name in options["store"] or list(CART_STORE_ALIASES):
+            store = get_cart_store(name)
+            operations = 0
+            started = time.perf_counter()
+            for _ in range(options["carts"]):
+                cart = store.create_cart()
+                for product_id in product_ids:
+                    store.add_item(cart.id, product_id, 1)
+                    store.add_item(cart.id, product_id, 1)
+                store.get_cart(cart.id)
+                store.delete_cart(cart.id)
+                operations += 3 + 2 * len(product_ids)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{name}: {operations / elapsed:,.0f} ops/s "
+                f"({options['carts']:,} carts, {operations:,} ops, {elapsed:.2f}s)"
+            )
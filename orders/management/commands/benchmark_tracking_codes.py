@@ -0,0 +1,41 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+from orders.tracking import GENERATOR_ALIASES
+
+
+class Command(BaseCommand):
+    help = "Measure tracking code generation throughput under concurrent workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--generator",
+            action="append",
+            help="Generator alias or dotted path (repeatable). Defaults to all aliases.",
+        )
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--count", type=int, default=100_000, help="Codes per worker.")
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        count = options["count"]
+
+        for name in options["generator"] or list(GENERATOR_ALIASES):
+            generator = import_string(GENERATOR_ALIASES.get(name, name))()
+
+            def run(_):
+                return [generator.generate() for _ in range(count)]
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                batches = list(pool.map(run, range(workers)))
+            elapsed = time.perf_counter() - started
+
+            total = workers * count
+            unique = len({code for batch in batches for code in batch})
+            self.stdout.write(
+                f"{name}: {total / elapsed:,.0f} codes/s "
+                f"({total:,} codes, {workers} workers, {elapsed:.2f}s, "
+                f"{total - unique} duplicates)"
+            )
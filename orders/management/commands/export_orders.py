@@ -0,0 +1,39 @@
+import sys
+from datetime import date
+from django.core.management.base import BaseCommand
+from orders.export import EXPORT_FORMATS, export_rows, iter_export
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    help = "Stream orders and their items to a CSV or NDJSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+        parser.add_argument("--from", dest="date_from", type=date.fromisoformat)
+        parser.add_argument("--to", dest="date_to", type=date.fromisoformat)
+        parser.add_argument(
+            "--payment-status",
+            choices=[choice for choice, _ in Order.PAYMENT_STATUS_CHOICES],
+        )
+        parser.add_argument("--gzip", action="store_true")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+        parser.add_argument("--output", "-o", help="Output file, defaults to stdout.")
+
+    def handle(self, *args, **options):
+        rows = export_rows(
+            date_from=options["date_from"],
+            date_to=options["date_to"],
+            payment_status=options["payment_status"],
+            chunk_size=options["chunk_size"],
+        )
+        chunks = iter_export(rows, options["format"], compress=options["gzip"])
+
+        if options["output"]:
+            with open(options["output"], "wb") as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        else:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
@@ -0,0 +1,79 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+from orders.partitions import (
+    ORDER_TABLE,
+    add_months,
+    archive_partition,
+    create_partitions,
+    detach_partitions,
+    list_partitions,
+    month_start,
+)
+from orders.sharding import order_shards
+
+
+class Command(BaseCommand):
+    help = (
+        "Maintain the monthly partitions of the orders tables: create upcoming "
+        "months, detach old ones and archive detached months."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["create", "detach", "archive"])
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=settings.ORDER_PARTITION_MONTHS_AHEAD,
+            help="create: number of future months to prepare.",
+        )
+        parser.add_argument(
+            "--retain-months",
+            type=int,
+            default=settings.ORDER_PARTITION_RETAIN_MONTHS,
+            help="detach: number of past months to keep attached.",
+        )
+        parser.add_argument(
+            "--archive",
+            action="store_true",
+            help="detach: archive the detached months right away.",
+        )
+
+    def handle(self, *args, **options):
+        shards = [
+            shard
+            for shard in order_shards()
+            if connections[shard].vendor == "postgresql"
+        ]
+        if not shards:
+            raise CommandError("Order partitioning requires PostgreSQL.")
+
+        for shard in shards:
+            if len(shards) > 1:
+                self.stdout.write(f"{shard}:")
+            self.maintain(connections[shard], options)
+
+    def maintain(self, connection, options):
+        this_month = month_start(timezone.now())
+        # Archiving also clears tracking code directory entries on default.
+        with transaction.atomic(using=DEFAULT_DB_ALIAS), transaction.atomic(
+            using=connection.alias
+        ), connection.cursor() as cursor:
+            if options["action"] == "create":
+                created = create_partitions(
+                    cursor, this_month, options["months_ahead"] + 1
+                )
+                self.stdout.write(f"Ensured {len(created)} partitions.")
+                return
+
+            if options["action"] == "detach":
+                cutoff = add_months(this_month, -options["retain_months"])
+                detached = detach_partitions(cursor, cutoff)
+                self.stdout.write(f"Detached {len(detached)} partitions.")
+                if not options["archive"]:
+                    return
+
+            for month in sorted(list_partitions(cursor, ORDER_TABLE, attached=False)):
+                archived = archive_partition(cursor, month)
+                self.stdout.write(f"Archived {archived} orders from {month:%Y-%m}.")
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import Coalesce
+from orders.models import Order, OrderStats
+from orders.sharding import order_shards
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-user OrderStats table from the orders of every shard."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        for shard in order_shards():
+            rebuilt, stale = self.rebuild(shard, options["chunk_size"])
+            self.stdout.write(
+                f"{shard}: rebuilt stats for {rebuilt} users, "
+                f"removed {stale} stale rows."
+            )
+
+    def rebuild(self, shard, chunk_size):
+        placed = ~Q(payment_status=Order.PAYMENT_STATUS_FAILED)
+        totals = (
+            Order.objects.using(shard)
+            .order_by()
+            .values("user_id")
+            .annotate(
+                # Failed orders count towards last_order_at only.
+                order_count=Count("id", filter=placed),
+                total_spent=Coalesce(Sum("total_price", filter=placed), 0),
+                last_order_at=Max("created_at"),
+            )
+            .iterator(chunk_size=chunk_size)
+        )
+
+        with transaction.atomic(using=shard):
+            rebuilt = 0
+            chunk = []
+            for row in totals:
+                chunk.append(OrderStats(**row))
+                if len(chunk) == chunk_size:
+                    rebuilt += self.upsert(shard, chunk)
+                    chunk = []
+            rebuilt += self.upsert(shard, chunk)
+
+            stale, _ = (
+                OrderStats.objects.using(shard)
+                .exclude(user_id__in=Order.objects.using(shard).values("user_id"))
+                .delete()
+            )
+        return rebuilt, stale
+
+    def upsert(self, shard, chunk):
+        OrderStats.objects.using(shard).bulk_create(
+            chunk,
+            update_conflicts=True,
+            unique_fields=["user"],
+            update_fields=["order_count", "total_spent", "last_order_at"],
+        )
+        return len(chunk)
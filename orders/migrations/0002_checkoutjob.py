@@ -0,0 +1,35 @@
+# Generated by Django 4.2.9 on 2026-10-18 11:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('orders', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckoutJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cart_id', models.UUIDField(verbose_name='Cart ID')),
+                ('status', models.CharField(choices=[('P', 'Pending'), ('R', 'Processing'), ('C', 'Completed'), ('F', 'Failed')], default='P', max_length=1, verbose_name='Status')),
+                ('error', models.JSONField(blank=True, null=True, verbose_name='Error')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='Processed At')),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='orders.order', verbose_name='Order')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Buyer')),
+            ],
+            options={
+                'verbose_name': 'Checkout Job',
+                'verbose_name_plural': 'Checkout Jobs',
+                'indexes': [models.Index(fields=['status', 'created_at'], name='orders_chec_status_4f3c45_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.9 on 2026-10-18 11:51
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0005_alter_customuser_last_login'),
+        ('orders', '0003_order_user_created_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='order_stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Buyer')),
+                ('order_count', models.PositiveIntegerField(default=0, verbose_name='Orders')),
+                ('total_spent', models.PositiveBigIntegerField(default=0, verbose_name='Lifetime Spend')),
+                ('last_order_at', models.DateTimeField(blank=True, null=True, verbose_name='Last Order At')),
+            ],
+            options={
+                'verbose_name': 'Order Stats',
+                'verbose_name_plural': 'Order Stats',
+            },
+        ),
+    ]
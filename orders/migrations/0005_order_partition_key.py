@@ -0,0 +1,66 @@
+# Generated by Django 4.2.9 on 2026-10-18 11:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def copy_order_created_at(apps, schema_editor):
+    Order = apps.get_model("orders", "Order")
+    OrderItem = apps.get_model("orders", "OrderItem")
+    OrderItem.objects.update(
+        created_at=models.Subquery(
+            Order.objects.filter(pk=models.OuterRef("order_id")).values("created_at")[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('orders', '0004_orderstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Created At'),
+        ),
+        migrations.RunPython(copy_order_created_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='checkoutjob',
+            name='order',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='orders.order', verbose_name='Order'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, verbose_name='Order Created At'),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='order',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='orders.order', verbose_name='Order'),
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('payment_status', models.CharField(choices=[('P', 'Pending'), ('C', 'Completed'), ('F', 'Failed')], max_length=1, verbose_name='Payment Status')),
+                ('created_at', models.DateTimeField(verbose_name='Order Created At')),
+                ('total_price', models.IntegerField(verbose_name='Total Price')),
+                ('token', models.CharField(max_length=255, verbose_name='Token')),
+                ('tracking_code', models.CharField(db_index=True, max_length=16, verbose_name='Tracking Code')),
+                ('items', models.JSONField(default=list, verbose_name='Items')),
+                ('user', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to=settings.AUTH_USER_MODEL, verbose_name='Buyer')),
+            ],
+            options={
+                'verbose_name': 'Archived Order',
+                'verbose_name_plural': 'Archived Orders',
+                'indexes': [models.Index(fields=['user', '-created_at'], name='orders_arch_user_id_6febd8_idx')],
+            },
+        ),
+    ]
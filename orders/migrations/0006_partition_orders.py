@@ -0,0 +1,145 @@
+"""
+Convert orders_order and orders_orderitem into tables range-partitioned by
+month on created_at (PostgreSQL 12+ only; elsewhere only the tracking code
+constraint changes).
+
+Primary keys become (id, created_at) and the tracking code is unique per
+(tracking_code, created_at), since PostgreSQL requires the partition key in
+every unique constraint. Existing rows are copied into monthly partitions
+covering their history plus ORDER_PARTITION_MONTHS_AHEAD months; rows
+outside that range land in a <table>_default partition. The copy holds an
+exclusive lock on both tables, so run it in a maintenance window.
+"""
+from datetime import date
+from django.conf import settings
+from django.db import DatabaseError, migrations, models, transaction
+from django.utils import timezone
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_table(cursor, table, unique_columns=()):
+    cursor.execute(
+        "SELECT indexdef FROM pg_indexes "
+        "WHERE schemaname = current_schema() AND tablename = %s "
+        "AND indexdef NOT LIKE 'CREATE UNIQUE%%'",
+        [table],
+    )
+    index_defs = [row[0] for row in cursor.fetchall()]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype = 'f'",
+        [table],
+    )
+    foreign_keys = cursor.fetchall()
+
+    legacy = f"{table}_legacy"
+    cursor.execute(f'ALTER TABLE "{table}" RENAME TO "{legacy}"')
+    cursor.execute(
+        f'CREATE TABLE "{table}" (LIKE "{legacy}" INCLUDING DEFAULTS '
+        "INCLUDING CONSTRAINTS INCLUDING STORAGE) PARTITION BY RANGE (created_at)"
+    )
+    cursor.execute(f'CREATE TABLE "{table}_default" PARTITION OF "{table}" DEFAULT')
+
+    cursor.execute(f'SELECT MIN(created_at) FROM "{legacy}"')
+    oldest = cursor.fetchone()[0] or timezone.now()
+    month = date(oldest.year, oldest.month, 1)
+    now = timezone.now()
+    last = add_months(date(now.year, now.month, 1), settings.ORDER_PARTITION_MONTHS_AHEAD)
+    while month <= last:
+        cursor.execute(
+            f'CREATE TABLE "{table}_p{month:%Y_%m}" PARTITION OF "{table}" '
+            "FOR VALUES FROM (%s) TO (%s)",
+            [month, add_months(month, 1)],
+        )
+        month = add_months(month, 1)
+
+    cursor.execute(f'INSERT INTO "{table}" SELECT * FROM "{legacy}"')
+    cursor.execute(f'DROP TABLE "{legacy}"')
+
+    cursor.execute(f'ALTER TABLE "{table}" ADD PRIMARY KEY (id, created_at)')
+    for column in unique_columns:
+        cursor.execute(
+            f'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_{column}_created_at_uniq" '
+            f"UNIQUE ({column}, created_at)"
+        )
+
+    cursor.execute(f'CREATE SEQUENCE "{table}_id_seq" OWNED BY "{table}".id')
+    cursor.execute(
+        f"SELECT setval('\"{table}_id_seq\"', COALESCE(MAX(id), 0) + 1, false) "
+        f'FROM "{table}"'
+    )
+    cursor.execute(
+        f'ALTER TABLE "{table}" ALTER COLUMN id '
+        f"SET DEFAULT nextval('\"{table}_id_seq\"')"
+    )
+    for index_def in index_defs:
+        cursor.execute(index_def)
+    for name, definition in foreign_keys:
+        cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{name}" {definition}')
+
+
+TRACKING_CODE_UNIQUE = models.UniqueConstraint(
+    fields=["tracking_code", "created_at"],
+    name="orders_order_tracking_code_created_at_uniq",
+)
+
+
+def relax_tracking_code(apps, schema_editor):
+    # Other databases keep their tables but get the same unique constraint,
+    # so the schema matches the state below everywhere.
+    Order = apps.get_model("orders", "Order")
+    old_field = Order._meta.get_field("tracking_code")
+    new_field = models.CharField(max_length=16, verbose_name="Tracking Code")
+    new_field.set_attributes_from_name("tracking_code")
+    schema_editor.alter_field(Order, old_field, new_field)
+    schema_editor.add_constraint(Order, TRACKING_CODE_UNIQUE)
+
+
+def partition_orders(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        relax_tracking_code(apps, schema_editor)
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        partition_table(cursor, "orders_order", unique_columns=["tracking_code"])
+        partition_table(cursor, "orders_orderitem")
+
+        # lz4 needs PostgreSQL 14+ built with lz4; otherwise keep pglz.
+        try:
+            with transaction.atomic(using=schema_editor.connection.alias):
+                cursor.execute(
+                    "ALTER TABLE orders_archivedorder "
+                    "ALTER COLUMN items SET COMPRESSION lz4"
+                )
+        except DatabaseError:
+            pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_order_partition_key'),
+    ]
+
+    operations = [
+        # Django can't describe the (id, created_at) primary key, so the state
+        # keeps id as the primary key; the tracking code changes are tracked.
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunPython(partition_orders)],
+            state_operations=[
+                migrations.AlterField(
+                    model_name="order",
+                    name="tracking_code",
+                    field=models.CharField(max_length=16, verbose_name="Tracking Code"),
+                ),
+                migrations.AddConstraint(
+                    model_name="order",
+                    constraint=TRACKING_CODE_UNIQUE,
+                ),
+            ],
+        ),
+    ]
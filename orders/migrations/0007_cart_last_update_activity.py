@@ -0,0 +1,18 @@
+# Generated by Django 4.2.9 on 2026-10-18 12:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_partition_orders'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cart',
+            name='last_update',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Last Updated At'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.9 on 2026-10-18 12:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_cart_last_update_activity'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('payment_status', 'P')), fields=['created_at', 'id'], name='order_pending_created_idx'),
+        ),
+    ]
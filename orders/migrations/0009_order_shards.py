@@ -0,0 +1,46 @@
+# Generated by Django 4.2.9 on 2026-10-18 12:14
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('products', '0003_alter_product_description_alter_product_price_and_more'),
+        ('orders', '0008_order_pending_created_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.PROTECT, to=settings.AUTH_USER_MODEL, verbose_name='Buyer'),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='product',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.PROTECT, related_name='orderitems', to='products.product', verbose_name='Product'),
+        ),
+        migrations.AlterField(
+            model_name='orderstats',
+            name='user',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='order_stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Buyer'),
+        ),
+        migrations.CreateModel(
+            name='TrackingCodeDirectory',
+            fields=[
+                ('tracking_code', models.CharField(max_length=16, primary_key=True, serialize=False, verbose_name='Tracking Code')),
+                ('shard', models.CharField(max_length=64, verbose_name='Shard')),
+                ('order_id', models.BigIntegerField(verbose_name='Order ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Buyer')),
+            ],
+            options={
+                'verbose_name': 'Tracking Code',
+                'verbose_name_plural': 'Tracking Codes',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.9 on 2026-10-18 12:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_order_shards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='checkoutjob',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Started At'),
+        ),
+    ]
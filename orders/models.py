@@ -1,6 +1,8 @@
 from django.db import models
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.exceptions import PermissionDenied
+from django.utils import timezone
 from products.models import Product
 from uuid import uuid4
 
@@ -23,42 +25,116 @@ class Order(models.Model):
         default=PAYMENT_STATUS_PENDING,
         verbose_name="Payment Status",
     )
-    user = models.ForeignKey(User, on_delete=models.PROTECT, verbose_name="Buyer")
-    created_at = models.DateTimeField(auto_now=True, verbose_name="Order Created At")
+    # Orders may live on another database than users and products (see
+    # orders.sharding), so these relations are not enforced by the database.
+    user = models.ForeignKey(
+        User, on_delete=models.PROTECT, db_constraint=False, verbose_name="Buyer"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True, verbose_name="Order Created At"
+    )
     total_price = models.IntegerField(verbose_name="Total Price")
     token = models.CharField(max_length=255, verbose_name="Token")
-    tracking_code = models.CharField(
-        max_length=16, unique=True, verbose_name="Tracking Code"
-    )
+    # Unique per (code, created_at) only, as the table is partitioned on
+    # created_at; TrackingCodeDirectory keeps codes globally unique.
+    tracking_code = models.CharField(max_length=16, verbose_name="Tracking Code")
 
     def __str__(self):
-        user_orders = Order.objects.prefetch_related().filter(user=self.user).count()
-        return f"{self.user} ({user_orders} orders)"
+        stats = getattr(self.user, "order_stats", None)
+        return f"{self.user} ({stats.order_count if stats else 0} orders)"
 
     class Meta:
         verbose_name = "Order List"
         verbose_name_plural = "Order Lists"
+        # On PostgreSQL the primary key is (id, created_at); Django only
+        # models the id part.
+        constraints = [
+            models.UniqueConstraint(
+                fields=["tracking_code", "created_at"],
+                name="orders_order_tracking_code_created_at_uniq",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "-created_at", "-id"], name="order_user_created_idx"
+            ),
+            # Only pending orders, for expire_pending_orders.
+            models.Index(
+                fields=["created_at", "id"],
+                name="order_pending_created_idx",
+                condition=models.Q(payment_status="P"),
+            ),
+        ]
+
+
+class OrderStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        db_constraint=False,
+        related_name="order_stats",
+        verbose_name="Buyer",
+    )
+    order_count = models.PositiveIntegerField(default=0, verbose_name="Orders")
+    total_spent = models.PositiveBigIntegerField(
+        default=0, verbose_name="Lifetime Spend"
+    )
+    last_order_at = models.DateTimeField(
+        null=True, blank=True, verbose_name="Last Order At"
+    )
+
+    class Meta:
+        verbose_name = "Order Stats"
+        verbose_name_plural = "Order Stats"
 
 
 class OrderItem(models.Model):
+    # orders_order is range-partitioned on PostgreSQL, so its primary key is
+    # (id, created_at) and plain foreign keys to it can't be enforced.
     order = models.ForeignKey(
-        Order, on_delete=models.CASCADE, verbose_name="Order", related_name="items"
+        Order,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        verbose_name="Order",
+        related_name="items",
     )
     product = models.ForeignKey(
         Product,
         on_delete=models.PROTECT,
+        db_constraint=False,
         related_name="orderitems",
         verbose_name="Product",
     )
     order_item_price = models.PositiveIntegerField(verbose_name="Price")
     quantity = models.PositiveSmallIntegerField(default=1, verbose_name="Quantity")
+    # Copy of the order's created_at, used as the partition key.
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="Created At")
+
+
+class TrackingCodeDirectory(models.Model):
+    """Maps every tracking code to the shard holding its order."""
+
+    tracking_code = models.CharField(
+        max_length=16, primary_key=True, verbose_name="Tracking Code"
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Buyer")
+    shard = models.CharField(max_length=64, verbose_name="Shard")
+    order_id = models.BigIntegerField(verbose_name="Order ID")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Created At")
+
+    class Meta:
+        verbose_name = "Tracking Code"
+        verbose_name_plural = "Tracking Codes"
 
 
 class Cart(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid4, verbose_name="ID")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Cart Created At")
+    # Bumped by the cart store on every change; abandoned carts are purged by
+    # last_update (see orders.carts.purge_abandoned_carts).
     last_update = models.DateTimeField(
-        auto_now_add=True, verbose_name="Last Updated At"
+        auto_now=True, db_index=True, verbose_name="Last Updated At"
     )
 
     class Meta:
@@ -79,3 +155,82 @@ class CartItem(models.Model):
         unique_together = [["cart", "product"]]
         verbose_name = "Cart Item"
         verbose_name_plural = "Cart Items"
+
+
+class CheckoutJob(models.Model):
+    STATUS_PENDING = "P"
+    STATUS_PROCESSING = "R"
+    STATUS_COMPLETE = "C"
+    STATUS_FAILED = "F"
+    STATUS_CHOICES = (
+        (STATUS_PENDING, "Pending"),
+        (STATUS_PROCESSING, "Processing"),
+        (STATUS_COMPLETE, "Completed"),
+        (STATUS_FAILED, "Failed"),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid4, verbose_name="ID")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Buyer")
+    cart_id = models.UUIDField(verbose_name="Cart ID")
+    status = models.CharField(
+        max_length=1,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+        verbose_name="Status",
+    )
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        db_constraint=False,
+        verbose_name="Order",
+    )
+    error = models.JSONField(null=True, blank=True, verbose_name="Error")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Created At")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Started At")
+    processed_at = models.DateTimeField(
+        null=True, blank=True, verbose_name="Processed At"
+    )
+
+    class Meta:
+        verbose_name = "Checkout Job"
+        verbose_name_plural = "Checkout Jobs"
+        indexes = [models.Index(fields=["status", "created_at"])]
+
+
+class ArchivedOrder(models.Model):
+    """
+    Read-only copy of an order moved out of a detached monthly partition.
+
+    Items are kept inline as a JSON list so each archived order is a single
+    (compressed) row.
+    """
+
+    id = models.BigIntegerField(primary_key=True, verbose_name="ID")
+    user = models.ForeignKey(
+        User, on_delete=models.DO_NOTHING, db_constraint=False, verbose_name="Buyer"
+    )
+    payment_status = models.CharField(
+        max_length=1,
+        choices=Order.PAYMENT_STATUS_CHOICES,
+        verbose_name="Payment Status",
+    )
+    created_at = models.DateTimeField(verbose_name="Order Created At")
+    total_price = models.IntegerField(verbose_name="Total Price")
+    token = models.CharField(max_length=255, verbose_name="Token")
+    tracking_code = models.CharField(
+        max_length=16, db_index=True, verbose_name="Tracking Code"
+    )
+    items = models.JSONField(default=list, verbose_name="Items")
+
+    def save(self, *args, **kwargs):
+        raise PermissionDenied("Archived orders are read-only.")
+
+    def delete(self, *args, **kwargs):
+        raise PermissionDenied("Archived orders are read-only.")
+
+    class Meta:
+        verbose_name = "Archived Order"
+        verbose_name_plural = "Archived Orders"
+        indexes = [models.Index(fields=["user", "-created_at"])]
@@ -1,5 +1,10 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class DefultPagination(PageNumberPagination):
-    page_size = 14
\ No newline at end of file
+    page_size = 14
+
+
+class OrderCursorPagination(CursorPagination):
+    page_size = 10
+    ordering = ("-created_at", "-id")
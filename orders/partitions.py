@@ -0,0 +1,163 @@
+"""
+Monthly range partitions of the orders tables on PostgreSQL.
+
+``orders_order`` and ``orders_orderitem`` are partitioned by ``created_at``
+(see migration 0006). Partitions are named ``<table>_pYYYY_MM``; each table
+also has a ``<table>_default`` partition that catches rows outside the
+prepared months.
+"""
+import re
+from datetime import date
+from .models import ArchivedOrder, Order, OrderItem, TrackingCodeDirectory
+
+ORDER_TABLE = Order._meta.db_table
+ITEM_TABLE = OrderItem._meta.db_table
+PARTITIONED_TABLES = (ORDER_TABLE, ITEM_TABLE)
+DIRECTORY_BATCH_SIZE = 1000
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f"{table}_p{month:%Y_%m}"
+
+
+def partition_month(table, name):
+    match = re.fullmatch(rf"{re.escape(table)}_p(\d{{4}})_(\d{{2}})", name)
+    return date(int(match[1]), int(match[2]), 1) if match else None
+
+
+def create_partitions(cursor, first_month, count):
+    """
+    Create ``count`` monthly partitions per table starting at ``first_month``.
+
+    Rows already sitting in ``<table>_default`` for a new month would violate
+    the default partition's updated constraint, so those months are built
+    from the rows moved out of the default partition and then attached.
+    """
+    created = []
+    for table in PARTITIONED_TABLES:
+        default = f"{table}_default"
+        for offset in range(count):
+            month = add_months(first_month, offset)
+            name = partition_name(table, month)
+            bounds = [month, add_months(month, 1)]
+            # Keep checkouts from adding rows for the month until it's attached.
+            cursor.execute(f'LOCK TABLE "{default}" IN SHARE ROW EXCLUSIVE MODE')
+            cursor.execute(
+                f'SELECT EXISTS (SELECT 1 FROM "{default}" '
+                "WHERE created_at >= %s AND created_at < %s)",
+                bounds,
+            )
+            if cursor.fetchone()[0]:
+                cursor.execute(
+                    f'CREATE TABLE "{name}" (LIKE "{table}" INCLUDING DEFAULTS '
+                    "INCLUDING CONSTRAINTS INCLUDING STORAGE)"
+                )
+                cursor.execute(
+                    f'WITH moved AS (DELETE FROM "{default}" '
+                    "WHERE created_at >= %s AND created_at < %s RETURNING *) "
+                    f'INSERT INTO "{name}" SELECT * FROM moved',
+                    bounds,
+                )
+                cursor.execute(
+                    f'ALTER TABLE "{table}" ATTACH PARTITION "{name}" '
+                    "FOR VALUES FROM (%s) TO (%s)",
+                    bounds,
+                )
+            else:
+                cursor.execute(
+                    f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table}" '
+                    "FOR VALUES FROM (%s) TO (%s)",
+                    bounds,
+                )
+            created.append(name)
+    return created
+
+
+def list_partitions(cursor, table, attached=True):
+    """Return ``{month: name}`` for the attached (or detached) monthly partitions."""
+    if attached:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = %s",
+            [table],
+        )
+    else:
+        cursor.execute(
+            "SELECT relname FROM pg_class "
+            "WHERE relkind = 'r' AND NOT relispartition AND relname LIKE %s",
+            [f"{table}_p%"],
+        )
+    partitions = {}
+    for (name,) in cursor.fetchall():
+        month = partition_month(table, name)
+        if month:
+            partitions[month] = name
+    return partitions
+
+
+def detach_partitions(cursor, before):
+    """Detach every monthly partition that ends on or before ``before``."""
+    detached = []
+    for table in PARTITIONED_TABLES:
+        for month, name in sorted(list_partitions(cursor, table).items()):
+            if add_months(month, 1) <= before:
+                cursor.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"')
+                detached.append(name)
+    return detached
+
+
+def archive_partition(cursor, month):
+    """
+    Move one detached month into ArchivedOrder and drop its partitions.
+
+    Each order becomes a single row with its items folded into a JSON list,
+    which PostgreSQL stores TOAST-compressed. The archived orders' entries
+    in the tracking code directory are removed as well, so ``find_order``
+    no longer points at them. Returns the number of orders archived.
+    """
+    orders = partition_name(ORDER_TABLE, month)
+    items = partition_name(ITEM_TABLE, month)
+    archive = ArchivedOrder._meta.db_table
+    has_items = month in list_partitions(cursor, ITEM_TABLE, attached=False)
+
+    items_sql = "'[]'::jsonb"
+    if has_items:
+        items_sql = (
+            "COALESCE((SELECT jsonb_agg(jsonb_build_object("
+            "'item_id', i.id, 'product_id', i.product_id, "
+            "'order_item_price', i.order_item_price, 'quantity', i.quantity"
+            f') ORDER BY i.id) FROM "{items}" i WHERE i.order_id = o.id), \'[]\'::jsonb)'
+        )
+    cursor.execute(
+        f'INSERT INTO "{archive}" (id, user_id, payment_status, created_at, '
+        "total_price, token, tracking_code, items) "
+        "SELECT o.id, o.user_id, o.payment_status, o.created_at, o.total_price, "
+        f'o.token, o.tracking_code, {items_sql} FROM "{orders}" o '
+        "ON CONFLICT (id) DO NOTHING"
+    )
+    archived = cursor.rowcount
+
+    cursor.execute(f'SELECT tracking_code FROM "{orders}"')
+    while True:
+        codes = [code for (code,) in cursor.fetchmany(DIRECTORY_BATCH_SIZE)]
+        if not codes:
+            break
+        TrackingCodeDirectory.objects.filter(
+            shard=cursor.db.alias, tracking_code__in=codes
+        ).delete()
+
+    if has_items:
+        cursor.execute(f'DROP TABLE "{items}"')
+    cursor.execute(f'DROP TABLE "{orders}"')
+    return archived
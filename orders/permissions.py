@@ -0,0 +1,8 @@
+from rest_framework.permissions import BasePermission
+
+
+class IsAdmin(BasePermission):
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and (
+            request.user.is_staff or request.user.role == "admin"
+        )
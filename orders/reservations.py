@@ -0,0 +1,255 @@
+"""
+Time-limited stock holds for cart lines, kept in Redis.
+
+With ``CART_RESERVATIONS`` on, ``get_cart_store()`` wraps the configured
+store in ``ReservingCartStore``: every cart line holds its quantity for
+``CART_RESERVATION_TTL`` seconds (refreshed on each change), and a line can
+only grow while ``stock - live holds of other carts`` covers it. Holds are
+dropped when the line is removed, the cart deleted or checked out (checkout
+has decremented the stock by then), or when they expire. Checkout, the bulk
+cart validator and the public product API count other carts' live holds as
+unavailable stock too.
+
+Per product, ``holds:{<id>}`` is a sorted set of cart ids scored by expiry
+time and ``holds:{<id>}:qty`` maps cart ids to held quantities;
+``cart-holds:<cart>`` lists the products a cart holds.
+"""
+import time
+from django.conf import settings
+from django.db import transaction
+from products.models import Product
+from swiftorder.redis_client import get_redis
+from .carts import CartNotFound, CartQuantityError, parse_cart_id
+
+# KEYS = holds zset, quantities hash
+# ARGV = cart, quantity, increment (1/0), stock, now, expires at, ttl
+HOLD_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[5])
+if #expired > 0 then
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[5])
+    redis.call('HDEL', KEYS[2], unpack(expired))
+end
+local current = tonumber(redis.call('HGET', KEYS[2], ARGV[1]) or '0')
+local quantity = tonumber(ARGV[2])
+if ARGV[3] == '1' then quantity = current + quantity end
+if quantity <= 0 then
+    redis.call('ZREM', KEYS[1], ARGV[1])
+    redis.call('HDEL', KEYS[2], ARGV[1])
+    return 0
+end
+if quantity > current then
+    local held = 0
+    for _, value in ipairs(redis.call('HVALS', KEYS[2])) do
+        held = held + tonumber(value)
+    end
+    if held - current + quantity > tonumber(ARGV[4]) then return -1 end
+end
+redis.call('HSET', KEYS[2], ARGV[1], quantity)
+redis.call('ZADD', KEYS[1], ARGV[6], ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[7])
+redis.call('EXPIRE', KEYS[2], ARGV[7])
+return quantity
+"""
+
+# KEYS = holds zset, quantities hash; ARGV = now, cart to leave out
+HELD_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+if #expired > 0 then
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+    redis.call('HDEL', KEYS[2], unpack(expired))
+end
+local held = 0
+for _, cart in ipairs(redis.call('ZRANGE', KEYS[1], 0, -1)) do
+    if cart ~= ARGV[2] then
+        held = held + tonumber(redis.call('HGET', KEYS[2], cart) or '0')
+    end
+end
+return held
+"""
+
+
+class StockReservations:
+    def __init__(self, client=None):
+        self.redis = client or get_redis(settings.CART_REDIS_URL)
+        self.ttl = settings.CART_RESERVATION_TTL
+        self.hold_script = self.redis.register_script(HOLD_SCRIPT)
+        self.held_script = self.redis.register_script(HELD_SCRIPT)
+
+    def keys(self, product_id):
+        return [f"holds:{{{product_id}}}", f"holds:{{{product_id}}}:qty"]
+
+    def hold(self, cart_id, product_id, quantity, stock, increment=False):
+        """
+        Hold ``quantity`` of a product for a cart (or add to its hold with
+        ``increment``) and return the cart's new hold. Raises
+        CartQuantityError if other carts' live holds leave too little stock.
+        """
+        now = time.time()
+        held = self.hold_script(
+            keys=self.keys(product_id),
+            args=[
+                str(cart_id),
+                quantity,
+                int(increment),
+                stock,
+                now,
+                now + self.ttl,
+                self.ttl,
+            ],
+        )
+        if held == -1:
+            raise CartQuantityError(
+                "The selected quantity exceeds the available inventory."
+            )
+        cart_key = f"cart-holds:{cart_id}"
+        if held:
+            self.redis.sadd(cart_key, product_id)
+            self.redis.expire(cart_key, self.ttl)
+        else:
+            self.redis.srem(cart_key, product_id)
+        return held
+
+    def release(self, cart_id, product_id):
+        holds, quantities = self.keys(product_id)
+        with self.redis.pipeline() as pipe:
+            pipe.zrem(holds, str(cart_id))
+            pipe.hdel(quantities, str(cart_id))
+            pipe.srem(f"cart-holds:{cart_id}", product_id)
+            pipe.execute()
+
+    def release_cart(self, cart_id):
+        cart_key = f"cart-holds:{cart_id}"
+        with self.redis.pipeline() as pipe:
+            for product_id in self.redis.smembers(cart_key):
+                holds, quantities = self.keys(product_id)
+                pipe.zrem(holds, str(cart_id))
+                pipe.hdel(quantities, str(cart_id))
+            pipe.delete(cart_key)
+            pipe.execute()
+
+    def held(self, product_ids, exclude_cart=None):
+        """
+        Return ``{product_id: units under live holds}``, leaving out the
+        holds of ``exclude_cart``.
+        """
+        product_ids = list(product_ids)
+        now = time.time()
+        exclude = str(exclude_cart or "")
+        # One round trip for the whole batch; a single script can't span
+        # the products' keys, which live in different cluster slots.
+        with self.redis.pipeline(transaction=False) as pipe:
+            for product_id in product_ids:
+                self.held_script(
+                    keys=self.keys(product_id), args=[now, exclude], client=pipe
+                )
+            return dict(zip(product_ids, pipe.execute()))
+
+
+def subtract_holds(products):
+    """Lower the ``stock`` of serialized ``products`` by their live holds."""
+    held = StockReservations().held([product["id"] for product in products])
+    for product in products:
+        product["stock"] = max(product["stock"] - held[product["id"]], 0)
+
+
+class ReservingCartStore:
+    """Cart store wrapper that keeps a stock hold for every cart line."""
+
+    def __init__(self, store, reservations=None):
+        self.store = store
+        self.reservations = reservations or StockReservations()
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+    def stock(self, product_ids):
+        return dict(
+            Product.objects.filter(pk__in=product_ids).values_list("id", "stock")
+        )
+
+    def add_item(self, cart_id, product_id, quantity):
+        cart_id = parse_cart_id(cart_id)
+        if not cart_id:
+            raise CartNotFound
+        stock = self.stock([product_id]).get(product_id, 0)
+        hold = self.reservations.hold
+        hold(cart_id, product_id, quantity, stock, increment=True)
+        try:
+            return self.store.add_item(cart_id, product_id, quantity)
+        except Exception:
+            hold(cart_id, product_id, -quantity, stock, increment=True)
+            raise
+
+    def held_stock(self, cart_id, product_ids):
+        return self.reservations.held(product_ids, exclude_cart=parse_cart_id(cart_id))
+
+    def restore_holds(self, cart_id, quantities, stock):
+        # Best effort: other carts may have taken the stock in between, and
+        # the original error matters more than a shorter hold.
+        for product_id, quantity in quantities.items():
+            try:
+                self.reservations.hold(
+                    cart_id, product_id, quantity, stock.get(product_id, 0)
+                )
+            except CartQuantityError:
+                pass
+
+    def set_quantity(self, cart_id, item_id, quantity):
+        cart_id = parse_cart_id(cart_id)
+        item = self.store.get_item(cart_id, item_id)
+        if item is None:
+            return self.store.set_quantity(cart_id, item_id, quantity)
+        stock = {item.product_id: item.product.stock}
+        try:
+            self.reservations.hold(
+                cart_id, item.product_id, quantity, stock[item.product_id]
+            )
+            return self.store.set_quantity(cart_id, item_id, quantity)
+        except Exception:
+            self.restore_holds(cart_id, {item.product_id: item.quantity}, stock)
+            raise
+
+    def set_items(self, cart_id, quantities):
+        cart_id = parse_cart_id(cart_id)
+        if not cart_id:
+            raise CartNotFound
+        stock = self.stock(quantities)
+        current = {
+            item.product_id: item.quantity for item in self.store.get_items(cart_id)
+        }
+        try:
+            for product_id, quantity in quantities.items():
+                self.reservations.hold(
+                    cart_id, product_id, quantity, stock.get(product_id, 0)
+                )
+            self.store.set_items(cart_id, quantities)
+        except Exception:
+            self.restore_holds(
+                cart_id,
+                {product_id: current.get(product_id, 0) for product_id in quantities},
+                stock,
+            )
+            raise
+
+    def remove_item(self, cart_id, item_id):
+        cart_id = parse_cart_id(cart_id)
+        item = self.store.get_item(cart_id, item_id)
+        removed = self.store.remove_item(cart_id, item_id)
+        if item is not None:
+            self.reservations.release(cart_id, item.product_id)
+        return removed
+
+    def delete_cart(self, cart_id):
+        cart_id = parse_cart_id(cart_id)
+        deleted = self.store.delete_cart(cart_id)
+        if cart_id:
+            self.reservations.release_cart(cart_id)
+        return deleted
+
+    def claim(self, cart_id):
+        # Checkout has decremented stock by the time this commits, so the
+        # holds are simply dropped.
+        cart_id = parse_cart_id(cart_id)
+        items = self.store.claim(cart_id)
+        transaction.on_commit(lambda: self.reservations.release_cart(cart_id))
+        return items
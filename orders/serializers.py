@@ -1,11 +1,17 @@
 import random
+from django.db import DEFAULT_DB_ALIAS
 from rest_framework import serializers
-from django.core.exceptions import ValidationError
+from rest_framework.exceptions import NotFound
+from .carts import MAX_CART_QUANTITY, CartNotFound, CartQuantityError, get_cart_store
+from .export import EXPORT_FORMATS
+from .sharding import order_shards
 from .models import (
     Cart,
     CartItem,
+    CheckoutJob,
     Order,
     OrderItem,
+    OrderStats,
     Product,
 )
 
@@ -22,7 +28,10 @@ class CartItemSerializer(serializers.ModelSerializer):
     total_price = serializers.SerializerMethodField()
 
     def get_total_price(self, cart_item: CartItem):
-        return cart_item.quantity * cart_item.product.price
+        line_total = getattr(cart_item, "line_total", None)
+        if line_total is None:
+            line_total = cart_item.quantity * cart_item.product.price
+        return line_total
 
     class Meta:
         model = CartItem
@@ -35,11 +44,13 @@ class CartSerializer(serializers.ModelSerializer):
     total_price = serializers.SerializerMethodField()
 
     def get_total_price(self, cart):
-        total_price = 0
-        for item in cart.items.all():
-            product = item.product
-            price = product.price
-            total_price += item.quantity * price
+        # ORMCartStore.get_cart annotates the total; carts from other stores
+        # are summed from their (already loaded) items.
+        total_price = getattr(cart, "total_price", None)
+        if total_price is None:
+            total_price = sum(
+                item.quantity * item.product.price for item in cart.items.all()
+            )
         return total_price
 
     class Meta:
@@ -49,46 +60,25 @@ class CartSerializer(serializers.ModelSerializer):
 
 class AddCartItemSerializer(serializers.ModelSerializer):
     product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=0, max_value=MAX_CART_QUANTITY)
 
     def validate_product_id(self, value):
         if not Product.objects.filter(pk=value).exists():
             raise serializers.ValidationError("There is no product with given id")
         return value
 
-    def get_serializer_context(self):
-        context = super().get_serializer_context()
-        context["cart_id"] = self.kwargs.get("cart_pk")
-        return context
-
     def save(self, **kwargs):
-        cart_id = self.context["cart_id"]
-        product_id = self.validated_data["product_id"]
-        product_inventory = Product.objects.get(pk=product_id).stock
-        quantity = self.validated_data["quantity"]
-
+        cart_id = kwargs.get("cart_id", self.context["cart_id"])
         try:
-            cart_item = CartItem.objects.get(cart_id=cart_id, product_id=product_id)
-            cart_item.quantity += quantity
-
-            if product_inventory < cart_item.quantity:
-                raise serializers.ValidationError(
-                    "The selected quantity exceeds the available inventory."
-                )
-            else:
-                cart_item.save()
-
-            self.instance = cart_item
-
-        except CartItem.DoesNotExist:
-            if product_inventory < quantity:
-                raise serializers.ValidationError(
-                    "The selected quantity exceeds the available inventory."
-                )
-            else:
-                self.instance = CartItem.objects.create(
-                    cart_id=cart_id, **self.validated_data
-                )
-
+            self.instance = get_cart_store().add_item(
+                cart_id,
+                self.validated_data["product_id"],
+                self.validated_data["quantity"],
+            )
+        except CartNotFound:
+            raise NotFound("Cart not found.")
+        except CartQuantityError as exc:
+            raise serializers.ValidationError(exc.detail)
         return self.instance
 
     class Meta:
@@ -97,30 +87,66 @@ class AddCartItemSerializer(serializers.ModelSerializer):
 
 
 class UpdateCartItemSerializer(serializers.ModelSerializer):
+    quantity = serializers.IntegerField(min_value=0, max_value=MAX_CART_QUANTITY)
 
     class Meta:
         model = CartItem
         fields = ["quantity"]
 
     def update(self, instance, validated_data):
-        available_quantity = instance.product.inventory
         quantity = validated_data.get("quantity", instance.quantity)
+        try:
+            return get_cart_store().set_quantity(
+                self.context["cart_id"], instance.pk, quantity
+            )
+        except CartNotFound:
+            raise NotFound("Cart item not found.")
+        except CartQuantityError as exc:
+            raise serializers.ValidationError(exc.detail)
 
-        if quantity > available_quantity:
-            if available_quantity == 0:
-                CartItem.objects.get(pk=instance.pk).delete()
-                raise serializers.ValidationError(
-                    "This product has been purchased and is not available."
+
+class CartItemOperationSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=0, max_value=MAX_CART_QUANTITY)
+
+
+class BulkCartItemSerializer(serializers.Serializer):
+    items = CartItemOperationSerializer(many=True, allow_empty=False, max_length=200)
+
+    def validate_items(self, items):
+        quantities = {item["product_id"]: item["quantity"] for item in items}
+        if len(quantities) != len(items):
+            raise serializers.ValidationError("Each product may appear only once.")
+
+        # Units other carts hold can't be added to this one.
+        held = get_cart_store().held_stock(self.context["cart_id"], quantities)
+        stock = {
+            product_id: max(amount - held.get(product_id, 0), 0)
+            for product_id, amount in Product.objects.filter(
+                pk__in=quantities
+            ).values_list("id", "stock")
+        }
+        errors = {}
+        for product_id, quantity in quantities.items():
+            if product_id not in stock:
+                errors[product_id] = "There is no product with given id"
+            elif quantity > stock[product_id]:
+                errors[product_id] = (
+                    f"Only {stock[product_id]} of this product are available."
                 )
-            instance.quantity = Product.objects.get(pk=instance.product.id).inventory
-            instance.save()
-            raise serializers.ValidationError(
-                "Only this amount of this product is available on the site."
-            )
+        if errors:
+            raise serializers.ValidationError(errors)
+        return quantities
 
-        instance.quantity = quantity
-        instance.save()
-        return instance
+    def save(self, **kwargs):
+        try:
+            get_cart_store().set_items(
+                self.context["cart_id"], self.validated_data["items"]
+            )
+        except CartNotFound:
+            raise NotFound("Cart not found.")
+        except CartQuantityError as exc:
+            raise serializers.ValidationError(exc.detail)
 
 
 class OrderProductSerializer(serializers.ModelSerializer):
@@ -170,12 +196,43 @@ class OrderSerializer(serializers.ModelSerializer):
         read_only_fields = ("payment_status", "items", "order_id", "user")
 
 
+class OrderStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderStats
+        fields = ["order_count", "total_spent", "last_order_at"]
+
+
 class CreateOrderSerializer(serializers.Serializer):
     cart_id = serializers.UUIDField(write_only=True)
 
-    def validate_cart_id(self, cart_id):
-        if not Cart.objects.filter(pk=cart_id).exists():
-            raise ValidationError("Cart not found")
-        if CartItem.objects.filter(cart_id=cart_id).count() == 0:
-            raise ValidationError("Your cart is empty")
-        return cart_id
\ No newline at end of file
+
+class CheckoutJobSerializer(serializers.ModelSerializer):
+    job_id = serializers.UUIDField(source="id", read_only=True)
+    order = OrderSerializer(read_only=True)
+
+    class Meta:
+        model = CheckoutJob
+        fields = ["job_id", "status", "order", "error", "created_at", "processed_at"]
+
+
+class OrderStatusTransitionSerializer(serializers.Serializer):
+    order_ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=10000
+    )
+    payment_status = serializers.ChoiceField(choices=Order.PAYMENT_STATUS_CHOICES)
+    # Order ids are only unique per shard.
+    shard = serializers.ChoiceField(choices=[], default=DEFAULT_DB_ALIAS)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["shard"].choices = order_shards()
+
+
+class OrderExportSerializer(serializers.Serializer):
+    file_format = serializers.ChoiceField(choices=EXPORT_FORMATS, default="csv")
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    payment_status = serializers.ChoiceField(
+        choices=Order.PAYMENT_STATUS_CHOICES, required=False
+    )
+    gzip = serializers.BooleanField(default=False)
@@ -0,0 +1,467 @@
+import logging
+from functools import partial
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+from django.db.models import (
+    Case,
+    Count,
+    F,
+    PositiveBigIntegerField,
+    PositiveIntegerField,
+    Sum,
+    Value,
+    When,
+)
+from outbox.relay import publish
+from products.models import Product
+from .carts import CartClaimed, CartNotFound, get_cart_store
+from .models import CheckoutJob, Order, OrderItem, OrderStats, TrackingCodeDirectory
+from .sharding import shard_for_user
+from .signals import orders_status_changed, orders_status_changing
+from .tracking import create_with_tracking_code
+
+logger = logging.getLogger(__name__)
+
+
+class CheckoutError(Exception):
+    def __init__(self, detail):
+        self.detail = detail
+        super().__init__(detail)
+
+    def as_data(self):
+        return {"detail": self.detail}
+
+
+class InsufficientStock(CheckoutError):
+    def __init__(self, shortfalls):
+        self.shortfalls = shortfalls
+        super().__init__("Insufficient stock")
+
+    def as_data(self):
+        return {"detail": self.detail, "items": self.shortfalls}
+
+
+def reserve_stock(quantities, held=None):
+    """
+    Decrement stock for a ``{product_id: quantity}`` mapping in one statement.
+
+    The UPDATE is guarded by ``stock >= quantity`` per product, plus the
+    units ``held`` for other carts, and its rows are locked through an
+    id-ordered ``FOR UPDATE`` subquery, so concurrent checkouts always lock
+    products in the same order and cannot deadlock. Must be called inside
+    ``transaction.atomic()``; on any shortfall the whole transaction is
+    expected to roll back.
+    """
+    held = held or {}
+    product_ids = sorted(quantities)
+    required = Case(
+        *[When(pk=product_id, then=Value(quantities[product_id])) for product_id in product_ids],
+        output_field=PositiveIntegerField(),
+    )
+    needed = Case(
+        *[
+            When(
+                pk=product_id,
+                then=Value(quantities[product_id] + held.get(product_id, 0)),
+            )
+            for product_id in product_ids
+        ],
+        output_field=PositiveIntegerField(),
+    )
+    locked = (
+        Product.objects.filter(pk__in=product_ids)
+        .order_by("pk")
+        .select_for_update()
+        .values("pk")
+    )
+    updated = Product.objects.filter(pk__in=locked, stock__gte=needed).update(
+        stock=F("stock") - required
+    )
+    if updated == len(product_ids):
+        return
+
+    stock = Product.objects.filter(pk__in=product_ids).values_list("id", "stock")
+    available = {
+        product_id: max(amount - held.get(product_id, 0), 0)
+        for product_id, amount in stock
+    }
+    raise InsufficientStock(
+        [
+            {
+                "product_id": product_id,
+                "requested": quantities[product_id],
+                "available": available.get(product_id, 0),
+            }
+            for product_id in product_ids
+            if available.get(product_id, 0) < quantities[product_id]
+        ]
+    )
+
+
+def record_order_stats(order):
+    """
+    Add ``order`` to its buyer's OrderStats row with a single upsert.
+
+    Must run in the transaction that creates the order so the counters can
+    never drift from the orders table. The row is written to the order's
+    database. Failed orders are taken back out by
+    :func:`remove_from_order_stats`.
+    """
+    connection = connections[order._state.db or DEFAULT_DB_ALIAS]
+    table = connection.ops.quote_name(OrderStats._meta.db_table)
+    # Orders can commit out of creation order; never move last_order_at back.
+    greatest = "MAX" if connection.vendor == "sqlite" else "GREATEST"
+    last_order_at = OrderStats._meta.get_field("last_order_at").get_db_prep_value(
+        order.created_at, connection
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} (user_id, order_count, total_spent, last_order_at)
+            VALUES (%s, 1, %s, %s)
+            ON CONFLICT (user_id) DO UPDATE SET
+                order_count = {table}.order_count + 1,
+                total_spent = {table}.total_spent + EXCLUDED.total_spent,
+                last_order_at = {greatest}({table}.last_order_at, EXCLUDED.last_order_at)
+            """,
+            [order.user_id, order.total_price, last_order_at],
+        )
+
+
+def remove_from_order_stats(order_ids, using):
+    """
+    Take failed orders out of their buyers' order counts and lifetime spend
+    with one UPDATE. Must run in the transaction that fails them.
+    """
+    totals = list(
+        Order.objects.using(using)
+        .filter(pk__in=order_ids)
+        .order_by()
+        .values("user_id")
+        .annotate(orders=Count("id"), spent=Sum("total_price"))
+    )
+    if not totals:
+        return
+
+    def per_user(field):
+        return Case(
+            *[When(user_id=row["user_id"], then=Value(row[field])) for row in totals],
+            default=Value(0),
+            output_field=PositiveBigIntegerField(),
+        )
+
+    OrderStats.objects.using(using).filter(
+        user_id__in=[row["user_id"] for row in totals]
+    ).update(
+        order_count=F("order_count") - per_user("orders"),
+        total_spent=F("total_spent") - per_user("spent"),
+    )
+
+
+def release_stock(quantities):
+    """
+    Return stock for a ``{product_id: quantity}`` mapping in one statement,
+    locking products in id order like :func:`reserve_stock`.
+    """
+    product_ids = sorted(quantities)
+    returned = Case(
+        *[When(pk=product_id, then=Value(quantities[product_id])) for product_id in product_ids],
+        output_field=PositiveIntegerField(),
+    )
+    locked = (
+        Product.objects.filter(pk__in=product_ids)
+        .order_by("pk")
+        .select_for_update()
+        .values("pk")
+    )
+    Product.objects.filter(pk__in=locked).update(stock=F("stock") + returned)
+
+
+def register_tracking_code(order, shard=DEFAULT_DB_ALIAS):
+    # The directory's primary key is the only constraint spanning every shard
+    # and partition; order tables are only unique per (code, created_at).
+    TrackingCodeDirectory.objects.create(
+        tracking_code=order.tracking_code,
+        user_id=order.user_id,
+        shard=shard,
+        order_id=order.pk,
+    )
+
+
+def raise_for_empty_cart(cart_id):
+    if not get_cart_store().exists(cart_id):
+        raise CheckoutError("Cart not found")
+    raise CheckoutError("Cart is empty")
+
+
+def checkout(user, cart_id):
+    """
+    Turn a cart into an order with a fixed number of queries.
+
+    The cart lines are claimed inside the checkout transaction, so a second
+    checkout of the same cart waits for it (or is refused) and then finds
+    nothing left to order. The claimed lines and their products are the
+    snapshot every later step (totals, order items, response) works from.
+    The stock decrement runs last so product rows stay locked only until
+    commit. The returned order has its ``items`` prefetched for serialization.
+    """
+    store = get_cart_store()
+    # The order lives on the buyer's shard; cart, stock and outbox are on
+    # default. The default transaction is nested so it commits first: if the
+    # shard commit then fails, stock is held back rather than oversold.
+    shard = shard_for_user(user)
+    claimed = False
+    try:
+        with transaction.atomic(using=shard), transaction.atomic():
+            try:
+                cart_items = store.claim(cart_id)
+            except CartNotFound:
+                raise CheckoutError("Cart not found")
+            except CartClaimed:
+                raise CheckoutError("Checkout already in progress")
+            claimed = True
+            if not cart_items:
+                raise CheckoutError("Cart is empty")
+
+            total_price = sum(item.quantity * item.product.price for item in cart_items)
+            order = create_with_tracking_code(
+                Order,
+                using=shard,
+                register=partial(register_tracking_code, shard=shard),
+                user=user,
+                total_price=total_price,
+            )
+            order_items = OrderItem.objects.using(shard).bulk_create(
+                [
+                    OrderItem(
+                        order=order,
+                        product=item.product,
+                        order_item_price=item.product.price,
+                        quantity=item.quantity,
+                        created_at=order.created_at,
+                    )
+                    for item in cart_items
+                ]
+            )
+            record_order_stats(order)
+            publish("send_order_confirmation", args=[order.pk, shard])
+            quantities = {item.product_id: item.quantity for item in cart_items}
+            reserve_stock(quantities, held=store.held_stock(cart_id, quantities))
+    except Exception:
+        if claimed:
+            store.release_claim(cart_id)
+        raise
+
+    order._prefetched_objects_cache = {"items": order_items}
+    return order
+
+
+def find_order(tracking_code):
+    """
+    Return the order with ``tracking_code`` from whichever shard holds it.
+
+    The directory on ``default`` maps the code to its shard and order id, so
+    one primary-key lookup per database is enough. Raises
+    ``Order.DoesNotExist`` for unknown codes.
+    """
+    try:
+        entry = TrackingCodeDirectory.objects.get(tracking_code=tracking_code)
+    except TrackingCodeDirectory.DoesNotExist:
+        raise Order.DoesNotExist(tracking_code)
+    return Order.objects.using(entry.shard).get(pk=entry.order_id)
+
+
+def enqueue_checkout(user, cart_id):
+    """
+    Record a checkout job for a worker to process and return it.
+
+    Only the cheap "cart has items" check runs in the request; stock and
+    totals are handled by the worker through :func:`checkout`.
+    """
+    from .tasks import process_checkout_jobs
+
+    if not get_cart_store().has_items(cart_id):
+        raise_for_empty_cart(cart_id)
+
+    job = CheckoutJob.objects.create(user=user, cart_id=cart_id)
+    transaction.on_commit(process_checkout_jobs.delay)
+    return job
+
+
+def process_checkout_job(job):
+    try:
+        job.order = checkout(job.user, job.cart_id)
+        job.status = CheckoutJob.STATUS_COMPLETE
+    except CheckoutError as exc:
+        job.error = exc.as_data()
+        job.status = CheckoutJob.STATUS_FAILED
+    except Exception:
+        # Anything else must not leave the job processing or abort the
+        # rest of the batch.
+        logger.exception("Checkout job %s failed", job.pk)
+        job.error = {"detail": "Checkout failed"}
+        job.status = CheckoutJob.STATUS_FAILED
+    job.processed_at = timezone.now()
+    job.save(update_fields=["order", "error", "status", "processed_at"])
+    return job
+
+
+# Payment status moves allowed by transition_orders: {from: (to, ...)}.
+# Failing an order returns its stock, so failed orders are final; a retried
+# payment needs a new checkout.
+ALLOWED_STATUS_TRANSITIONS = {
+    Order.PAYMENT_STATUS_PENDING: (
+        Order.PAYMENT_STATUS_COMPLETE,
+        Order.PAYMENT_STATUS_FAILED,
+    ),
+}
+
+
+def release_order_stock(order_ids, using, created_before=None):
+    """
+    Return the items of ``order_ids`` (on shard ``using``) to stock with one
+    aggregated UPDATE and return the number of units released.
+    """
+    items = OrderItem.objects.using(using).filter(order_id__in=order_ids)
+    if created_before is not None:
+        # Items share their order's created_at, which lets PostgreSQL prune
+        # item partitions newer than the cutoff.
+        items = items.filter(created_at__lt=created_before)
+    quantities = dict(
+        items.order_by()
+        .values("product_id")
+        .annotate(units=Sum("quantity"))
+        .values_list("product_id", "units")
+    )
+    if quantities:
+        release_stock(quantities)
+    return sum(quantities.values())
+
+
+def transition_orders(
+    order_ids, to_status, chunk_size=1000, using=DEFAULT_DB_ALIAS
+):
+    """
+    Move many orders on shard ``using`` to ``to_status`` with set-based updates.
+
+    Each chunk of ids is locked and read once, then updated with one
+    ``UPDATE ... WHERE id IN (...) AND payment_status = <from>`` per current
+    status. ``orders_status_changing`` is sent before each batch's UPDATE and
+    ``orders_status_changed`` after commit. Failed orders have their stock
+    returned in the same transaction.
+    Returns ``{order_id: result}`` where result is "updated", "unchanged",
+    "not_found" or "invalid_transition".
+    """
+    order_ids = list(dict.fromkeys(order_ids))
+    results = {}
+    for start in range(0, len(order_ids), chunk_size):
+        chunk = order_ids[start : start + chunk_size]
+        # As in expire_pending_orders, the shard commits first: if the stock
+        # commit then fails, units are lost rather than returned twice.
+        with transaction.atomic(), transaction.atomic(using=using):
+            current = dict(
+                Order.objects.using(using)
+                .select_for_update()
+                .filter(pk__in=chunk)
+                .values_list("id", "payment_status")
+            )
+            by_status = {}
+            for order_id in chunk:
+                from_status = current.get(order_id)
+                if from_status is None:
+                    results[order_id] = "not_found"
+                elif from_status == to_status:
+                    results[order_id] = "unchanged"
+                elif to_status not in ALLOWED_STATUS_TRANSITIONS.get(from_status, ()):
+                    results[order_id] = "invalid_transition"
+                else:
+                    by_status.setdefault(from_status, []).append(order_id)
+
+            for from_status, ids in by_status.items():
+                orders_status_changing.send(
+                    sender=Order,
+                    order_ids=ids,
+                    from_status=from_status,
+                    to_status=to_status,
+                    using=using,
+                )
+                Order.objects.using(using).filter(
+                    pk__in=ids, payment_status=from_status
+                ).update(payment_status=to_status)
+                if to_status == Order.PAYMENT_STATUS_FAILED:
+                    release_order_stock(ids, using)
+                    remove_from_order_stats(ids, using)
+                results.update(dict.fromkeys(ids, "updated"))
+                transaction.on_commit(
+                    partial(
+                        orders_status_changed.send,
+                        sender=Order,
+                        order_ids=ids,
+                        from_status=from_status,
+                        to_status=to_status,
+                        using=using,
+                    ),
+                    using=using,
+                )
+    return results
+
+
+def expire_pending_orders(older_than, chunk_size=500, using=DEFAULT_DB_ALIAS):
+    """
+    Fail pending orders on shard ``using`` placed more than ``older_than`` ago
+    and return their items to stock.
+
+    Orders are handled oldest first in chunks: each chunk is claimed with
+    SKIP LOCKED (so a concurrent payment update wins), marked failed with
+    one UPDATE and its units returned with one aggregated stock UPDATE, all
+    in one transaction. ``orders_status_changing`` and ``orders_status_changed``
+    are sent once per chunk.
+    Returns counts of orders, units and chunks.
+    """
+    cutoff = timezone.now() - older_than
+    result = {"orders": 0, "units": 0, "chunks": 0}
+    while True:
+        # The shard transaction is nested so it commits first: if the stock
+        # commit then fails, units are lost rather than returned twice.
+        with transaction.atomic(), transaction.atomic(using=using):
+            order_ids = list(
+                Order.objects.using(using)
+                .select_for_update(skip_locked=True)
+                .filter(
+                    payment_status=Order.PAYMENT_STATUS_PENDING, created_at__lt=cutoff
+                )
+                .order_by("created_at", "id")
+                .values_list("id", flat=True)[:chunk_size]
+            )
+            if not order_ids:
+                break
+
+            orders_status_changing.send(
+                sender=Order,
+                order_ids=order_ids,
+                from_status=Order.PAYMENT_STATUS_PENDING,
+                to_status=Order.PAYMENT_STATUS_FAILED,
+                using=using,
+            )
+            Order.objects.using(using).filter(
+                pk__in=order_ids, payment_status=Order.PAYMENT_STATUS_PENDING
+            ).update(payment_status=Order.PAYMENT_STATUS_FAILED)
+            units = release_order_stock(order_ids, using, created_before=cutoff)
+            remove_from_order_stats(order_ids, using)
+            transaction.on_commit(
+                partial(
+                    orders_status_changed.send,
+                    sender=Order,
+                    order_ids=order_ids,
+                    from_status=Order.PAYMENT_STATUS_PENDING,
+                    to_status=Order.PAYMENT_STATUS_FAILED,
+                    using=using,
+                ),
+                using=using,
+            )
+        result["orders"] += len(order_ids)
+        result["units"] += units
+        result["chunks"] += 1
+        if len(order_ids) < chunk_size:
+            break
+    return result
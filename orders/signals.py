@@ -0,0 +1,59 @@
+from django.contrib.auth import get_user_model
+from django.db.models import ProtectedError
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import Signal, receiver
+from products.models import Product
+from .models import Order, OrderItem, OrderStats
+from .sharding import order_shards
+
+# Sent once per batch of orders moved between payment statuses, after the
+# transaction commits, with ``order_ids``, ``from_status``, ``to_status`` and
+# ``using`` (the shard holding the orders).
+orders_status_changed = Signal()
+
+# Sent with the same arguments inside the transaction that moves a batch of
+# orders, before their status is updated and while the orders are locked.
+# Receivers may write to ``default`` as part of that transaction.
+orders_status_changing = Signal()
+
+
+# The deletion collector only follows relations on the database it deletes
+# from, so PROTECT and CASCADE towards orders on other shards are enforced
+# here.
+
+
+def other_shards(using):
+    return [shard for shard in order_shards() if shard != using]
+
+
+def protect(instance, queryset, field):
+    objects = set(queryset[:100])
+    if objects:
+        raise ProtectedError(
+            f"Cannot delete some instances of model {type(instance).__name__!r} "
+            f"because they are referenced through protected foreign keys: "
+            f"{field!r}.",
+            objects,
+        )
+
+
+@receiver(pre_delete, sender=get_user_model())
+def protect_buyers(sender, instance, using, **kwargs):
+    for shard in other_shards(using):
+        protect(instance, Order.objects.using(shard).filter(user=instance), "Order.user")
+
+
+@receiver(post_delete, sender=get_user_model())
+def delete_buyer_stats(sender, instance, using, **kwargs):
+    for shard in other_shards(using):
+        OrderStats.objects.using(shard).filter(user_id=instance.pk).delete()
+
+
+@receiver(pre_delete, sender=Product)
+def protect_ordered_products(sender, instance, using, **kwargs):
+    for shard in other_shards(using):
+        protect(
+            instance,
+            OrderItem.objects.using(shard).filter(product=instance),
+            "OrderItem.product",
+        )
@@ -0,0 +1,111 @@
+import logging
+import time
+from datetime import timedelta
+from celery import shared_task
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+from .carts import purge_abandoned_carts
+from .models import CheckoutJob, Order
+from .services import expire_pending_orders, process_checkout_job
+from .sharding import order_shards
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(name="process_checkout_jobs")
+def process_checkout_jobs(batch_size=None):
+    batch_size = batch_size or settings.ORDER_CHECKOUT_BATCH_SIZE
+
+    with transaction.atomic():
+        job_ids = list(
+            CheckoutJob.objects.select_for_update(skip_locked=True)
+            .filter(status=CheckoutJob.STATUS_PENDING)
+            .order_by("created_at")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        CheckoutJob.objects.filter(pk__in=job_ids).update(
+            status=CheckoutJob.STATUS_PROCESSING, started_at=timezone.now()
+        )
+
+    jobs = CheckoutJob.objects.filter(pk__in=job_ids).select_related("user")
+    for job in jobs.order_by("created_at"):
+        process_checkout_job(job)
+
+    # A full batch means more jobs may be waiting; keep draining in small
+    # steps instead of letting one task grab the whole backlog.
+    if len(job_ids) == batch_size:
+        process_checkout_jobs.delay(batch_size)
+
+    return len(job_ids)
+
+
+@shared_task(name="reap_stuck_checkout_jobs")
+def reap_stuck_checkout_jobs():
+    # A worker that died mid-job leaves it processing forever; give up on it
+    # so the client polling the job gets an answer.
+    cutoff = timezone.now() - timedelta(seconds=settings.ORDER_CHECKOUT_JOB_TIMEOUT)
+    reaped = CheckoutJob.objects.filter(
+        status=CheckoutJob.STATUS_PROCESSING, started_at__lt=cutoff
+    ).update(
+        status=CheckoutJob.STATUS_FAILED,
+        error={"detail": "Checkout timed out"},
+        processed_at=timezone.now(),
+    )
+    if reaped:
+        logger.warning("Failed %s checkout jobs stuck in processing", reaped)
+    return reaped
+
+
+@shared_task(name="purge_abandoned_carts")
+def purge_abandoned_carts_task():
+    result = purge_abandoned_carts(
+        timedelta(days=settings.CART_EXPIRE_DAYS),
+        chunk_size=settings.CART_PURGE_CHUNK_SIZE,
+        pause=settings.CART_PURGE_PAUSE_SECONDS,
+    )
+    logger.info(
+        "Purged %s abandoned carts (%s items) in %s chunks in %.2fs",
+        result["carts"],
+        result["items"],
+        result["chunks"],
+        result["seconds"],
+    )
+    return result
+
+
+@shared_task(name="send_order_confirmation")
+def send_order_confirmation(order_id, using=DEFAULT_DB_ALIAS):
+    order = Order.objects.using(using).filter(pk=order_id).first()
+    if order is None or not order.user.email:
+        return
+    send_mail(
+        "Order confirmation",
+        f"Your order {order.tracking_code} for {order.total_price} has been "
+        "placed.",
+        settings.EMAIL_HOST_USER,
+        [order.user.email],
+    )
+
+
+@shared_task(name="expire_pending_orders")
+def expire_pending_orders_task():
+    started = time.monotonic()
+    result = {"orders": 0, "units": 0, "chunks": 0}
+    for shard in order_shards():
+        expired = expire_pending_orders(
+            timedelta(minutes=settings.ORDER_PENDING_EXPIRE_MINUTES),
+            chunk_size=settings.ORDER_EXPIRY_CHUNK_SIZE,
+            using=shard,
+        )
+        for key in result:
+            result[key] += expired[key]
+    logger.info(
+        "Expired %s pending orders and released %s units in %s chunks in %.2fs",
+        result["orders"],
+        result["units"],
+        result["chunks"],
+        time.monotonic() - started,
+    )
+    return result
@@ -1,10 +1,78 @@
+import gzip
+import json
 import pytest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from io import StringIO
+from django.core.management import call_command
 from rest_framework import status
 from rest_framework.test import APIClient
 from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db import connection, transaction
+from django.db.models import ProtectedError
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from products.models import Product, Category, ProductCategory
-from orders.models import Cart, CartItem
+from orders.carts import (
+    MAX_CART_QUANTITY,
+    CartClaimed,
+    CartNotFound,
+    CartStore,
+    CartQuantityError,
+    ORMCartStore,
+    RedisCartStore,
+    cart_version,
+    purge_abandoned_carts,
+)
+from orders.reservations import ReservingCartStore, StockReservations
+from orders.models import (
+    ArchivedOrder,
+    Cart,
+    CartItem,
+    CheckoutJob,
+    Order,
+    OrderItem,
+    OrderStats,
+    TrackingCodeDirectory,
+)
+from orders.signals import orders_status_changed
+from reports.models import DailySales
+from reports.rollups import update_sales_rollups
+from orders.partitions import (
+    add_months,
+    archive_partition,
+    create_partitions,
+    detach_partitions,
+    list_partitions,
+    month_start,
+    partition_month,
+    partition_name,
+)
+from orders.services import (
+    CheckoutError,
+    InsufficientStock,
+    checkout,
+    expire_pending_orders,
+    find_order,
+    record_order_stats,
+    register_tracking_code,
+    reserve_stock,
+    transition_orders,
+)
+from orders.sharding import OrderShardRouter, shard_for_user
+from orders import idempotency, services
+from orders.tasks import process_checkout_jobs, reap_stuck_checkout_jobs
+from orders.tracking import (
+    RandomTrackingCodeGenerator,
+    SequenceTrackingCodeGenerator,
+    WorkerIdLease,
+    create_with_tracking_code,
+)
+from swiftorder.redis_client import get_redis
 from uuid import uuid4
 
 
@@ -149,3 +217,943 @@ def test_cart_is_empty_when_creating_order(api_client, jwt_token, user):
 
     cart.refresh_from_db()
     assert cart.items.count() == 0
+
+
+@pytest.mark.django_db
+def test_create_order_decrements_stock(api_client, jwt_token, cart, product):
+    api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {jwt_token}")
+    url = reverse("orders:orders-list")
+    response = api_client.post(url, {"cart_id": str(cart.id)}, format="json")
+    assert response.status_code == status.HTTP_201_CREATED
+
+    product.refresh_from_db()
+    assert product.stock == 8
+
+
+@pytest.mark.django_db
+def test_create_order_with_insufficient_stock(api_client, jwt_token, user, cart, product):
+    api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {jwt_token}")
+    other = Product.objects.create(name="Charger", price=20, stock=1, created_by=user)
+    CartItem.objects.create(cart=cart, product=other, quantity=3)
+    Product.objects.filter(pk=product.pk).update(stock=1)
+
+    url = reverse("orders:orders-list")
+    response = api_client.post(url, {"cart_id": str(cart.id)}, format="json")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.data["detail"] == "Insufficient stock"
+    assert response.data["items"] == [
+        {"product_id": product.id, "requested": 2, "available": 1},
+        {"product_id": other.id, "requested": 3, "available": 1},
+    ]
+
+    other.refresh_from_db()
+    assert other.stock == 1
+    assert cart.items.count() == 2
+    assert not Order.objects.exists()
+
+
+@pytest.mark.django_db
+def test_create_order_query_count_is_constant(api_client, jwt_token, user):
+    api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {jwt_token}")
+    url = reverse("orders:orders-list")
+
+    def checkout_queries(lines):
+        cart = Cart.objects.create()
+        for i in range(lines):
+            product = Product.objects.create(
+                name=f"Product {i}", price=10, stock=10, created_by=user
+            )
+            CartItem.objects.create(cart=cart, product=product, quantity=1)
+        with CaptureQueriesContext(connection) as ctx:
+            response = api_client.post(url, {"cart_id": str(cart.id)}, format="json")
+        assert response.status_code == status.HTTP_201_CREATED
+        assert len(response.data["items"]) == lines
+        return len(ctx.captured_queries)
+
+    assert checkout_queries(1) == checkout_queries(6)
+
+
+class FixedLease:
+    def __init__(self, worker_id):
+        self.worker_id = worker_id
+
+    def current(self):
+        return self.worker_id
+
+
+def test_sequence_tracking_codes_are_unique_and_ordered():
+    generator = SequenceTrackingCodeGenerator(lease=FixedLease(1))
+    codes = [generator.generate() for _ in range(10_000)]
+    assert len(set(codes)) == len(codes)
+    assert codes == sorted(codes)
+    assert all(len(code) == 16 for code in codes)
+
+    # Another worker in the same milliseconds never repeats a code.
+    other = SequenceTrackingCodeGenerator(lease=FixedLease(2))
+    assert not set(codes) & {other.generate() for _ in range(10_000)}
+
+
+def test_tracking_worker_ids_are_leased_once():
+    client = redis_cart_store().redis
+    first = WorkerIdLease(2, client=client, ttl=60)
+    second = WorkerIdLease(2, client=client, ttl=60)
+    try:
+        assert first.current() != second.current()
+        assert first.current() == first.current()
+
+        # A lost lease is replaced instead of shared.
+        client.set(first.key(first.worker_id), "someone else")
+        first._renewed = 0
+        assert first.current() not in (second.worker_id, None)
+    finally:
+        client.delete(*[first.key(worker_id) for worker_id in range(4)])
+
+
+@pytest.mark.django_db
+def test_random_tracking_code_retries_on_collision(user):
+    # An order from another shard or month only collides in the directory.
+    TrackingCodeDirectory.objects.create(
+        tracking_code="A" * 16, user=user, shard="elsewhere", order_id=1
+    )
+
+    class CollidingGenerator(RandomTrackingCodeGenerator):
+        codes = iter(["A" * 16, "B" * 16])
+
+        def generate(self):
+            return next(self.codes)
+
+    order = create_with_tracking_code(
+        Order,
+        generator=CollidingGenerator(),
+        register=register_tracking_code,
+        user=user,
+        total_price=0,
+    )
+    assert order.tracking_code == "B" * 16
+    assert list(Order.objects.values_list("tracking_code", flat=True)) == ["B" * 16]
+    assert find_order("B" * 16) == order
+
+    sequenced = create_with_tracking_code(
+        Order,
+        generator=SequenceTrackingCodeGenerator(lease=FixedLease(3)),
+        register=register_tracking_code,
+        user=user,
+        total_price=0,
+    )
+    assert find_order(sequenced.tracking_code) == sequenced
+
+
+def test_archived_orders_are_read_only():
+    with pytest.raises(PermissionDenied):
+        ArchivedOrder(id=1).save()
+    with pytest.raises(PermissionDenied):
+        ArchivedOrder(id=1).delete()
+
+
+@pytest.mark.django_db
+def test_create_order_async(
+    api_client, jwt_token, cart, product, django_capture_on_commit_callbacks
+):
+    api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {jwt_token}")
+    url = reverse("orders:orders-list")
+    with django_capture_on_commit_callbacks() as callbacks:
+        response = api_client.post(
+            url,
+            {"cart_id": str(cart.id)},
+            format="json",
+            HTTP_PREFER="respond-async",
+        )
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    assert response.data["status"] == CheckoutJob.STATUS_PENDING
+    assert not Order.objects.exists()
+
+    process_checkout_jobs()
+    assert len(callbacks) == 1
+
+    response = api_client.get(response["Location"])
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["status"] == CheckoutJob.STATUS_COMPLETE
+    assert response.data["order"]["items"][0]["quantity"] == 2
+    product.refresh_from_db()
+    assert product.stock == 8
+
+
+@pytest.mark.django_db
+def test_checkout_job_errors_fail_the_job_and_stuck_jobs_are_reaped(
+    user, cart, monkeypatch
+):
+    broken = CheckoutJob.objects.create(user=user, cart_id=uuid4())
+    working = CheckoutJob.objects.create(user=user, cart_id=cart.id)
+    real_checkout = services.checkout
+
+    def checkout(job_user, cart_id):
+        if cart_id == broken.cart_id:
+            raise RuntimeError("database went away")
+        return real_checkout(job_user, cart_id)
+
+    monkeypatch.setattr(services, "checkout", checkout)
+    assert process_checkout_jobs() == 2
+    broken.refresh_from_db()
+    working.refresh_from_db()
+    assert broken.status == CheckoutJob.STATUS_FAILED
+    assert broken.error == {"detail": "Checkout failed"}
+    assert working.status == CheckoutJob.STATUS_COMPLETE
+
+    stuck = CheckoutJob.objects.create(
+        user=user,
+        cart_id=uuid4(),
+        status=CheckoutJob.STATUS_PROCESSING,
+        started_at=timezone.now() - timedelta(hours=1),
+    )
+    assert reap_stuck_checkout_jobs() == 1
+    stuck.refresh_from_db()
+    assert stuck.status == CheckoutJob.STATUS_FAILED
+
+
+@pytest.mark.django_db
+def test_create_order_async_with_empty_cart(api_client, jwt_token):
+    api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {jwt_token}")
+    url = reverse("orders:orders-list")
+    cart = Cart.objects.create()
+    response = api_client.post(
+        url, {"cart_id": str(cart.id)}, format="json", HTTP_PREFER="respond-async"
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.data["detail"] == "Cart is empty"
+    assert not CheckoutJob.objects.exists()
+
+
+@pytest.mark.django_db
+def test_create_order_idempotency_key_replays_response(api_client, jwt_token, cart):
+    api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {jwt_token}")
+    url = reverse("orders:orders-list")
+    data = {"cart_id": str(cart.id)}
+    key = str(uuid4())
+
+    first = api_client.post(url, data, format="json", HTTP_IDEMPOTENCY_KEY=key)
+    second = api_client.post(url, data, format="json", HTTP_IDEMPOTENCY_KEY=key)
+    assert first.status_code == status.HTTP_201_CREATED
+    assert second.status_code == status.HTTP_201_CREATED
+    assert second["Idempotent-Replayed"] == "true"
+    assert second.data["tracking_code"] == first.data["tracking_code"]
+    assert Order.objects.count() == 1
+
+    other = api_client.post(
+        url, {"cart_id": str(uuid4())}, format="json", HTTP_IDEMPOTENCY_KEY=key
+    )
+    assert other.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.django_db
+def test_idempotency_key_replays_response_stored_before_lock(
+    api_client, jwt_token, cart, monkeypatch
+):
+    api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {jwt_token}")
+    url = reverse("orders:orders-list")
+    data = {"cart_id": str(cart.id)}
+    key = str(uuid4())
+    first = api_client.post(url, data, format="json", HTTP_IDEMPOTENCY_KEY=key)
+
+    # The retry's first read misses, as if it ran just before the first
+    # request stored its response and released the lock.
+    real_get = idempotency.cache.get
+    reads = []
+
+    def racing_get(cache_key, *args, **kwargs):
+        reads.append(cache_key)
+        return None if len(reads) == 1 else real_get(cache_key, *args, **kwargs)
+
+    monkeypatch.setattr(idempotency.cache, "get", racing_get)
+    second = api_client.post(url, data, format="json", HTTP_IDEMPOTENCY_KEY=key)
+    assert second["Idempotent-Replayed"] == "true"
+    assert second.data["tracking_code"] == first.data["tracking_code"]
+    assert Order.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_add_item_to_cart_idempotency_key(api_client, product):
+    cart = Cart.objects.create()
+    url = reverse("orders:cart-items-list", kwargs={"cart_pk": cart.id})
+    data = {"product_id": product.id, "quantity": 2}
+    key = str(uuid4())
+    for _ in range(3):
+        response = api_client.post(url, data, format="json", HTTP_IDEMPOTENCY_KEY=key)
+        assert response.status_code == status.HTTP_201_CREATED
+    assert CartItem.objects.get(cart=cart).quantity == 2
+
+
+@pytest.mark.django_db
+def test_order_list_is_scoped_and_cursor_paginated(api_client, jwt_token, user, product):
+    api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {jwt_token}")
+    other = get_user_model().objects.create_user(
+        email="other@example.com", username="other@example.com", password="password"
+    )
+    Order.objects.create(user=other, total_price=0, tracking_code="OTHER")
+    for i in range(12):
+        order = Order.objects.create(user=user, total_price=10, tracking_code=f"T{i}")
+        OrderItem.objects.create(
+            order=order, product=product, order_item_price=10, quantity=1
+        )
+
+    url = reverse("orders:orders-list")
+    with CaptureQueriesContext(connection) as ctx:
+        response = api_client.get(url)
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.data["results"]) == 10
+    assert "OTHER" not in [o["tracking_code"] for o in response.data["results"]]
+    first_page_queries = len(ctx.captured_queries)
+
+    with CaptureQueriesContext(connection) as ctx:
+        response = api_client.get(response.data["next"])
+    assert len(response.data["results"]) == 2
+    assert response.data["next"] is None
+    assert len(ctx.captured_queries) == first_page_queries
+
+
+def test_cart_store_is_abstract():
+    class PartialStore(CartStore):
+        def create_cart(self):
+            pass
+
+    with pytest.raises(TypeError):
+        PartialStore()
+
+
+@pytest.mark.django_db
+def test_checkout_claims_cart_lines_once(user, cart, product):
+    [item] = checkout(user, cart.id).items.all()
+    assert item.quantity == 2
+    assert not cart.items.exists()
+    with pytest.raises(CheckoutError, match="Cart is empty"):
+        checkout(user, cart.id)
+    with pytest.raises(CheckoutError, match="Cart not found"):
+        checkout(user, uuid4())
+    assert Order.objects.count() == 1
+
+    # A failed checkout leaves the cart as it was.
+    CartItem.objects.create(cart=cart, product=product, quantity=product.stock + 1)
+    with pytest.raises(CheckoutError):
+        checkout(user, cart.id)
+    assert cart.items.get().quantity == product.stock + 1
+
+
+@pytest.mark.django_db
+def test_checkout_updates_order_stats(api_client, jwt_token, user, cart, product):
+    api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {jwt_token}")
+    url = reverse("orders:orders-list")
+    api_client.post(url, {"cart_id": str(cart.id)}, format="json")
+    CartItem.objects.create(cart=cart, product=product, quantity=1)
+    api_client.post(url, {"cart_id": str(cart.id)}, format="json")
+
+    stats = OrderStats.objects.get(user=user)
+    assert stats.order_count == 2
+    assert stats.total_spent == 3000
+    assert str(Order.objects.select_related("user__order_stats").first()).endswith(
+        "(2 orders)"
+    )
+
+    response = api_client.get(reverse("account:user-profile"))
+    assert response.data["order_stats"]["order_count"] == 2
+
+    # A late-committing older order doesn't move last_order_at back.
+    latest = stats.last_order_at
+    late = Order(user=user, total_price=0, created_at=latest - timedelta(hours=1))
+    record_order_stats(late)
+    stats.refresh_from_db()
+    assert stats.last_order_at == latest
+    OrderStats.objects.filter(user=user).update(order_count=2)
+
+    first = Order.objects.order_by("id").first()
+    transition_orders([first.pk], Order.PAYMENT_STATUS_FAILED)
+    stats.refresh_from_db()
+    assert (stats.order_count, stats.total_spent) == (1, 1000)
+
+
+@pytest.mark.django_db
+def test_rebuild_order_stats_command(user):
+    Order.objects.create(user=user, total_price=10, tracking_code="T1")
+    Order.objects.create(user=user, total_price=15, tracking_code="T2")
+    Order.objects.create(
+        user=user,
+        total_price=20,
+        tracking_code="T3",
+        payment_status=Order.PAYMENT_STATUS_FAILED,
+    )
+    OrderStats.objects.create(user=user, order_count=99, total_spent=1)
+
+    call_command("rebuild_order_stats", stdout=StringIO())
+
+    stats = OrderStats.objects.get(user=user)
+    assert (stats.order_count, stats.total_spent) == (2, 25)
+
+
+@pytest.mark.django_db
+def test_export_orders_streams_csv_and_ndjson(api_client, jwt_token, user, product):
+    api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {jwt_token}")
+    order = Order.objects.create(user=user, total_price=20, tracking_code="T1")
+    OrderItem.objects.create(order=order, product=product, order_item_price=10, quantity=2)
+    Order.objects.create(
+        user=user,
+        total_price=5,
+        tracking_code="T2",
+        payment_status=Order.PAYMENT_STATUS_FAILED,
+    ).items.create(product=product, order_item_price=5, quantity=1)
+    url = reverse("orders:orders-export")
+
+    response = api_client.get(url, {"payment_status": "P"})
+    assert response.status_code == status.HTTP_200_OK
+    lines = b"".join(response.streaming_content).decode().splitlines()
+    assert lines[0].startswith("order_id,tracking_code")
+    assert len(lines) == 2 and ",T1," in lines[1]
+
+    response = api_client.get(url, {"file_format": "ndjson", "gzip": "true"})
+    rows = gzip.decompress(b"".join(response.streaming_content)).splitlines()
+    assert [json.loads(row)["tracking_code"] for row in rows] == ["T1", "T2"]
+
+
+@pytest.mark.django_db
+def test_export_orders_requires_admin(api_client, user):
+    user.role = "user"
+    user.save()
+    api_client.force_authenticate(user=user)
+    response = api_client.get(reverse("orders:orders-export"))
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.django_db
+def test_order_created_at_is_not_touched_on_save(api_client, jwt_token, cart):
+    api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {jwt_token}")
+    api_client.post(reverse("orders:orders-list"), {"cart_id": str(cart.id)}, format="json")
+    order = Order.objects.get()
+    created_at = order.created_at
+    assert order.items.get().created_at == created_at
+
+    order.payment_status = Order.PAYMENT_STATUS_COMPLETE
+    order.save()
+    order.refresh_from_db()
+    assert order.created_at == created_at
+
+
+def test_partition_month_helpers():
+    assert add_months(date(2024, 11, 1), 3) == date(2025, 2, 1)
+    assert add_months(date(2024, 1, 1), -1) == date(2023, 12, 1)
+    assert partition_name("orders_order", date(2024, 2, 1)) == "orders_order_p2024_02"
+    assert partition_month("orders_order", "orders_order_p2024_02") == date(2024, 2, 1)
+    assert partition_month("orders_order", "orders_orderitem_p2024_02") is None
+    assert partition_month("orders_order", "orders_order_default") is None
+
+
+@pytest.mark.django_db
+def test_partitions_take_default_rows_and_archive_clears_directory(user):
+    if connection.vendor != "postgresql":
+        pytest.skip("Order partitions are PostgreSQL only")
+    # Far enough ahead that no partition exists yet and the row lands in default.
+    month = add_months(month_start(timezone.now()), 120)
+    order = Order.objects.create(user=user, total_price=10, tracking_code="FAR-AHEAD")
+    register_tracking_code(order)
+    Order.objects.filter(pk=order.pk).update(
+        created_at=timezone.make_aware(datetime(month.year, month.month, 15))
+    )
+
+    with connection.cursor() as cursor:
+        assert partition_name("orders_order", month) in create_partitions(cursor, month, 1)
+        assert month in list_partitions(cursor, "orders_order")
+        assert find_order("FAR-AHEAD").pk == order.pk
+
+        detach_partitions(cursor, add_months(month, 1))
+        assert archive_partition(cursor, month) == 1
+
+    assert ArchivedOrder.objects.filter(pk=order.pk).exists()
+    assert not TrackingCodeDirectory.objects.filter(tracking_code="FAR-AHEAD").exists()
+    with pytest.raises(Order.DoesNotExist):
+        find_order("FAR-AHEAD")
+
+
+@pytest.mark.django_db
+def test_update_cart_item_quantity_checks_stock(api_client, cart, product):
+    item = cart.items.get()
+    url = reverse(
+        "orders:cart-items-detail", kwargs={"cart_pk": cart.id, "pk": item.id}
+    )
+    response = api_client.patch(url, {"quantity": 4}, format="json")
+    assert response.status_code == status.HTTP_200_OK
+    assert CartItem.objects.get(pk=item.id).quantity == 4
+
+    response = api_client.patch(url, {"quantity": product.stock + 1}, format="json")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert CartItem.objects.get(pk=item.id).quantity == 4
+
+    response = api_client.delete(url)
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    assert not cart.items.exists()
+
+
+@pytest.mark.django_db
+def test_bulk_cart_items_upserts_in_few_queries(api_client, user, cart, product):
+    products = [
+        Product.objects.create(name=f"P{i}", price=10, stock=5, created_by=user)
+        for i in range(20)
+    ]
+    url = reverse("orders:cart-items-bulk", kwargs={"cart_pk": cart.id})
+    items = [{"product_id": p.id, "quantity": 3} for p in products]
+    items.append({"product_id": product.id, "quantity": 0})
+
+    with CaptureQueriesContext(connection) as queries:
+        response = api_client.post(url, {"items": items}, format="json")
+    assert response.status_code == status.HTTP_200_OK
+    assert len(queries) <= 10
+    assert len(response.data["items"]) == 20
+    assert response.data["total_price"] == 20 * 3 * 10
+    assert not cart.items.filter(product=product).exists()
+
+    items = [
+        {"product_id": products[0].id, "quantity": 6},
+        {"product_id": 0, "quantity": 1},
+    ]
+    response = api_client.post(url, {"items": items}, format="json")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert cart.items.get(product=products[0]).quantity == 3
+
+
+@pytest.mark.django_db
+def test_add_item_to_cart_is_one_statement_and_guards_stock(api_client, cart, product):
+    url = reverse("orders:cart-items-list", kwargs={"cart_pk": cart.id})
+    store = ORMCartStore()
+    with CaptureQueriesContext(connection) as queries:
+        assert store.add_item(cart.id, product.id, 3).quantity == 5
+    assert sum("INSERT" in query["sql"] for query in queries) == 1
+    assert len(queries) <= 4  # savepoint, touch cart, upsert, release
+
+    data = {"product_id": product.id, "quantity": product.stock - 4}
+    response = api_client.post(url, data, format="json")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert cart.items.get().quantity == 5
+
+
+@pytest.mark.django_db
+def test_add_item_to_missing_cart_or_past_smallint(api_client, cart, product):
+    store = ORMCartStore()
+    cart.items.all().delete()
+    with transaction.atomic():
+        with pytest.raises(CartNotFound):
+            store.add_item(uuid4(), product.id, 1)
+        assert not CartItem.objects.exists()
+
+    product.stock = 40000
+    product.save()
+    store.add_item(cart.id, product.id, MAX_CART_QUANTITY)
+    with pytest.raises(CartQuantityError):
+        store.add_item(cart.id, product.id, 1)
+
+    url = reverse("orders:cart-items-list", kwargs={"cart_pk": cart.id})
+    data = {"product_id": product.id, "quantity": MAX_CART_QUANTITY + 1}
+    response = api_client.post(url, data, format="json")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert cart.items.get().quantity == MAX_CART_QUANTITY
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_add_to_cart_keeps_every_increment(user):
+    if connection.vendor != "postgresql":
+        pytest.skip("SQLite locks whole tables instead of serializing on rows")
+    product = Product.objects.create(name="Hot", price=5, stock=40, created_by=user)
+    cart = Cart.objects.create()
+    store = ORMCartStore()
+
+    def add(_):
+        try:
+            store.add_item(cart.id, product.id, 1)
+            return True
+        except CartQuantityError:
+            return False
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        added = list(pool.map(add, range(50)))
+
+    assert added.count(True) == 40
+    assert CartItem.objects.get(cart=cart, product=product).quantity == 40
+
+
+@pytest.mark.django_db
+def test_purge_abandoned_carts_in_chunks(
+    cart, product, django_capture_on_commit_callbacks
+):
+    stale = [Cart.objects.create() for _ in range(5)]
+    for old in stale[:3]:
+        CartItem.objects.create(cart=old, product=product, quantity=1)
+    Cart.objects.update(last_update=timezone.now() - timedelta(days=40))
+    versions = [cart_version(old.pk) for old in stale]
+
+    ORMCartStore().add_item(cart.id, product.id, 1)
+    with django_capture_on_commit_callbacks(execute=True):
+        result = purge_abandoned_carts(timedelta(days=30), chunk_size=2, pause=0)
+
+    assert all(
+        cart_version(old.pk) != version for old, version in zip(stale, versions)
+    )
+
+    assert (result["carts"], result["items"], result["chunks"]) == (5, 3, 3)
+    assert list(Cart.objects.values_list("pk", flat=True)) == [cart.pk]
+    assert cart.items.get().quantity == 3
+
+
+@pytest.mark.django_db
+def test_retrieve_cart_uses_sql_totals_cache_and_etag(
+    api_client, user, cart, product, django_capture_on_commit_callbacks
+):
+    other = Product.objects.create(name="Case", price=30, stock=5, created_by=user)
+    CartItem.objects.create(cart=cart, product=other, quantity=3)
+    url = reverse("orders:carts-detail", kwargs={"pk": cart.id})
+
+    with CaptureQueriesContext(connection) as queries:
+        response = api_client.get(url)
+    assert response.status_code == status.HTTP_200_OK
+    assert len(queries) == 2
+    assert response.data["total_price"] == 2 * 1000 + 3 * 30
+    assert [item["total_price"] for item in response.data["items"]] == [2000, 90]
+    etag = response["ETag"]
+
+    with CaptureQueriesContext(connection) as queries:
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert api_client.get(url).data["total_price"] == 2090
+    assert len(queries) == 0
+
+    with django_capture_on_commit_callbacks(execute=True):
+        ORMCartStore().add_item(cart.id, product.id, 1)
+    response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == status.HTTP_200_OK
+    assert response["ETag"] != etag
+    assert response.data["total_price"] == 3090
+
+
+def redis_cart_store():
+    client = get_redis("redis://localhost:6379/15")
+    try:
+        client.ping()
+    except Exception:
+        pytest.skip("Redis is not available")
+    return RedisCartStore(client)
+
+
+@pytest.mark.django_db
+def test_redis_cart_store(product):
+    store = redis_cart_store()
+    cart = store.create_cart()
+    try:
+        assert store.exists(cart.id) and not store.has_items(cart.id)
+        store.add_item(cart.id, product.id, 2)
+        assert store.add_item(cart.id, product.id, 3).quantity == 5
+        with pytest.raises(CartQuantityError):
+            store.add_item(cart.id, product.id, product.stock)
+        with pytest.raises(CartNotFound):
+            store.add_item(uuid4(), product.id, 1)
+
+        store.set_quantity(cart.id, product.id, 1)
+        [item] = store.get_cart(cart.id).items.all()
+        assert (item.product, item.quantity) == (product, 1)
+        assert store.remove_item(cart.id, product.id)
+        store.set_items(cart.id, {product.id: 4})
+        assert store.get_item(cart.id, product.id).quantity == 4
+        store.set_items(cart.id, {product.id: 0})
+        assert store.get_items(cart.id) == []
+    finally:
+        store.delete_cart(cart.id)
+
+
+@pytest.mark.django_db
+def test_redis_checkout_claims_the_cart_once(product, django_capture_on_commit_callbacks):
+    store = redis_cart_store()
+    cart = store.create_cart()
+    try:
+        store.add_item(cart.id, product.id, 2)
+        with django_capture_on_commit_callbacks(execute=True):
+            [item] = store.claim(cart.id)
+            assert item.quantity == 2
+            with pytest.raises(CartClaimed):
+                store.claim(cart.id)
+            # A line added during checkout outlives it.
+            store.add_item(cart.id, product.id, 1)
+        assert store.get_item(cart.id, product.id).quantity == 1
+
+        store.claim(cart.id)
+        store.release_claim(cart.id)
+        assert store.claim(cart.id)[0].quantity == 1
+    finally:
+        store.delete_cart(cart.id)
+
+
+@pytest.mark.django_db
+def test_reserve_stock_leaves_other_carts_holds(product):
+    with transaction.atomic():
+        with pytest.raises(InsufficientStock) as exc:
+            reserve_stock({product.id: 5}, held={product.id: 6})
+        assert exc.value.shortfalls[0]["available"] == 4
+        reserve_stock({product.id: 4}, held={product.id: 6})
+    product.refresh_from_db()
+    assert product.stock == 6
+
+
+@pytest.mark.django_db
+def test_stock_reservations_hold_and_release(
+    product, django_capture_on_commit_callbacks
+):
+    client = redis_cart_store().redis
+    store = ReservingCartStore(ORMCartStore(), StockReservations(client))
+    first, second = Cart.objects.create(), Cart.objects.create()
+    try:
+        store.add_item(first.id, product.id, 7)
+        assert store.reservations.held([product.id]) == {product.id: 7}
+        with pytest.raises(CartQuantityError):
+            store.add_item(second.id, product.id, 4)
+        assert not second.items.exists()
+        store.add_item(second.id, product.id, 3)
+        with pytest.raises(CartQuantityError):
+            store.set_items(second.id, {product.id: 4})
+        assert store.held_stock(first.id, [product.id]) == {product.id: 3}
+        assert store.held_stock(second.id, [product.id]) == {product.id: 7}
+
+        store.remove_item(first.id, first.items.get().id)
+        assert store.reservations.held([product.id]) == {product.id: 3}
+
+        with django_capture_on_commit_callbacks(execute=True):
+            store.claim(second.id)
+        assert store.reservations.held([product.id]) == {product.id: 0}
+    finally:
+        client.delete(*StockReservations(client).keys(product.id))
+
+
+@pytest.mark.django_db
+def test_bulk_status_transition(
+    api_client, jwt_token, user, product, django_capture_on_commit_callbacks
+):
+    orders = [
+        create_with_tracking_code(Order, user=user, total_price=10) for _ in range(5)
+    ]
+    for order in orders:
+        OrderItem.objects.create(
+            order=order, product=product, order_item_price=10, quantity=2
+        )
+    Order.objects.filter(pk=orders[0].pk).update(
+        payment_status=Order.PAYMENT_STATUS_COMPLETE
+    )
+    Order.objects.filter(pk=orders[1].pk).update(
+        payment_status=Order.PAYMENT_STATUS_FAILED
+    )
+    events = []
+
+    def receiver(sender, **kwargs):
+        events.append(kwargs)
+
+    orders_status_changed.connect(receiver)
+    api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {jwt_token}")
+    data = {
+        "order_ids": [order.pk for order in orders] + [0],
+        "payment_status": Order.PAYMENT_STATUS_FAILED,
+    }
+    try:
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.post(
+                reverse("orders:orders-status-transitions"), data, format="json"
+            )
+    finally:
+        orders_status_changed.disconnect(receiver)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["updated"] == 3
+    results = {row["id"]: row["result"] for row in response.data["results"]}
+    assert results[orders[0].pk] == "invalid_transition"
+    assert results[orders[1].pk] == "unchanged"
+    assert results[0] == "not_found"
+    assert len(events) == 1
+    assert events[0]["order_ids"] == [order.pk for order in orders[2:]]
+    assert events[0]["from_status"] == Order.PAYMENT_STATUS_PENDING
+    assert Order.objects.filter(payment_status=Order.PAYMENT_STATUS_FAILED).count() == 4
+    product.refresh_from_db()
+    assert product.stock == 16
+
+    # Failed orders gave their stock back, so they can't be re-opened.
+    results = transition_orders([orders[2].pk], Order.PAYMENT_STATUS_PENDING)
+    assert results == {orders[2].pk: "invalid_transition"}
+
+
+@pytest.mark.django_db
+def test_expire_pending_orders_releases_stock(user, product):
+    def place(quantity, hours_ago, payment_status=Order.PAYMENT_STATUS_PENDING):
+        order = create_with_tracking_code(
+            Order, user=user, total_price=quantity * product.price
+        )
+        created_at = timezone.now() - timedelta(hours=hours_ago)
+        Order.objects.filter(pk=order.pk).update(
+            created_at=created_at, payment_status=payment_status
+        )
+        OrderItem.objects.create(
+            order=order,
+            product=product,
+            order_item_price=product.price,
+            quantity=quantity,
+            created_at=created_at,
+        )
+        return order
+
+    stale = [place(1, 3), place(2, 5), place(3, 4)]
+    fresh = place(1, 0)
+    paid = place(4, 6, Order.PAYMENT_STATUS_COMPLETE)
+
+    result = expire_pending_orders(timedelta(hours=1), chunk_size=2)
+
+    assert result == {"orders": 3, "units": 6, "chunks": 2}
+    product.refresh_from_db()
+    assert product.stock == 16
+    statuses = dict(Order.objects.values_list("id", "payment_status"))
+    assert {statuses[order.pk] for order in stale} == {Order.PAYMENT_STATUS_FAILED}
+    assert statuses[fresh.pk] == Order.PAYMENT_STATUS_PENDING
+    assert statuses[paid.pk] == Order.PAYMENT_STATUS_COMPLETE
+
+
+@override_settings(ORDER_SHARDS=["default", "orders_shard_1", "orders_shard_2"])
+def test_shard_for_user_is_stable_and_spreads_users():
+    shards = [shard_for_user(user_id) for user_id in range(300)]
+    assert shards == [shard_for_user(user_id) for user_id in range(300)]
+    assert all(shards.count(alias) > 50 for alias in set(shards))
+    assert len(set(shards)) == 3
+
+    router = OrderShardRouter()
+    order = Order(user_id=7)
+    assert router.db_for_write(Order, instance=order) == shard_for_user(7)
+    assert router.db_for_read(OrderItem) is None
+    assert router.db_for_read(Product) == "default"
+
+
+needs_second_shard = pytest.mark.skipif(
+    "orders_shard_1" not in settings.DATABASES,
+    reason="needs a second database configured as orders_shard_1, "
+    "see swiftorder/test_settings.py",
+)
+
+
+@needs_second_shard
+@pytest.mark.django_db(databases=["default", "orders_shard_1"])
+def test_checkout_places_order_on_buyer_shard(
+    api_client, jwt_token, user, cart, product
+):
+    api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {jwt_token}")
+
+    url = reverse("orders:orders-list")
+
+    with override_settings(
+        ORDER_SHARDS=["orders_shard_1"], SALES_ROLLUP_LAG_SECONDS=0
+    ):
+        response = api_client.post(url, {"cart_id": str(cart.id)}, format="json")
+        assert response.status_code == status.HTTP_201_CREATED
+        assert not Order.objects.using("default").exists()
+        order = Order.objects.using("orders_shard_1").get()
+        assert order.items.count() == 1
+
+        entry = TrackingCodeDirectory.objects.get()
+        assert (entry.shard, entry.order_id) == ("orders_shard_1", order.pk)
+        assert find_order(order.tracking_code) == order
+
+        response = api_client.get(url)
+        assert [row["tracking_code"] for row in response.data["results"]] == [
+            order.tracking_code
+        ]
+
+        transition_orders(
+            [order.pk], Order.PAYMENT_STATUS_COMPLETE, using="orders_shard_1"
+        )
+        assert update_sales_rollups() == 1
+        assert DailySales.objects.get().units == 2
+
+        stale = create_with_tracking_code(
+            Order, using="orders_shard_1", user=user, total_price=0
+        )
+        OrderItem.objects.using("orders_shard_1").create(
+            order=stale, product=product, order_item_price=0, quantity=3
+        )
+        expired = expire_pending_orders(timedelta(0), using="orders_shard_1")
+        assert (expired["orders"], expired["units"]) == (1, 3)
+        product.refresh_from_db()
+        assert product.stock == 11
+
+
+@needs_second_shard
+@pytest.mark.django_db(databases=["default", "orders_shard_1"])
+def test_deletes_respect_orders_on_other_shards(user, product):
+    buyer = get_user_model().objects.create_user(
+        email="buyer@example.com", username="buyer@example.com", password="password"
+    )
+    with override_settings(ORDER_SHARDS=["default", "orders_shard_1"]):
+        order = Order.objects.using("orders_shard_1").create(
+            user=buyer, total_price=0, tracking_code="S1"
+        )
+        OrderItem.objects.using("orders_shard_1").create(
+            order=order, product=product, order_item_price=0, quantity=1
+        )
+        OrderStats.objects.using("orders_shard_1").create(user=buyer, order_count=1)
+
+        # Deletion doesn't use a savepoint, so give each attempt its own.
+        with pytest.raises(ProtectedError), transaction.atomic():
+            product.delete()
+        with pytest.raises(ProtectedError), transaction.atomic():
+            buyer.delete()
+
+        Order.objects.using("orders_shard_1").filter(pk=order.pk).delete()
+        buyer.delete()
+        product.delete()
+        assert not OrderStats.objects.using("orders_shard_1").exists()
+
+
+@needs_second_shard
+@pytest.mark.django_db(databases=["default", "orders_shard_1"])
+def test_order_admin_browses_each_shard(client, user):
+    admin_user = get_user_model().objects.create_superuser(
+        username="root@example.com", email="root@example.com", password="password"
+    )
+    client.force_login(admin_user)
+    url = reverse("admin:orders_order_changelist")
+    with override_settings(ORDER_SHARDS=["default", "orders_shard_1"]):
+        order = Order.objects.using("orders_shard_1").create(
+            user=user, total_price=0, tracking_code="ON-SHARD-1"
+        )
+        assert "ON-SHARD-1" not in client.get(url).content.decode()
+        response = client.get(url, {"shard": "orders_shard_1", "q": "testuser"})
+        assert "ON-SHARD-1" in response.content.decode()
+
+        change_url = reverse("admin:orders_order_change", args=[order.pk])
+        response = client.get(
+            change_url, {"_changelist_filters": "shard=orders_shard_1"}
+        )
+        assert response.status_code == 200
+
+        response = client.get(
+            reverse("admin:orders_orderitem_changelist"), {"shard": "orders_shard_1"}
+        )
+        assert response.status_code == 200
+
+
+@pytest.mark.django_db
+def test_order_admin_loads_buyers_per_page(client, user, product):
+    admin_user = get_user_model().objects.create_superuser(
+        username="root@example.com", email="root@example.com", password="password"
+    )
+    client.force_login(admin_user)
+    url = reverse("admin:orders_orderitem_changelist")
+
+    def changelist_queries():
+        with CaptureQueriesContext(connection) as queries:
+            assert client.get(url).status_code == 200
+        return len(queries)
+
+    order = Order.objects.create(user=user, total_price=10, tracking_code="ADMIN-1")
+    OrderItem.objects.create(order=order, product=product, order_item_price=10, quantity=1)
+    baseline = changelist_queries()
+    for index in range(3):
+        buyer = get_user_model().objects.create_user(
+            username=f"buyer{index}", email=f"buyer{index}@example.com", password="password"
+        )
+        order = Order.objects.create(user=buyer, total_price=10, tracking_code=f"ADMIN-B{index}")
+        OrderItem.objects.create(order=order, product=product, order_item_price=10, quantity=1)
+    assert changelist_queries() == baseline
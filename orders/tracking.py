@@ -0,0 +1,188 @@
+import os
+import random
+import string
+import threading
+import time
+from functools import lru_cache
+from uuid import uuid4
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils.module_loading import import_string
+
+ALPHABET = string.digits + string.ascii_uppercase
+CODE_LENGTH = 16
+
+
+def encode_base36(number, length=CODE_LENGTH):
+    chars = []
+    while number:
+        number, remainder = divmod(number, 36)
+        chars.append(ALPHABET[remainder])
+    return "".join(reversed(chars)).rjust(length, "0")
+
+
+class TrackingCodeGenerator:
+    # Generators that can prove uniqueness on their own skip the
+    # savepoint/retry dance around the unique index.
+    guaranteed_unique = False
+
+    def generate(self):
+        raise NotImplementedError
+
+
+class RandomTrackingCodeGenerator(TrackingCodeGenerator):
+    _random = random.SystemRandom()
+
+    def generate(self):
+        return "".join(self._random.choices(ALPHABET, k=CODE_LENGTH))
+
+
+# KEYS[1] = worker id lease; ARGV = token, ttl. Renews the lease if still ours.
+RENEW_WORKER_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class WorkerIdLease:
+    """
+    A worker id in ``range(2 ** bits)`` leased by this process from Redis.
+
+    Ids are claimed with ``SET NX`` on ``tracking-worker:<id>`` under a
+    random token and expire after ``ttl`` seconds. ``current()`` renews the
+    lease once half the ttl has passed and claims a new id if the lease was
+    lost or the process has forked, so no two live processes use one id.
+    """
+
+    def __init__(self, bits, client=None, ttl=None):
+        from swiftorder.redis_client import get_redis
+
+        self.redis = client or get_redis(settings.ORDER_TRACKING_REDIS_URL)
+        self.size = 1 << bits
+        self.ttl = ttl or settings.ORDER_TRACKING_WORKER_TTL
+        self.renew_script = self.redis.register_script(RENEW_WORKER_SCRIPT)
+        self.worker_id = None
+        self._pid = None
+        self._token = None
+        self._renewed = 0.0
+
+    def key(self, worker_id):
+        return f"tracking-worker:{worker_id}"
+
+    def current(self):
+        now = time.monotonic()
+        if self.worker_id is None or self._pid != os.getpid():
+            self.claim()
+        elif now - self._renewed > self.ttl / 2:
+            if not self.renew_script(
+                keys=[self.key(self.worker_id)], args=[self._token, self.ttl]
+            ):
+                self.claim()
+            self._renewed = now
+        return self.worker_id
+
+    def claim(self):
+        token = uuid4().hex
+        start = self.redis.incr("tracking-worker:next")
+        for offset in range(self.size):
+            worker_id = (start + offset) % self.size
+            if self.redis.set(self.key(worker_id), token, nx=True, ex=self.ttl):
+                self.worker_id = worker_id
+                self._pid = os.getpid()
+                self._token = token
+                self._renewed = time.monotonic()
+                return
+        raise RuntimeError("Every tracking code worker id is leased.")
+
+
+class SequenceTrackingCodeGenerator(TrackingCodeGenerator):
+    """
+    Time-ordered codes built from ``timestamp | worker | sequence``.
+
+    42 bits of milliseconds since ``EPOCH_MS``, a 16 bit worker id and a 22
+    bit per-millisecond sequence are packed into 80 bits and written as 16
+    zero-padded base36 characters, so codes sort by creation time. Every
+    process leases its own worker id (see ``WorkerIdLease``), so codes are
+    unique without consulting the database.
+    """
+
+    guaranteed_unique = True
+
+    EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+    WORKER_BITS = 16
+    SEQUENCE_BITS = 22
+
+    def __init__(self, lease=None):
+        self.lease = lease or WorkerIdLease(self.WORKER_BITS)
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+
+    def _now_ms(self):
+        return time.time_ns() // 1_000_000 - self.EPOCH_MS
+
+    def generate(self):
+        with self._lock:
+            worker_id = self.lease.current()
+            now = max(self._now_ms(), self._last_ms)
+            if now == self._last_ms:
+                self._sequence = (self._sequence + 1) & ((1 << self.SEQUENCE_BITS) - 1)
+                if self._sequence == 0:
+                    while now <= self._last_ms:
+                        now = self._now_ms()
+            else:
+                self._sequence = 0
+            self._last_ms = now
+            value = (
+                (now << (self.WORKER_BITS + self.SEQUENCE_BITS))
+                | (worker_id << self.SEQUENCE_BITS)
+                | self._sequence
+            )
+        return encode_base36(value)
+
+
+GENERATOR_ALIASES = {
+    "random": "orders.tracking.RandomTrackingCodeGenerator",
+    "sequence": "orders.tracking.SequenceTrackingCodeGenerator",
+}
+
+
+@lru_cache(maxsize=None)
+def get_tracking_code_generator(path=None):
+    path = path or getattr(settings, "ORDER_TRACKING_CODE_GENERATOR", "random")
+    return import_string(GENERATOR_ALIASES.get(path, path))()
+
+
+def create_with_tracking_code(
+    model, generator=None, max_attempts=5, using=None, register=None, **fields
+):
+    """
+    Create ``model`` with a fresh tracking code (on database ``using``).
+
+    Random codes rely on a unique index: a collision raises IntegrityError
+    inside a savepoint and the insert is retried with a new code, so no
+    ``exists()`` probe is needed. ``register(obj)`` runs in the same
+    savepoints (on ``using`` and on default) and can enforce uniqueness the
+    table itself can't, such as across shards and partitions.
+    """
+    generator = generator or get_tracking_code_generator()
+    objects = model.objects.using(using) if using else model.objects
+
+    def create():
+        obj = objects.create(tracking_code=generator.generate(), **fields)
+        if register:
+            register(obj)
+        return obj
+
+    if generator.guaranteed_unique:
+        return create()
+
+    for attempt in range(max_attempts):
+        try:
+            with transaction.atomic(using=using), transaction.atomic():
+                return create()
+        except IntegrityError:
+            if attempt == max_attempts - 1:
+                raise
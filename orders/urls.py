@@ -1,14 +1,30 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
 from rest_framework_nested import routers
-from .views import CartViewSet, CartItemViewSet, OrderViewSet
+from .views import (
+    CartViewSet,
+    CartItemViewSet,
+    CheckoutJobViewSet,
+    OrderExportView,
+    OrderStatusTransitionView,
+    OrderViewSet,
+)
 
 app_name = "orders"
 
 router = DefaultRouter()
 router.register("orders", OrderViewSet, basename="orders")
 router.register("carts", CartViewSet, basename="carts")
+router.register("checkout-jobs", CheckoutJobViewSet, basename="checkout-jobs")
 
 carts_router = routers.NestedDefaultRouter(router, "carts", lookup="cart")
 carts_router.register("items", CartItemViewSet, basename="cart-items")
 
-urlpatterns = router.urls + carts_router.urls
+urlpatterns = [
+    path("export/", OrderExportView.as_view(), name="orders-export"),
+    path(
+        "status-transitions/",
+        OrderStatusTransitionView.as_view(),
+        name="orders-status-transitions",
+    ),
+] + router.urls + carts_router.urls
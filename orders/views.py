@@ -2,73 +2,98 @@ from rest_framework import status, viewsets
 from rest_framework.response import Response
 from rest_framework.viewsets import mixins
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
 from rest_framework.decorators import action
-from django.db import transaction
-import random
-import string
-from .models import Cart, CartItem, Order, OrderItem
+from rest_framework.exceptions import NotFound
+from rest_framework.reverse import reverse
+from django.conf import settings
+from django.core.cache import cache
+from django.http import StreamingHttpResponse
+from .carts import cart_version, get_cart_store, parse_cart_id
+from .export import CONTENT_TYPES, export_rows, iter_export
+from .idempotency import idempotent
+from .models import Cart, CartItem, CheckoutJob, Order
+from .pagination import OrderCursorPagination
+from .permissions import IsAdmin
+from .sharding import shard_for_user
+from .services import (
+    CheckoutError,
+    checkout,
+    enqueue_checkout,
+    transition_orders,
+)
 from .serializers import (
     AddCartItemSerializer,
+    BulkCartItemSerializer,
     CartItemSerializer,
     CartSerializer,
+    CheckoutJobSerializer,
     CreateOrderSerializer,
+    OrderExportSerializer,
     OrderSerializer,
+    OrderStatusTransitionSerializer,
+    UpdateCartItemSerializer,
 )
 
 
 class OrderViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
-    queryset = Order.objects.all()
+    pagination_class = OrderCursorPagination
+
+    def get_queryset(self):
+        # Products live on the default database, so they are prefetched
+        # rather than joined to the items on the buyer's shard.
+        return (
+            Order.objects.using(shard_for_user(self.request.user))
+            .filter(user=self.request.user)
+            .prefetch_related("items__product")
+        )
 
     def get_serializer_class(self):
         if self.request.method == "POST":
             return CreateOrderSerializer
         return OrderSerializer
 
+    @idempotent
     def create(self, request, *args, **kwargs):
-        user = request.user
-        cart_id = request.data.get("cart_id")
-
-        if not Cart.objects.filter(pk=cart_id).exists():
-            return Response(
-                {"detail": "Cart not found"}, status=status.HTTP_400_BAD_REQUEST
+        serializer = CreateOrderSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        cart_id = serializer.validated_data["cart_id"]
+        async_checkout = self.is_async_checkout(request)
+
+        try:
+            if async_checkout:
+                job = enqueue_checkout(request.user, cart_id)
+            else:
+                order = checkout(request.user, cart_id)
+        except CheckoutError as exc:
+            return Response(exc.as_data(), status=status.HTTP_400_BAD_REQUEST)
+
+        if async_checkout:
+            status_url = reverse(
+                "orders:checkout-jobs-detail", kwargs={"pk": job.pk}, request=request
             )
-
-        cart = Cart.objects.get(pk=cart_id)
-        if cart.items.count() == 0:
             return Response(
-                {"detail": "Cart is empty"}, status=status.HTTP_400_BAD_REQUEST
+                {"job_id": job.pk, "status": job.status, "status_url": status_url},
+                status=status.HTTP_202_ACCEPTED,
+                headers={"Location": status_url},
             )
+        return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
 
-        def generate_tracking_code():
-            return "".join(random.choices(string.ascii_uppercase + string.digits, k=16))
-
-        tracking_code = generate_tracking_code()
-        while Order.objects.filter(tracking_code=tracking_code).exists():
-            tracking_code = generate_tracking_code()
-
-        with transaction.atomic():
-            total_price = sum(
-                [item.quantity * (item.product.price) for item in cart.items.all()]
-            )
-            order = Order.objects.create(
-                user=user, total_price=total_price, tracking_code=tracking_code
-            )
+    def is_async_checkout(self, request):
+        prefer = request.headers.get("Prefer", "")
+        return settings.ORDER_CHECKOUT_ASYNC or "respond-async" in prefer
 
-            order_items = [
-                OrderItem(
-                    order=order,
-                    product=item.product,
-                    order_item_price=item.product.price or item.product.unit_price,
-                    quantity=item.quantity,
-                )
-                for item in cart.items.all()
-            ]
-            OrderItem.objects.bulk_create(order_items)
 
-            cart.items.all().delete()
+class CheckoutJobViewSet(viewsets.GenericViewSet, mixins.RetrieveModelMixin):
+    permission_classes = [IsAuthenticated]
+    serializer_class = CheckoutJobSerializer
 
-        return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
+    def get_queryset(self):
+        return CheckoutJob.objects.filter(user=self.request.user).prefetch_related(
+            "order__items__product"
+        )
 
 
 class CartViewSet(
@@ -80,29 +105,135 @@ class CartViewSet(
     queryset = Cart.objects.all()
     serializer_class = CartSerializer
 
+    def get_object(self):
+        cart = get_cart_store().get_cart(self.kwargs["pk"])
+        if cart is None:
+            raise NotFound("Cart not found.")
+        return cart
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Serve the cart from cache, keyed by its version, with the version as
+        a strong ETag: a matching If-None-Match gets a 304 without touching
+        the database.
+        """
+        cart_id = parse_cart_id(self.kwargs["pk"])
+        if cart_id is None:
+            raise NotFound("Cart not found.")
+        version = cart_version(cart_id)
+        etag = f'"{version}"'
+        if etag in request.headers.get("If-None-Match", ""):
+            return Response(
+                status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+            )
+
+        cache_key = f"cart:{cart_id}:{version}"
+        data = cache.get(cache_key)
+        if data is None:
+            data = CartSerializer(self.get_object()).data
+            cache.set(cache_key, data, settings.CART_CACHE_TTL)
+        return Response(data, headers={"ETag": etag})
+
     def create(self, request, *args, **kwargs):
-        user = request.user
-        cart = Cart.objects.create()
+        cart = get_cart_store().create_cart()
         return Response(CartSerializer(cart).data, status=status.HTTP_201_CREATED)
 
+    def destroy(self, request, *args, **kwargs):
+        if not get_cart_store().delete_cart(self.kwargs["pk"]):
+            raise NotFound("Cart not found.")
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 
 class CartItemViewSet(viewsets.ModelViewSet):
     queryset = CartItem.objects.all()
 
     def get_serializer_class(self):
+        if self.action == "bulk":
+            return BulkCartItemSerializer
         if self.request.method == "POST":
             return AddCartItemSerializer
+        if self.request.method in ("PUT", "PATCH"):
+            return UpdateCartItemSerializer
         return CartItemSerializer
 
     def get_queryset(self):
-        cart_id = self.kwargs["cart_pk"]
-        return CartItem.objects.filter(cart_id=cart_id)
+        return get_cart_store().get_items(self.kwargs["cart_pk"])
+
+    def get_object(self):
+        item = get_cart_store().get_item(self.kwargs["cart_pk"], self.kwargs["pk"])
+        if item is None:
+            raise NotFound("Cart item not found.")
+        return item
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context["cart_id"] = self.kwargs.get("cart_pk")
         return context
 
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         cart_id = self.kwargs.get("cart_pk")
         serializer.save(cart_id=cart_id)
+
+    def perform_destroy(self, instance):
+        get_cart_store().remove_item(self.kwargs["cart_pk"], instance.pk)
+
+    @action(detail=False, methods=["post"])
+    def bulk(self, request, *args, **kwargs):
+        """
+        Set many lines at once from ``{"items": [{product_id, quantity}, ...]}``
+        (quantity 0 removes a line) and return the updated cart.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        cart = get_cart_store().get_cart(self.kwargs["cart_pk"])
+        return Response(CartSerializer(cart).data)
+
+
+class OrderStatusTransitionView(APIView):
+    permission_classes = [IsAdmin]
+
+    def post(self, request, *args, **kwargs):
+        serializer = OrderStatusTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = transition_orders(
+            serializer.validated_data["order_ids"],
+            serializer.validated_data["payment_status"],
+            using=serializer.validated_data["shard"],
+        )
+        return Response(
+            {
+                "updated": sum(result == "updated" for result in results.values()),
+                "results": [
+                    {"id": order_id, "result": result}
+                    for order_id, result in results.items()
+                ],
+            }
+        )
+
+
+class OrderExportView(APIView):
+    permission_classes = [IsAdmin]
+
+    def get(self, request, *args, **kwargs):
+        params = OrderExportSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        options = params.validated_data
+        file_format = options["file_format"]
+
+        rows = export_rows(
+            date_from=options.get("date_from"),
+            date_to=options.get("date_to"),
+            payment_status=options.get("payment_status"),
+        )
+        response = StreamingHttpResponse(
+            iter_export(rows, file_format, compress=options["gzip"]),
+            content_type=CONTENT_TYPES[file_format],
+        )
+        filename = f"orders.{file_format}" + (".gz" if options["gzip"] else "")
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
@@ -0,0 +1,9 @@
+from django.contrib import admin
+from .models import OutboxEvent
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'task', 'created_at', 'sent_at', 'attempts')
+    list_filter = ('task',)
+    readonly_fields = ('task', 'args', 'kwargs', 'created_at', 'available_at', 'sent_at', 'attempts', 'last_error')
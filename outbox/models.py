@@ -0,0 +1,36 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+class OutboxEvent(models.Model):
+    """
+    A Celery task call recorded in the same transaction as the change that
+    caused it, and published to the broker later by the relay.
+    """
+
+    task = models.CharField(max_length=255, verbose_name="Task")
+    args = models.JSONField(default=list, verbose_name="Args")
+    kwargs = models.JSONField(default=dict, verbose_name="Kwargs")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Created At")
+    available_at = models.DateTimeField(
+        default=timezone.now, verbose_name="Available At"
+    )
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="Sent At")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Attempts")
+    last_error = models.TextField(blank=True, verbose_name="Last Error")
+
+    def __str__(self):
+        return f"{self.task} #{self.pk}"
+
+    class Meta:
+        verbose_name = "Outbox Event"
+        verbose_name_plural = "Outbox Events"
+        indexes = [
+            models.Index(
+                fields=["available_at", "id"],
+                name="outbox_pending_idx",
+                condition=Q(sent_at__isnull=True),
+            ),
+            models.Index(fields=["sent_at"], name="outbox_sent_idx"),
+        ]
@@ -0,0 +1,91 @@
+"""
+Transactional outbox.
+
+Code that must trigger a Celery task as part of a database change calls
+``publish()`` inside its transaction instead of ``task.delay()``: the call is
+stored as an OutboxEvent row that commits (or rolls back) with the change,
+and the request never waits on the broker. The ``relay_outbox`` task drains
+pending rows in batches over one broker connection and marks them sent.
+Delivery is at least once: a crash between publishing and committing
+re-sends the batch, so tasks fed through the outbox must tolerate repeats.
+"""
+import time
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from swiftorder.celery import celery_app
+from .models import OutboxEvent
+
+MAX_RETRY_DELAY = 60 * 60
+
+
+def publish(task, args=(), kwargs=None):
+    """Record a call of the Celery task named ``task`` for the relay."""
+    return OutboxEvent.objects.create(task=task, args=list(args), kwargs=kwargs or {})
+
+
+def relay_outbox(batch_size=100, max_batches=10):
+    """
+    Publish pending events in id order and return how many were sent.
+
+    Each batch is claimed with SKIP LOCKED so several relays can run side by
+    side. Events that fail to publish are retried with exponential backoff.
+    """
+    sent = 0
+    for _ in range(max_batches):
+        with transaction.atomic():
+            events = list(
+                OutboxEvent.objects.select_for_update(skip_locked=True)
+                .filter(sent_at__isnull=True, available_at__lte=timezone.now())
+                .order_by("id")[:batch_size]
+            )
+            if not events:
+                break
+
+            published = []
+            with celery_app.producer_or_acquire() as producer:
+                for event in events:
+                    try:
+                        celery_app.send_task(
+                            event.task,
+                            args=event.args,
+                            kwargs=event.kwargs,
+                            producer=producer,
+                        )
+                    except Exception as exc:
+                        delay = min(2**event.attempts, MAX_RETRY_DELAY)
+                        OutboxEvent.objects.filter(pk=event.pk).update(
+                            attempts=F("attempts") + 1,
+                            last_error=repr(exc),
+                            available_at=timezone.now() + timedelta(seconds=delay),
+                        )
+                    else:
+                        published.append(event.pk)
+
+            OutboxEvent.objects.filter(pk__in=published).update(
+                sent_at=timezone.now()
+            )
+        sent += len(published)
+        if len(events) < batch_size:
+            break
+    return sent
+
+
+def purge_sent_events(older_than, chunk_size=5000, pause=0.1):
+    """Delete events sent before ``older_than`` ago, in id-ordered chunks."""
+    cutoff = timezone.now() - older_than
+    deleted = 0
+    while True:
+        ids = list(
+            OutboxEvent.objects.filter(sent_at__lt=cutoff)
+            .order_by("id")
+            .values_list("id", flat=True)[:chunk_size]
+        )
+        if not ids:
+            break
+        deleted += OutboxEvent.objects.filter(pk__in=ids).delete()[0]
+        if len(ids) < chunk_size:
+            break
+        time.sleep(pause)
+    return deleted
@@ -0,0 +1,24 @@
+import logging
+import time
+from datetime import timedelta
+from celery import shared_task
+from django.conf import settings
+from .relay import purge_sent_events, relay_outbox
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(name="relay_outbox")
+def relay_outbox_task():
+    started = time.monotonic()
+    sent = relay_outbox(batch_size=settings.OUTBOX_RELAY_BATCH_SIZE)
+    if sent:
+        logger.info(
+            "Relayed %s outbox events in %.2fs", sent, time.monotonic() - started
+        )
+    return sent
+
+
+@shared_task(name="purge_outbox")
+def purge_outbox_task():
+    return purge_sent_events(timedelta(days=settings.OUTBOX_RETENTION_DAYS))
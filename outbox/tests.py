@@ -0,0 +1,62 @@
+import pytest
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from outbox.models import OutboxEvent
+from outbox.relay import publish, relay_outbox
+from swiftorder.celery import celery_app
+
+
+@pytest.fixture
+def sent_tasks(monkeypatch):
+    calls = []
+
+    def send_task(name, args=None, kwargs=None, **options):
+        if name == "broken":
+            raise ConnectionError("broker unavailable")
+        calls.append((name, args, kwargs))
+
+    monkeypatch.setattr(celery_app, "send_task", send_task)
+    return calls
+
+
+@pytest.mark.django_db
+def test_publish_rolls_back_with_the_transaction():
+    with pytest.raises(RuntimeError):
+        with transaction.atomic():
+            publish("send_email_to_user", args=["Hi", "Body", ["a@example.com"]])
+            raise RuntimeError
+    assert not OutboxEvent.objects.exists()
+
+
+@pytest.mark.django_db
+def test_relay_publishes_in_batches_and_marks_sent(sent_tasks):
+    for index in range(5):
+        publish("send_order_confirmation", args=[index])
+    publish("broken")
+
+    assert relay_outbox(batch_size=2) == 5
+    assert [call[1] for call in sent_tasks] == [[index] for index in range(5)]
+    assert OutboxEvent.objects.filter(sent_at__isnull=True).count() == 1
+
+    broken = OutboxEvent.objects.get(task="broken")
+    assert broken.attempts == 1
+    assert "broker unavailable" in broken.last_error
+    assert broken.available_at > timezone.now()
+    assert relay_outbox(batch_size=2) == 0
+
+
+@pytest.mark.django_db
+def test_registration_writes_emails_to_the_outbox(sent_tasks):
+    data = {
+        "email": "new@example.com",
+        "username": "new@example.com",
+        "first_name": "New",
+        "last_name": "User",
+        "password": "strongpassword123",
+    }
+    response = APIClient().post(reverse("account:register"), data)
+    assert response.status_code == 201
+    assert OutboxEvent.objects.filter(task="send_email_to_user").count() == 2
+    assert sent_tasks == []
@@ -3,8 +3,8 @@ from .models import Product, Category, ProductCategory
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'price', 'stock', 'created_at', 'updated_at')
-    search_fields = ('name',)
+    list_display = ('id', 'sku', 'name', 'price', 'stock', 'created_at', 'updated_at')
+    search_fields = ('sku', 'name')
     list_filter = ('created_at', 'updated_at')
     ordering = ('-created_at',)
 
@@ -0,0 +1,114 @@
+import hashlib
+import time
+from functools import wraps
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+CATALOG_VERSION_KEY = "catalog-version"
+
+# Names of the cached views, for the hit/miss report.
+CACHED_VIEWS = set()
+
+
+def catalog_version():
+    """
+    Return the current catalog version.
+
+    Every cached catalog response is keyed by it, so bumping the counter
+    (see ``bump_catalog_version``) invalidates all of them at once without
+    touching or scanning the old keys; they simply expire.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        seed_catalog_version()
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def seed_catalog_version():
+    # If the counter is evicted it must not restart at a value older entries
+    # may still be stored under, so it restarts at the current time in ms.
+    cache.add(CATALOG_VERSION_KEY, time.time_ns() // 1_000_000, None)
+
+
+def bump_catalog_version():
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        seed_catalog_version()
+
+
+def catalog_changed():
+    # Readers that commit in between cache the old state under the old
+    # version, so only switch versions once the change is visible.
+    transaction.on_commit(bump_catalog_version)
+
+
+def count(view_name, outcome):
+    key = f"catalog-cache:{view_name}:{outcome}"
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def cache_stats():
+    """Return ``{view name: {"hits": n, "misses": n}}`` for the cached views."""
+    names = sorted(CACHED_VIEWS)
+    counters = cache.get_many(
+        [f"catalog-cache:{name}:{outcome}" for name in names for outcome in ("hits", "misses")]
+    )
+    return {
+        name: {
+            outcome: counters.get(f"catalog-cache:{name}:{outcome}", 0)
+            for outcome in ("hits", "misses")
+        }
+        for name in names
+    }
+
+
+def get_catalog_cache_key(request, view_name):
+    # Query params are sorted so "?page=2&q=x" and "?q=x&page=2" share an
+    # entry; the host is included because pagination links are absolute.
+    params = urlencode(sorted(request.query_params.lists()), doseq=True)
+    digest = hashlib.sha256(
+        f"{request.get_host()}{request.path}?{params}".encode()
+    ).hexdigest()
+    return f"catalog:{catalog_version()}:{view_name}:{digest}"
+
+
+def cached_catalog_response(view_name):
+    """
+    Serve a read-only catalog view from the cache.
+
+    Successful responses are stored for ``CATALOG_CACHE_TTL`` seconds under
+    the catalog version, ``view_name`` and the full query string, so pages
+    and filters are cached separately. Hits and misses are counted per view
+    name and reported through ``X-Cache``.
+    """
+    CACHED_VIEWS.add(view_name)
+
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            cache_key = get_catalog_cache_key(request, view_name)
+            data = cache.get(cache_key)
+            if data is not None:
+                count(view_name, "hits")
+                return Response(data, headers={"X-Cache": "HIT"})
+
+            count(view_name, "misses")
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                cache.set(cache_key, response.data, settings.CATALOG_CACHE_TTL)
+                response["X-Cache"] = "MISS"
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,101 @@
+"""
+Catalog filters and facet counts for the product list.
+
+Facets follow the usual convention that a dimension's counts ignore its own
+filter (picking a category still shows the other categories' counts) but
+honour every other filter. All facets are grouped aggregates combined with
+UNION ALL, so they cost one query however many dimensions there are.
+"""
+from django.db.models import Case, CharField, Count, F, IntegerField, Q, Value, When
+from .models import Product, ProductCategory
+
+# Lower bounds of the price buckets; the last bucket is open-ended.
+PRICE_BUCKETS = (0, 100, 500, 1000, 5000)
+
+
+def product_filters(params, exclude=None):
+    """Return a Q for the validated filter ``params``, skipping ``exclude``."""
+    filters = Q()
+    if params.get("category") and exclude != "category":
+        filters &= Q(
+            id__in=ProductCategory.objects.filter(
+                category_id__in=params["category"]
+            ).values("product_id")
+        )
+    if exclude != "price":
+        if params.get("price_min") is not None:
+            filters &= Q(price__gte=params["price_min"])
+        if params.get("price_max") is not None:
+            filters &= Q(price__lte=params["price_max"])
+    if params.get("in_stock") is not None and exclude != "in_stock":
+        filters &= Q(stock__gt=0) if params["in_stock"] else Q(stock=0)
+    if params.get("created_since") is not None:
+        filters &= Q(created_at__gte=params["created_since"])
+    return filters
+
+
+def price_bucket():
+    return Case(
+        *[
+            When(price__gte=lower, then=Value(index))
+            for index, lower in reversed(list(enumerate(PRICE_BUCKETS)))
+        ],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def product_facets(params):
+    """
+    Return category, price bucket and in-stock counts for ``params`` from a
+    single UNION ALL query.
+    """
+
+    def facet(queryset, name, key):
+        return (
+            queryset.order_by()
+            .annotate(facet=Value(name, output_field=CharField()), key=key)
+            .values("facet", "key")
+            .annotate(count=Count("pk"))
+            .values_list("facet", "key", "count")
+        )
+
+    categories = facet(
+        ProductCategory.objects.filter(
+            product__in=Product.objects.filter(
+                product_filters(params, exclude="category")
+            ).values("pk")
+        ),
+        "category",
+        F("category_id"),
+    )
+    prices = facet(
+        Product.objects.filter(product_filters(params, exclude="price")),
+        "price",
+        price_bucket(),
+    )
+    in_stock = facet(
+        Product.objects.filter(product_filters(params, exclude="in_stock")),
+        "in_stock",
+        Case(When(stock__gt=0, then=Value(1)), default=Value(0), output_field=IntegerField()),
+    )
+
+    counts = {"category": {}, "price": {}, "in_stock": {}}
+    for name, key, count in categories.union(prices, in_stock, all=True):
+        counts[name][key] = count
+
+    bounds = PRICE_BUCKETS + (None,)
+    return {
+        "categories": [
+            {"id": category_id, "count": count}
+            for category_id, count in sorted(counts["category"].items())
+        ],
+        "price": [
+            {"min": bounds[index], "max": bounds[index + 1], "count": count}
+            for index, count in sorted(counts["price"].items())
+        ],
+        "in_stock": {
+            "true": counts["in_stock"].get(1, 0),
+            "false": counts["in_stock"].get(0, 0),
+        },
+    }
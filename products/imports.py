@@ -0,0 +1,288 @@
+"""
+Bulk product import from CSV or NDJSON.
+
+Rows are read as a stream and validated one at a time, then written in
+chunks of ``chunk_size``, so memory depends on the chunk size and not on the
+file size. Products are upserted on ``sku``. Category names are created if
+missing and added to the product's categories; existing memberships are
+kept.
+
+On PostgreSQL each chunk is loaded with ``COPY`` into temporary staging
+tables and merged with three set-based statements: product upsert, category
+insert, and membership insert with the ``product_count`` update. Other
+databases use ``bulk_create`` upserts. The catalog cache version is bumped
+once, after the import.
+"""
+import csv
+import io
+import json
+from django.db import connection, transaction
+from django.utils import timezone
+from .cache import catalog_changed
+from .models import Category, Product, ProductCategory, recount_category_products
+
+IMPORT_FORMATS = ("csv", "ndjson")
+IMPORT_FIELDS = ("sku", "name", "description", "price", "stock")
+# CSV files list categories in one column separated by this character.
+CATEGORY_SEPARATOR = "|"
+
+
+def decode_lines(stream):
+    # Undecodable bytes become lone surrogates instead of aborting the read,
+    # so only the records containing them fail.
+    for line in stream:
+        yield line.decode("utf-8", "surrogateescape")
+
+
+def is_encoded(value):
+    try:
+        value.encode("utf-8")
+        return True
+    except UnicodeEncodeError:
+        return False
+
+
+def iter_records(stream, format):
+    """
+    Yield ``(line number, dict, None)`` for every record of a binary stream,
+    or ``(line number, None, message)`` for records that can't be read.
+    """
+    lines = decode_lines(stream)
+    if format == "csv":
+        reader = csv.DictReader(lines)
+        while True:
+            try:
+                record = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as exc:
+                # The reader doesn't count the line it failed on.
+                yield reader.line_num + 1, None, f"Malformed CSV: {exc}."
+                continue
+            if not all(is_encoded(value) for value in record.values() if value):
+                yield reader.line_num, None, "The record is not valid UTF-8."
+                continue
+            categories = record.get("categories") or ""
+            record["categories"] = [
+                name for name in categories.split(CATEGORY_SEPARATOR) if name
+            ]
+            yield reader.line_num, record, None
+    else:
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            if not is_encoded(line):
+                yield line_number, None, "The record is not valid UTF-8."
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            if isinstance(record, dict):
+                yield line_number, record, None
+            else:
+                yield line_number, None, "Not a valid record."
+
+
+def clean_record(record):
+    """Return ``(row, None)`` for a valid record or ``(None, errors)``."""
+    errors = {}
+    row = {}
+    for field, max_length in (("sku", 64), ("name", 255)):
+        value = str(record.get(field) or "").strip()
+        if not value:
+            errors[field] = "This field is required."
+        elif len(value) > max_length:
+            errors[field] = f"Ensure this field has no more than {max_length} characters."
+        row[field] = value
+    row["description"] = record.get("description") or None
+    for field, default in (("price", None), ("stock", 0)):
+        value = record.get(field)
+        if value in (None, ""):
+            if default is None:
+                errors[field] = "This field is required."
+                continue
+            value = default
+        try:
+            row[field] = int(value)
+            if row[field] < 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            errors[field] = "A non-negative integer is required."
+    categories = record.get("categories") or []
+    if not isinstance(categories, list) or not all(
+        isinstance(name, str) and 0 < len(name) <= 255 for name in categories
+    ):
+        errors["categories"] = "Expected a list of category names."
+    row["categories"] = categories
+    return (None, errors) if errors else (row, None)
+
+
+def import_products(
+    stream, format, user, chunk_size=5000, max_errors=100, progress=None
+):
+    """
+    Import products from a binary ``stream`` in ``format``, owned by ``user``.
+
+    Every chunk commits on its own, so a failure leaves earlier chunks
+    imported (and the catalog cache invalidated for them). ``progress`` is
+    called with the running result after every chunk. Returns
+    ``{"rows", "imported", "failed", "chunks", "errors"}``, where ``errors``
+    lists the first ``max_errors`` invalid rows as
+    ``{"line": n, "errors": {field: message}}``.
+    """
+    result = {"rows": 0, "imported": 0, "failed": 0, "chunks": 0, "errors": []}
+    chunk = {}
+
+    def flush():
+        write_chunk(list(chunk.values()), user)
+        result["imported"] += len(chunk)
+        result["chunks"] += 1
+        chunk.clear()
+        if progress:
+            progress(result)
+
+    try:
+        for line_number, record, problem in iter_records(stream, format):
+            result["rows"] += 1
+            row, errors = (None, {"record": problem}) if problem else clean_record(record)
+            if errors:
+                result["failed"] += 1
+                if len(result["errors"]) < max_errors:
+                    result["errors"].append({"line": line_number, "errors": errors})
+                continue
+            # A sku repeated within a chunk keeps its last row; an upsert
+            # can't touch the same row twice.
+            chunk.pop(row["sku"], None)
+            chunk[row["sku"]] = row
+            if len(chunk) >= chunk_size:
+                flush()
+        if chunk:
+            flush()
+    finally:
+        if result["chunks"]:
+            catalog_changed()
+    return result
+
+
+def write_chunk(rows, user):
+    with transaction.atomic():
+        if connection.vendor == "postgresql":
+            copy_chunk(rows, user)
+        else:
+            bulk_create_chunk(rows, user)
+
+
+def copy_to(cursor, table, columns, rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cursor.copy_expert(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer
+    )
+
+
+def copy_chunk(rows, user):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE TEMP TABLE import_products_stage ("
+            "sku varchar(64), name varchar(255), description text, "
+            "price integer, stock integer) ON COMMIT DROP"
+        )
+        cursor.execute(
+            "CREATE TEMP TABLE import_categories_stage ("
+            "sku varchar(64), category varchar(255)) ON COMMIT DROP"
+        )
+        copy_to(
+            cursor,
+            "import_products_stage",
+            IMPORT_FIELDS,
+            ([row[field] for field in IMPORT_FIELDS] for row in rows),
+        )
+        copy_to(
+            cursor,
+            "import_categories_stage",
+            ("sku", "category"),
+            ((row["sku"], name) for row in rows for name in set(row["categories"])),
+        )
+
+        now = timezone.now()
+        cursor.execute(
+            """
+            INSERT INTO products_product
+                (sku, name, description, price, stock, created_by_id, created_at, updated_at)
+            SELECT sku, name, description, price, stock, %s, %s, %s
+            FROM import_products_stage
+            ON CONFLICT (sku) DO UPDATE SET
+                name = EXCLUDED.name,
+                description = EXCLUDED.description,
+                price = EXCLUDED.price,
+                stock = EXCLUDED.stock,
+                updated_at = EXCLUDED.updated_at
+            """,
+            [user.pk, now, now],
+        )
+        cursor.execute(
+            """
+            INSERT INTO products_category (name, created_at, product_count)
+            SELECT DISTINCT category, %s, 0 FROM import_categories_stage
+            ON CONFLICT (name) DO NOTHING
+            """,
+            [now],
+        )
+        cursor.execute(
+            """
+            WITH added AS (
+                INSERT INTO products_productcategory (product_id, category_id)
+                SELECT p.id, c.id
+                FROM import_categories_stage s
+                JOIN products_product p ON p.sku = s.sku
+                JOIN products_category c ON c.name = s.category
+                ON CONFLICT (product_id, category_id) DO NOTHING
+                RETURNING category_id
+            )
+            UPDATE products_category c
+            SET product_count = c.product_count + a.added
+            FROM (SELECT category_id, COUNT(*) AS added FROM added GROUP BY category_id) a
+            WHERE c.id = a.category_id
+            """
+        )
+
+
+def bulk_create_chunk(rows, user):
+    Product.objects.bulk_create(
+        [
+            Product(created_by=user, **{field: row[field] for field in IMPORT_FIELDS})
+            for row in rows
+        ],
+        update_conflicts=True,
+        unique_fields=["sku"],
+        update_fields=["name", "description", "price", "stock", "updated_at"],
+    )
+    names = {name for row in rows for name in row["categories"]}
+    if not names:
+        return
+
+    Category.objects.bulk_create(
+        [Category(name=name) for name in names], ignore_conflicts=True
+    )
+    product_ids = dict(
+        Product.objects.filter(sku__in=[row["sku"] for row in rows]).values_list(
+            "sku", "id"
+        )
+    )
+    category_ids = dict(
+        Category.objects.filter(name__in=names).values_list("name", "id")
+    )
+    ProductCategory.objects.bulk_create(
+        [
+            ProductCategory(
+                product_id=product_ids[row["sku"]], category_id=category_ids[name]
+            )
+            for row in rows
+            for name in set(row["categories"])
+        ],
+        ignore_conflicts=True,
+    )
+    # bulk_create sends no signals, so recount the touched categories.
+    recount_category_products(Category.objects.filter(id__in=category_ids.values()))
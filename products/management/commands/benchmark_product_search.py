@@ -0,0 +1,92 @@
+import random
+import statistics
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from products.models import Product
+from products.search import search_products
+
+WORDS = (
+    "wireless phone laptop cable charger screen keyboard mouse speaker camera "
+    "lens watch band case cover stand dock adapter battery headphones monitor "
+    "router drive memory card tablet printer ink paper desk chair lamp bulb "
+    "kettle blender toaster pan knife fork spoon plate bottle bag shoe shirt"
+).split()
+
+
+class Command(BaseCommand):
+    help = "Compare full-text product search latency with the ILIKE scan."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--products",
+            type=int,
+            default=1_000_000,
+            help="Seed synthetic products until the catalog has this many.",
+        )
+        parser.add_argument("--runs", type=int, default=20, help="Runs per query.")
+        parser.add_argument(
+            "--query",
+            action="append",
+            help="Search term (repeatable). Defaults to a few catalog words.",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Full-text search needs PostgreSQL.")
+        self.seed(options["products"])
+
+        queries = options["query"] or ["wireless charger", "lamp", "kettle blender"]
+        paths = {
+            "fulltext": lambda term: search_products(term),
+            "ilike": lambda term: list(
+                Product.objects.filter(
+                    Q(name__icontains=term) | Q(description__icontains=term)
+                )
+                .defer("search_vector")
+                .order_by("-id")[:20]
+            ),
+        }
+        for name, search in paths.items():
+            timings = []
+            for term in queries:
+                for _ in range(options["runs"]):
+                    started = time.perf_counter()
+                    search(term)
+                    timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            self.stdout.write(
+                f"{name}: median {statistics.median(timings):.1f}ms, "
+                f"p95 {timings[int(len(timings) * 0.95) - 1]:.1f}ms "
+                f"({len(timings)} searches)"
+            )
+
+    def seed(self, target, batch_size=10_000):
+        missing = target - Product.objects.count()
+        if missing <= 0:
+            return
+        owner = get_user_model().objects.order_by("pk").first()
+        if owner is None:
+            raise CommandError("Need a user to own the seeded products.")
+
+        rng = random.Random(0)
+        self.stdout.write(f"Seeding {missing:,} products...")
+        while missing > 0:
+            size = min(batch_size, missing)
+            Product.objects.bulk_create(
+                [
+                    Product(
+                        name=" ".join(rng.choices(WORDS, k=3)).title(),
+                        description=" ".join(rng.choices(WORDS, k=20)),
+                        price=rng.randint(1, 5000),
+                        stock=rng.randint(0, 100),
+                        created_by=owner,
+                    )
+                    for _ in range(size)
+                ]
+            )
+            missing -= size
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE products_product")
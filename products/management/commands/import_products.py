@@ -0,0 +1,60 @@
+import sys
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from products.imports import IMPORT_FORMATS, import_products
+
+
+class Command(BaseCommand):
+    help = "Upsert products (by sku) and their categories from a CSV or NDJSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Input file, or - for stdin.")
+        parser.add_argument(
+            "--format",
+            choices=IMPORT_FORMATS,
+            help="Defaults to the file extension, or csv for stdin.",
+        )
+        parser.add_argument(
+            "--user", required=True, help="Username recorded as creator of new products."
+        )
+        parser.add_argument("--chunk-size", type=int, default=5000)
+        parser.add_argument("--max-errors", type=int, default=100)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            user = User.objects.get(username=options["user"])
+        except User.DoesNotExist:
+            raise CommandError(f"Unknown user {options['user']!r}.")
+
+        path = options["path"]
+        format = options["format"] or ("ndjson" if path.endswith(".ndjson") else "csv")
+
+        def progress(result):
+            self.stderr.write(
+                f"{result['rows']:,} rows read, {result['imported']:,} imported, "
+                f"{result['failed']:,} failed"
+            )
+
+        if path == "-":
+            result = self.run(sys.stdin.buffer, format, user, options, progress)
+        else:
+            with open(path, "rb") as stream:
+                result = self.run(stream, format, user, options, progress)
+
+        for error in result["errors"]:
+            self.stderr.write(f"line {error['line']}: {error['errors']}")
+        self.stdout.write(
+            f"Imported {result['imported']:,} of {result['rows']:,} rows "
+            f"in {result['chunks']} chunks ({result['failed']:,} failed)."
+        )
+
+    def run(self, stream, format, user, options, progress):
+        return import_products(
+            stream,
+            format,
+            user,
+            chunk_size=options["chunk_size"],
+            max_errors=options["max_errors"],
+            progress=progress,
+        )
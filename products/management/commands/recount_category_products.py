@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from products.models import Category, recount_category_products
+
+
+class Command(BaseCommand):
+    help = "Recompute Category.product_count from the ProductCategory table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--category", type=int, action="append", help="Category id (repeatable)."
+        )
+
+    def handle(self, *args, **options):
+        categories = Category.objects.all()
+        if options["category"]:
+            categories = categories.filter(pk__in=options["category"])
+        updated = recount_category_products(categories)
+        self.stdout.write(f"Recounted products for {updated} categories.")
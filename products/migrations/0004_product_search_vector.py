@@ -0,0 +1,76 @@
+# Generated by Django 4.2.9 on 2026-10-18 12:22
+"""
+Add a full-text search vector to products (PostgreSQL only for the trigger
+and GIN index; the column is a plain unused field elsewhere).
+
+A BEFORE INSERT/UPDATE trigger keeps search_vector in sync with name and
+description, so bulk writes and raw SQL are covered too. Existing rows are
+backfilled in one UPDATE before the GIN index is built; both lock the table,
+so run it in a quiet window on large catalogs.
+"""
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+TRIGGER_SQL = """
+CREATE FUNCTION products_product_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER products_product_search_vector_update
+    BEFORE INSERT OR UPDATE OF name, description ON products_product
+    FOR EACH ROW EXECUTE FUNCTION products_product_search_vector();
+
+UPDATE products_product SET search_vector =
+    setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(description, '')), 'B');
+
+CREATE INDEX product_search_idx ON products_product USING gin (search_vector);
+"""
+
+DROP_TRIGGER_SQL = """
+DROP INDEX IF EXISTS product_search_idx;
+DROP TRIGGER IF EXISTS products_product_search_vector_update ON products_product;
+DROP FUNCTION IF EXISTS products_product_search_vector();
+"""
+
+
+def create_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(TRIGGER_SQL)
+
+
+def drop_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(DROP_TRIGGER_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_alter_product_description_alter_product_price_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        # The GIN index only exists on PostgreSQL; it is created with the
+        # trigger below, so only the model state records it here.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='product',
+                    index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='product_search_idx'),
+                ),
+            ],
+        ),
+        migrations.RunPython(create_search_trigger, drop_search_trigger),
+    ]
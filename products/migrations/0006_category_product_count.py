@@ -0,0 +1,40 @@
+# Generated by Django 4.2.9 on 2026-10-18 12:25
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_products(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    ProductCategory = apps.get_model('products', 'ProductCategory')
+    counts = (
+        ProductCategory.objects.filter(category=OuterRef('pk'))
+        .order_by()
+        .values('category')
+        .annotate(count=Count('pk'))
+        .values('count')
+    )
+    Category.objects.update(
+        product_count=Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='productcategory',
+            index=models.Index(fields=['category', 'product'], name='productcategory_category_idx'),
+        ),
+        migrations.RunPython(count_products, migrations.RunPython.noop),
+    ]
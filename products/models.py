@@ -1,7 +1,12 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db.models.functions import Coalesce
 
 class Product(models.Model):
+    # Supplier stock keeping unit; the key bulk imports upsert on.
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     name = models.CharField(max_length=255)
     description = models.TextField(null=True, blank=True)
     price = models.PositiveIntegerField(default=0)
@@ -9,6 +14,23 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     created_by = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
     updated_at = models.DateTimeField(auto_now=True)
+    # Weighted tsvector of name (A) and description (B), maintained by a
+    # database trigger on PostgreSQL (see migration 0004); NULL elsewhere.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"], name="product_search_idx"),
+            # Catalog filters (products.filters): price ranges, newest
+            # first, and the common "in stock only" listing.
+            models.Index(fields=["price", "id"], name="product_price_idx"),
+            models.Index(fields=["created_at", "id"], name="product_created_idx"),
+            models.Index(
+                fields=["created_at", "id"],
+                condition=models.Q(stock__gt=0),
+                name="product_in_stock_created_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -18,6 +40,8 @@ class Category(models.Model):
     name = models.CharField(max_length=255, unique=True)
     description = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Number of ProductCategory rows, kept up to date by products.signals.
+    product_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.name
@@ -29,3 +53,27 @@ class ProductCategory(models.Model):
 
     class Meta:
         unique_together = ('product', 'category')
+        indexes = [
+            # Category listings scan a category's products in id order.
+            models.Index(fields=['category', 'product'], name='productcategory_category_idx'),
+        ]
+
+
+def recount_category_products(categories):
+    """
+    Recompute ``product_count`` for a Category queryset in one UPDATE, for
+    writes that bypass the ProductCategory signals (bulk_create, queryset
+    updates). Returns the number of categories updated.
+    """
+    counts = (
+        ProductCategory.objects.filter(category=models.OuterRef("pk"))
+        .order_by()
+        .values("category")
+        .annotate(count=models.Count("pk"))
+        .values("count")
+    )
+    return categories.update(
+        product_count=Coalesce(
+            models.Subquery(counts, output_field=models.IntegerField()), 0
+        )
+    )
@@ -0,0 +1,61 @@
+"""
+Product search.
+
+On PostgreSQL, products are matched against the trigger-maintained
+``search_vector`` (GIN indexed) with a websearch-style query and ranked with
+``ts_rank``. Other databases fall back to an unranked ``ILIKE`` scan over
+name and description. Results are ordered by ``(rank, id)`` descending and
+paginated with a keyset on that pair, so deep pages cost the same as the
+first one.
+"""
+import base64
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F, FloatField, Q, Value
+from .models import Product, ProductCategory
+
+SEARCH_CONFIG = "english"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(rank, product_id):
+    return base64.urlsafe_b64encode(f"{rank!r}:{product_id}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        rank, product_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        return float(rank), int(product_id)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor(cursor)
+
+
+def search_products(query, category_id=None, after=None, limit=20):
+    """
+    Return up to ``limit`` products matching ``query`` with a ``rank``
+    annotation, best first, optionally within a category and after the
+    ``(rank, id)`` keyset ``after``.
+    """
+    if connection.vendor == "postgresql":
+        search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type="websearch")
+        products = Product.objects.filter(search_vector=search_query).annotate(
+            rank=SearchRank(F("search_vector"), search_query)
+        )
+    else:
+        products = Product.objects.filter(
+            Q(name__icontains=query) | Q(description__icontains=query)
+        ).annotate(rank=Value(0.0, output_field=FloatField()))
+
+    if category_id is not None:
+        products = products.filter(
+            id__in=ProductCategory.objects.filter(category_id=category_id).values(
+                "product_id"
+            )
+        )
+    if after is not None:
+        rank, product_id = after
+        products = products.filter(Q(rank__lt=rank) | Q(rank=rank, id__lt=product_id))
+    return list(products.defer("search_vector").order_by("-rank", "-id")[:limit])
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from .imports import IMPORT_FORMATS
 from .models import Product, Category
 
 
@@ -7,6 +8,7 @@ class ProductSerializer(serializers.ModelSerializer):
         model = Product
         fields = [
             "id",
+            "sku",
             "name",
             "description",
             "price",
@@ -20,4 +22,30 @@ class ProductSerializer(serializers.ModelSerializer):
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
-        fields = ["id", "name", "description"]
+        fields = ["id", "name", "description", "product_count"]
+
+
+class ProductSearchParamsSerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=200)
+    category = serializers.IntegerField(required=False)
+    cursor = serializers.CharField(required=False)
+    page_size = serializers.IntegerField(min_value=1, max_value=100, default=20)
+
+
+class ProductFilterSerializer(serializers.Serializer):
+    category = serializers.ListField(child=serializers.IntegerField(), required=False)
+    price_min = serializers.IntegerField(min_value=0, required=False)
+    price_max = serializers.IntegerField(min_value=0, required=False)
+    in_stock = serializers.BooleanField(required=False, allow_null=True, default=None)
+    created_since = serializers.DateTimeField(required=False)
+
+
+class ProductImportSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    format = serializers.ChoiceField(choices=IMPORT_FORMATS, required=False)
+
+    def validate(self, attrs):
+        if "format" not in attrs:
+            name = attrs["file"].name or ""
+            attrs["format"] = "ndjson" if name.endswith(".ndjson") else "csv"
+        return attrs
@@ -0,0 +1,48 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .cache import catalog_changed
+from .models import Category, Product, ProductCategory
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+def invalidate_catalog_cache(sender, **kwargs):
+    catalog_changed()
+
+
+@receiver(pre_save, sender=ProductCategory)
+def remember_category(sender, instance, raw=False, **kwargs):
+    instance._previous_category_id = None
+    if not raw and not instance._state.adding:
+        instance._previous_category_id = (
+            ProductCategory.objects.filter(pk=instance.pk)
+            .values_list("category_id", flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=ProductCategory)
+def count_added_product(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, "_previous_category_id", None)
+    if created or (previous is not None and previous != instance.category_id):
+        Category.objects.filter(pk=instance.category_id).update(
+            product_count=F("product_count") + 1
+        )
+    if not created and previous is not None and previous != instance.category_id:
+        Category.objects.filter(pk=previous, product_count__gt=0).update(
+            product_count=F("product_count") - 1
+        )
+
+
+@receiver(post_delete, sender=ProductCategory)
+def count_removed_product(sender, instance, **kwargs):
+    Category.objects.filter(pk=instance.category_id, product_count__gt=0).update(
+        product_count=F("product_count") - 1
+    )
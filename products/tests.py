@@ -1,11 +1,25 @@
+import csv
 import pytest
+import time
+from io import BytesIO, StringIO
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from rest_framework.test import APIClient
 from django.urls import reverse
 from account.models import CustomUser
+from products.cache import CATALOG_VERSION_KEY, bump_catalog_version, catalog_version
+from products import imports
+from products.imports import import_products
 from products.models import Product, Category, ProductCategory
 from rest_framework_simplejwt.tokens import RefreshToken
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
 @pytest.fixture
 def user():
     return CustomUser.objects.create_user(
@@ -111,3 +125,212 @@ def test_product_create_permission_denied(api_client, user, token):
     }
     response = api_client.post(url, data, format="json")
     assert response.status_code == 403
+
+
+@pytest.mark.django_db
+def test_catalog_responses_are_cached_per_version_and_query(
+    api_client, token, user, product, django_capture_on_commit_callbacks
+):
+    url = reverse("products:all-products-list")
+    assert api_client.get(url)["X-Cache"] == "MISS"
+    assert api_client.get(url)["X-Cache"] == "HIT"
+    assert api_client.get(url, {"page": 1})["X-Cache"] == "MISS"
+
+    with django_capture_on_commit_callbacks(execute=True):
+        product.name = "Renamed"
+        product.save()
+    response = api_client.get(url)
+    assert response["X-Cache"] == "MISS"
+    assert response.data["results"][0]["name"] == "Renamed"
+
+    api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+    response = api_client.get(reverse("products:catalog_cache_stats"))
+    assert response.status_code == 200
+    assert response.data["views"]["products-list"] == {"hits": 1, "misses": 3}
+    assert response.data["views"]["categories-list"] == {"hits": 0, "misses": 0}
+
+
+@pytest.mark.django_db
+def test_product_search_filters_and_keyset_paginates(api_client, user, category):
+    phones = [
+        Product.objects.create(name=f"Phone {index}", price=100, created_by=user)
+        for index in range(3)
+    ]
+    Product.objects.create(name="Laptop", description="no match", created_by=user)
+    ProductCategory.objects.create(product=phones[0], category=category)
+    url = reverse("products:product_search")
+
+    response = api_client.get(url, {"q": "phone", "page_size": 2})
+    assert response.status_code == 200
+    assert [row["id"] for row in response.data["results"]] == [phones[2].id, phones[1].id]
+    response = api_client.get(response.data["next"])
+    assert [row["id"] for row in response.data["results"]] == [phones[0].id]
+    assert response.data["next"] is None
+
+    response = api_client.get(url, {"q": "phone", "category": category.id})
+    assert [row["id"] for row in response.data["results"]] == [phones[0].id]
+
+    assert api_client.get(url, {"q": "phone", "cursor": "x"}).status_code == 400
+    assert api_client.get(url).status_code == 400
+
+
+@pytest.mark.django_db
+def test_product_list_filters_and_facets_in_one_query(
+    api_client, user, category, django_assert_num_queries
+):
+    other = Category.objects.create(name="Books")
+    cheap = Product.objects.create(name="Cable", price=50, stock=3, created_by=user)
+    phone = Product.objects.create(name="Phone", price=700, stock=0, created_by=user)
+    laptop = Product.objects.create(name="Laptop", price=1500, stock=2, created_by=user)
+    ProductCategory.objects.create(product=cheap, category=category)
+    ProductCategory.objects.create(product=phone, category=category)
+    ProductCategory.objects.create(product=laptop, category=other)
+    url = reverse("products:all-products-list")
+
+    # page count + page + facets
+    with django_assert_num_queries(3):
+        response = api_client.get(url, {"category": category.id, "in_stock": "true"})
+    assert [row["name"] for row in response.data["results"]] == ["Cable"]
+    facets = response.data["facets"]
+    assert facets["categories"] == [
+        {"id": category.id, "count": 1},
+        {"id": other.id, "count": 1},
+    ]
+    assert facets["in_stock"] == {"true": 1, "false": 1}
+    assert facets["price"] == [{"min": 0, "max": 100, "count": 1}]
+
+    response = api_client.get(url, {"price_min": 100, "price_max": 1000})
+    assert [row["name"] for row in response.data["results"]] == ["Phone"]
+    assert api_client.get(url, {"price_min": -1}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_products_by_category_counts_and_cursor_pages(
+    api_client, user, category, django_assert_max_num_queries
+):
+    products = [
+        Product.objects.create(name=f"Item {index}", created_by=user)
+        for index in range(12)
+    ]
+    for product in products:
+        ProductCategory.objects.create(product=product, category=category)
+    ProductCategory.objects.filter(product=products[0]).delete()
+    category.refresh_from_db()
+    assert category.product_count == 11
+
+    url = reverse("products:products_by_category", args=[category.id])
+    with django_assert_max_num_queries(2):
+        response = api_client.get(url)
+    assert response.data["count"] == 11
+    assert response.data["results"][0]["id"] == products[-1].id
+    response = api_client.get(response.data["next"])
+    assert [row["id"] for row in response.data["results"]] == [products[1].id]
+
+    missing = reverse("products:products_by_category", args=[category.id + 100])
+    assert api_client.get(missing).status_code == 404
+
+
+@pytest.mark.django_db
+def test_import_products_command_upserts_by_sku(tmp_path, user, product, category):
+    product.sku = "SKU-1"
+    product.save()
+    path = tmp_path / "catalog.csv"
+    path.write_text(
+        "sku,name,description,price,stock,categories\n"
+        "SKU-1,Smartphone 2,Newer,1200,4,Electronics|Phones\n"
+        "SKU-2,Case,,20,100,Phones\n"
+        "SKU-3,,,x,1,\n"
+    )
+    out, err = StringIO(), StringIO()
+
+    call_command(
+        "import_products", str(path), user=user.username, chunk_size=1, stdout=out, stderr=err
+    )
+
+    assert "Imported 2 of 3 rows in 2 chunks (1 failed)" in out.getvalue()
+    assert "line 4" in err.getvalue()
+    product.refresh_from_db()
+    assert (product.name, product.price, product.stock) == ("Smartphone 2", 1200, 4)
+    phones = Category.objects.get(name="Phones")
+    assert phones.product_count == 2
+    assert Category.objects.get(pk=category.pk).product_count == 1
+    assert Product.objects.get(sku="SKU-2").description is None
+
+
+@pytest.mark.django_db
+def test_import_products_upload_reports_row_errors(api_client, token):
+    api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+    upload = SimpleUploadedFile(
+        "catalog.ndjson",
+        b'{"sku": "A", "name": "Lamp", "price": 30, "categories": ["Home"]}\n'
+        b'{"sku": "B", "name": "Desk", "price": -1}\nnot json\n'
+        b'{"sku": "C", "name": "\xff"}\n'
+        b'{"sku": "D", "name": "Chair", "stock": 3}\n',
+    )
+
+    response = api_client.post(
+        reverse("products:product_import"), {"file": upload}, format="multipart"
+    )
+
+    assert response.status_code == 200
+    assert response.data["imported"] == 1
+    assert [error["line"] for error in response.data["errors"]] == [2, 3, 4, 5]
+    assert response.data["errors"][3]["errors"] == {"price": "This field is required."}
+    assert Product.objects.get(sku="A").categories.get().category.name == "Home"
+
+
+def test_catalog_version_does_not_restart_after_eviction():
+    version = catalog_version()
+    bump_catalog_version()
+    cache.delete(CATALOG_VERSION_KEY)
+    time.sleep(0.01)
+    assert catalog_version() > version + 1
+
+
+@pytest.mark.django_db
+def test_category_product_count_follows_moves_and_recount(product, category):
+    other = Category.objects.create(name="Phones")
+    membership = ProductCategory.objects.get(product=product)
+    membership.category = other
+    membership.save()
+    assert Category.objects.get(pk=category.pk).product_count == 0
+    assert Category.objects.get(pk=other.pk).product_count == 1
+
+    ProductCategory.objects.update(category=category)
+    call_command("recount_category_products", stdout=StringIO())
+    assert Category.objects.get(pk=category.pk).product_count == 1
+    assert Category.objects.get(pk=other.pk).product_count == 0
+
+
+@pytest.mark.django_db
+def test_import_products_survives_bad_csv_and_bumps_catalog_on_failure(
+    user, monkeypatch
+):
+    data = (
+        b"sku,name,price\n"
+        b"A,Lamp,10\n"
+        b'B,"' + b"x" * 200 + b'",10\n'
+        b"C,Bad \xff byte,10\n"
+        b"D,Desk,20\n"
+    )
+    old_limit = csv.field_size_limit(100)
+    try:
+        result = import_products(BytesIO(data), "csv", user, chunk_size=1)
+    finally:
+        csv.field_size_limit(old_limit)
+    assert (result["imported"], result["failed"]) == (2, 2)
+    assert [error["line"] for error in result["errors"]] == [3, 4]
+
+    bumps = []
+    writes = []
+
+    def write_chunk(rows, user):
+        writes.append(rows)
+        if len(writes) == 2:
+            raise RuntimeError("database went away")
+
+    monkeypatch.setattr(imports, "catalog_changed", lambda: bumps.append(1))
+    monkeypatch.setattr(imports, "write_chunk", write_chunk)
+    with pytest.raises(RuntimeError):
+        import_products(BytesIO(b"sku,name,price\nE,Lamp,10\nF,Desk,20\n"), "csv", user, chunk_size=1)
+    assert bumps == [1]
@@ -1,6 +1,14 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ProductViewSet, CategoryViewSet, ProductByCategoryView, ProductListViewSet
+from .views import (
+    CatalogCacheStatsView,
+    CategoryViewSet,
+    ProductByCategoryView,
+    ProductImportView,
+    ProductListViewSet,
+    ProductSearchView,
+    ProductViewSet,
+)
 
 app_name="products"
 
@@ -12,4 +20,7 @@ router.register(r'list', ProductListViewSet, basename='all-products')
 urlpatterns = [
     path('', include(router.urls)),
     path('by-category/<int:category_id>/', ProductByCategoryView.as_view(), name='products_by_category'),
+    path('search/', ProductSearchView.as_view(), name='product_search'),
+    path('import/', ProductImportView.as_view(), name='product_import'),
+    path('cache-stats/', CatalogCacheStatsView.as_view(), name='catalog_cache_stats'),
 ]
@@ -1,10 +1,48 @@
+from functools import wraps
 from rest_framework.viewsets import mixins, ModelViewSet, ReadOnlyModelViewSet
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, BasePermission, IsAdminUser
-from rest_framework.pagination import PageNumberPagination
+from django.conf import settings
+from django.shortcuts import get_object_or_404
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
+from orders.permissions import IsAdmin
+from .cache import cache_stats, cached_catalog_response, catalog_version
+from .filters import product_facets, product_filters
+from .imports import import_products
 from .models import Product, Category, ProductCategory
-from .serializers import ProductSerializer, CategorySerializer
+from .search import InvalidCursor, decode_cursor, encode_cursor, search_products
+from .serializers import (
+    CategorySerializer,
+    ProductFilterSerializer,
+    ProductImportSerializer,
+    ProductSearchParamsSerializer,
+    ProductSerializer,
+)
+
+
+def available_stock_response(view_method):
+    """
+    Show stock net of cart holds when ``CART_RESERVATIONS`` is on.
+
+    Holds change far more often than the catalog, so they are subtracted
+    from every response, cached or not, instead of being cached with it.
+    """
+
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        response = view_method(self, request, *args, **kwargs)
+        if settings.CART_RESERVATIONS and response.status_code == 200:
+            from orders.reservations import subtract_holds
+
+            data = response.data
+            subtract_holds(data["results"] if "results" in data else [data])
+        return response
+
+    return wrapper
 
 
 class ProductListViewSet(ReadOnlyModelViewSet):
@@ -12,25 +50,143 @@ class ProductListViewSet(ReadOnlyModelViewSet):
     serializer_class = ProductSerializer
     permission_classes = [AllowAny]
 
+    def get_filter_params(self):
+        params = ProductFilterSerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        return params.validated_data
+
+    def get_queryset(self):
+        queryset = super().get_queryset().defer("search_vector")
+        if self.action == "list":
+            queryset = queryset.filter(product_filters(self.get_filter_params()))
+        return queryset
+
+    @available_stock_response
+    @cached_catalog_response("products-list")
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        response.data["facets"] = product_facets(self.get_filter_params())
+        return response
+
+    @available_stock_response
+    @cached_catalog_response("products-detail")
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
 class CategoryViewSet(ReadOnlyModelViewSet):
     queryset = Category.objects.all().order_by("name")
     serializer_class = CategorySerializer
     permission_classes = [AllowAny]
 
+    @cached_catalog_response("categories-list")
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cached_catalog_response("categories-detail")
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+
+class ProductByCategoryPagination(CursorPagination):
+    page_size = 10
+    ordering = "-product_id"
+
 
 class ProductByCategoryView(APIView):
+    """
+    Products of one category, newest first.
+
+    Pages walk the (category, product) index with a cursor instead of an
+    offset, and the total comes from Category.product_count, so every page
+    costs the same regardless of category size or depth.
+    """
+
+    @available_stock_response
+    @cached_catalog_response("products-by-category")
     def get(self, request, category_id, *args, **kwargs):
-        category = Category.objects.get(id=category_id)
-        paginator = PageNumberPagination()
-        paginator.page_size = 10
-        product_categories = ProductCategory.objects.filter(category=category)
-        products = Product.objects.filter(
-            id__in=product_categories.values("product_id")
+        category = get_object_or_404(Category, id=category_id)
+        paginator = ProductByCategoryPagination()
+        memberships = (
+            ProductCategory.objects.filter(category=category)
+            .select_related("product")
+            .defer("product__search_vector")
+        )
+        result_page = paginator.paginate_queryset(memberships, request, view=self)
+        serializer = ProductSerializer(
+            [membership.product for membership in result_page], many=True
         )
-        result_page = paginator.paginate_queryset(products, request)
-        serializer = ProductSerializer(result_page, many=True)
-        return paginator.get_paginated_response(serializer.data)
+        response = paginator.get_paginated_response(serializer.data)
+        response.data["count"] = category.product_count
+        return response
+
+
+class ProductSearchView(APIView):
+    """Full-text product search, best match first, keyset paginated."""
+
+    permission_classes = [AllowAny]
+
+    @available_stock_response
+    @cached_catalog_response("products-search")
+    def get(self, request, *args, **kwargs):
+        params = ProductSearchParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+        after = None
+        if "cursor" in data:
+            try:
+                after = decode_cursor(data["cursor"])
+            except InvalidCursor:
+                raise ValidationError({"cursor": ["Invalid cursor."]})
+
+        # One extra row tells whether there is a next page.
+        products = search_products(
+            data["q"],
+            category_id=data.get("category"),
+            after=after,
+            limit=data["page_size"] + 1,
+        )
+        next_url = None
+        if len(products) > data["page_size"]:
+            products = products[: data["page_size"]]
+            last = products[-1]
+            next_url = replace_query_param(
+                request.build_absolute_uri(),
+                "cursor",
+                encode_cursor(last.rank, last.id),
+            )
+        return Response(
+            {"next": next_url, "results": ProductSerializer(products, many=True).data}
+        )
+
+
+class ProductImportView(APIView):
+    """
+    Upload a CSV or NDJSON product file for a synchronous bulk import.
+
+    Large uploads are spooled to a temporary file by Django, and the import
+    reads it as a stream, so memory stays bounded.
+    """
+
+    permission_classes = [IsAdmin]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, *args, **kwargs):
+        serializer = ProductImportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = import_products(
+            serializer.validated_data["file"],
+            serializer.validated_data["format"],
+            request.user,
+        )
+        return Response(result)
+
+
+class CatalogCacheStatsView(APIView):
+    permission_classes = [IsAdmin]
+
+    def get(self, request, *args, **kwargs):
+        return Response({"version": catalog_version(), "views": cache_stats()})
 
 
 class IsAdminOrShopAdmin(BasePermission):
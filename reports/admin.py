@@ -0,0 +1,29 @@
+from django.contrib import admin
+from .models import DailySales, DailyProductSales, DailyCategorySales, RollupWatermark
+
+
+@admin.register(DailySales)
+class DailySalesAdmin(admin.ModelAdmin):
+    list_display = ('date', 'units', 'revenue')
+    ordering = ('-date',)
+
+
+@admin.register(DailyProductSales)
+class DailyProductSalesAdmin(admin.ModelAdmin):
+    list_display = ('date', 'product', 'units', 'revenue')
+    list_select_related = ('product',)
+    raw_id_fields = ('product',)
+    ordering = ('-date',)
+
+
+@admin.register(DailyCategorySales)
+class DailyCategorySalesAdmin(admin.ModelAdmin):
+    list_display = ('date', 'category', 'units', 'revenue')
+    list_select_related = ('category',)
+    list_filter = ('category',)
+    ordering = ('-date',)
+
+
+@admin.register(RollupWatermark)
+class RollupWatermarkAdmin(admin.ModelAdmin):
+    list_display = ('name', 'last_id', 'updated_at')
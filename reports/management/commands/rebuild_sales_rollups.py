@@ -0,0 +1,20 @@
+import time
+from django.core.management.base import BaseCommand
+from reports.rollups import rebuild_sales_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily sales rollups from all order items."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--days-per-chunk", type=int, default=7)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        chunks = rebuild_sales_rollups(
+            workers=options["workers"], days_per_chunk=options["days_per_chunk"]
+        )
+        self.stdout.write(
+            f"Rebuilt {chunks} chunks in {time.monotonic() - started:.1f}s."
+        )
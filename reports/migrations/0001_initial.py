@@ -0,0 +1,72 @@
+# Generated by Django 4.2.9 on 2026-10-18 11:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('products', '0003_alter_product_description_alter_product_price_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('date', models.DateField(primary_key=True, serialize=False, verbose_name='Date')),
+                ('units', models.PositiveBigIntegerField(default=0, verbose_name='Units')),
+                ('revenue', models.PositiveBigIntegerField(default=0, verbose_name='Revenue')),
+            ],
+            options={
+                'verbose_name': 'Daily Sales',
+                'verbose_name_plural': 'Daily Sales',
+            },
+        ),
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False, verbose_name='Name')),
+                ('last_id', models.BigIntegerField(default=0, verbose_name='Last Order Item ID')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+            ],
+            options={
+                'verbose_name': 'Rollup Watermark',
+                'verbose_name_plural': 'Rollup Watermarks',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('units', models.PositiveBigIntegerField(default=0, verbose_name='Units')),
+                ('revenue', models.PositiveBigIntegerField(default=0, verbose_name='Revenue')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='products.product', verbose_name='Product')),
+            ],
+            options={
+                'verbose_name': 'Daily Product Sales',
+                'verbose_name_plural': 'Daily Product Sales',
+                'indexes': [models.Index(fields=['date'], name='reports_dai_date_d33736_idx')],
+                'unique_together': {('product', 'date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyCategorySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('units', models.PositiveBigIntegerField(default=0, verbose_name='Units')),
+                ('revenue', models.PositiveBigIntegerField(default=0, verbose_name='Revenue')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='products.category', verbose_name='Category')),
+            ],
+            options={
+                'verbose_name': 'Daily Category Sales',
+                'verbose_name_plural': 'Daily Category Sales',
+                'indexes': [models.Index(fields=['date'], name='reports_dai_date_72119e_idx')],
+                'unique_together': {('category', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+from django.db import models
+from products.models import Category, Product
+
+
+class DailySales(models.Model):
+    date = models.DateField(primary_key=True, verbose_name="Date")
+    units = models.PositiveBigIntegerField(default=0, verbose_name="Units")
+    revenue = models.PositiveBigIntegerField(default=0, verbose_name="Revenue")
+
+    class Meta:
+        verbose_name = "Daily Sales"
+        verbose_name_plural = "Daily Sales"
+
+
+class DailyProductSales(models.Model):
+    date = models.DateField(verbose_name="Date")
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name="daily_sales",
+        verbose_name="Product",
+    )
+    units = models.PositiveBigIntegerField(default=0, verbose_name="Units")
+    revenue = models.PositiveBigIntegerField(default=0, verbose_name="Revenue")
+
+    class Meta:
+        verbose_name = "Daily Product Sales"
+        verbose_name_plural = "Daily Product Sales"
+        unique_together = [["product", "date"]]
+        indexes = [models.Index(fields=["date"])]
+
+
+class DailyCategorySales(models.Model):
+    date = models.DateField(verbose_name="Date")
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name="daily_sales",
+        verbose_name="Category",
+    )
+    units = models.PositiveBigIntegerField(default=0, verbose_name="Units")
+    revenue = models.PositiveBigIntegerField(default=0, verbose_name="Revenue")
+
+    class Meta:
+        verbose_name = "Daily Category Sales"
+        verbose_name_plural = "Daily Category Sales"
+        unique_together = [["category", "date"]]
+        indexes = [models.Index(fields=["date"])]
+
+
+class RollupWatermark(models.Model):
+    """Highest OrderItem id already folded into the rollups."""
+
+    name = models.CharField(max_length=50, primary_key=True, verbose_name="Name")
+    last_id = models.BigIntegerField(default=0, verbose_name="Last Order Item ID")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Updated At")
+
+    class Meta:
+        verbose_name = "Rollup Watermark"
+        verbose_name_plural = "Rollup Watermarks"
@@ -0,0 +1,247 @@
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Count, F, Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from orders.models import Order, OrderItem
+from orders.sharding import order_shards
+from products.models import ProductCategory
+from .models import DailyCategorySales, DailyProductSales, DailySales, RollupWatermark
+
+SALES_WATERMARK = "sales"
+
+# Only paid orders count as sales. Pending orders are skipped when the
+# watermark passes them and folded in by ``fold_completed_orders`` once paid.
+
+# (rollup model, rollup key attnames)
+ROLLUPS = (
+    (DailySales, ("date",)),
+    (DailyProductSales, ("date", "product_id")),
+    (DailyCategorySales, ("date", "category_id")),
+)
+
+
+def fold_items(items):
+    """
+    Aggregate ``items`` per day/product/category and write them to the rollups.
+
+    Items are summed per day and product in SQL on their own database; day
+    and category totals are derived from those rows, with product categories
+    read from the default database, since order items may live on another
+    shard than the catalog. Rows are added to the existing totals in one
+    upsert per rollup (the rebuild clears its range first).
+    """
+    rows = (
+        items.order_by()
+        .annotate(day=TruncDate("created_at"))
+        .values("day", "product_id")
+        .annotate(
+            units=Sum("quantity"),
+            revenue=Sum(F("quantity") * F("order_item_price")),
+        )
+    )
+    by_product = {
+        (row["day"], row["product_id"]): (row["units"], row["revenue"]) for row in rows
+    }
+    if not by_product:
+        return
+
+    categories = defaultdict(list)
+    for product_id, category_id in ProductCategory.objects.filter(
+        product_id__in={product_id for _, product_id in by_product}
+    ).values_list("product_id", "category_id"):
+        categories[product_id].append(category_id)
+
+    by_day = defaultdict(lambda: [0, 0])
+    by_category = defaultdict(lambda: [0, 0])
+    for (day, product_id), (units, revenue) in by_product.items():
+        for key, totals in [((day,), by_day)] + [
+            ((day, category_id), by_category) for category_id in categories[product_id]
+        ]:
+            totals[key][0] += units
+            totals[key][1] += revenue
+
+    for (model, key_fields), totals in zip(ROLLUPS, (by_day, by_product, by_category)):
+        if totals:
+            write_rollup(model, key_fields, dict(totals))
+
+
+def write_rollup(model, key_fields, totals, batch_size=1000):
+    # Folds for different shards don't share a lock, so the totals are added
+    # in the upsert itself rather than read, summed and written back.
+    connection = connections[DEFAULT_DB_ALIAS]
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    fields = [model._meta.get_field(name) for name in key_fields]
+    columns = ", ".join(quote(field.column) for field in fields)
+    rows = [
+        [
+            field.get_db_prep_value(value, connection)
+            for field, value in zip(fields, key)
+        ]
+        + list(amounts)
+        for key, amounts in totals.items()
+    ]
+    placeholders = f"({', '.join(['%s'] * (len(fields) + 2))})"
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start : start + batch_size]
+            cursor.execute(
+                f"""
+                INSERT INTO {table} ({columns}, units, revenue)
+                VALUES {", ".join([placeholders] * len(batch))}
+                ON CONFLICT ({columns}) DO UPDATE SET
+                    units = {table}.units + EXCLUDED.units,
+                    revenue = {table}.revenue + EXCLUDED.revenue
+                """,
+                [value for row in batch for value in row],
+            )
+
+
+def watermark_name(shard):
+    return SALES_WATERMARK if shard == DEFAULT_DB_ALIAS else f"{SALES_WATERMARK}:{shard}"
+
+
+def lock_watermark(shard=DEFAULT_DB_ALIAS):
+    name = watermark_name(shard)
+    RollupWatermark.objects.get_or_create(name=name)
+    return RollupWatermark.objects.select_for_update().get(name=name)
+
+
+def settled_items(shard=DEFAULT_DB_ALIAS):
+    # Items younger than the lag may still belong to uncommitted transactions
+    # with lower ids; leave them for the next run so none is skipped.
+    cutoff = timezone.now() - timedelta(seconds=settings.SALES_ROLLUP_LAG_SECONDS)
+    return OrderItem.objects.using(shard).filter(created_at__lt=cutoff)
+
+
+def sold_items(shard=DEFAULT_DB_ALIAS):
+    return OrderItem.objects.using(shard).filter(
+        order__payment_status=Order.PAYMENT_STATUS_COMPLETE
+    )
+
+
+def fold_completed_orders(order_ids, shard=DEFAULT_DB_ALIAS):
+    """
+    Fold the items of orders about to be marked paid that the watermark has
+    already passed; later items are left to ``update_sales_rollups``.
+
+    Runs in the status change transaction, before the UPDATE: the watermark
+    lock makes the incremental job and the rebuild either finish first (and
+    see the orders unpaid) or wait for the commit (and see them paid), so
+    every item is counted exactly once.
+    """
+    watermark = lock_watermark(shard)
+    fold_items(
+        OrderItem.objects.using(shard).filter(
+            order_id__in=order_ids, id__lte=watermark.last_id
+        )
+    )
+
+
+def update_sales_rollups(batch_size=5000, max_batches=20):
+    """
+    Fold items of paid orders created since the watermark into the rollups.
+
+    Every order shard has its own watermark. Work is done in batches of
+    ``batch_size`` items, each in its own transaction that also advances the
+    watermark. Returns the number of items processed.
+    """
+    processed = 0
+    for shard in order_shards():
+        for _ in range(max_batches):
+            with transaction.atomic():
+                watermark = lock_watermark(shard)
+                batch = (
+                    settled_items(shard)
+                    .filter(id__gt=watermark.last_id)
+                    .order_by("id")[:batch_size]
+                    .aggregate(upper=Max("id"), count=Count("id"))
+                )
+                if not batch["count"]:
+                    break
+
+                fold_items(
+                    sold_items(shard).filter(
+                        id__gt=watermark.last_id, id__lte=batch["upper"]
+                    )
+                )
+                watermark.last_id = batch["upper"]
+                watermark.save(update_fields=["last_id", "updated_at"])
+                processed += batch["count"]
+    return processed
+
+
+def rebuild_range(start, end, upper_ids):
+    bounds = [
+        timezone.make_aware(datetime.combine(day, time.min)) for day in (start, end)
+    ]
+    with transaction.atomic():
+        for model, _ in ROLLUPS:
+            model.objects.filter(date__gte=start, date__lt=end).delete()
+        for shard, upper_id in upper_ids.items():
+            fold_items(
+                sold_items(shard).filter(
+                    id__lte=upper_id,
+                    created_at__gte=bounds[0],
+                    created_at__lt=bounds[1],
+                )
+            )
+
+
+def rebuild_range_in_thread(chunk):
+    try:
+        rebuild_range(*chunk)
+    finally:
+        connections.close_all()
+
+
+def rebuild_sales_rollups(workers=4, days_per_chunk=7):
+    """
+    Recompute every rollup from scratch in parallel date-range chunks.
+
+    The watermark rows stay locked for the whole rebuild so the incremental
+    job waits instead of double counting; afterwards each watermark points at
+    the last item of its shard included. Returns the number of chunks rebuilt.
+    """
+    with transaction.atomic():
+        watermarks = {shard: lock_watermark(shard) for shard in order_shards()}
+        upper_ids = {}
+        first = last = None
+        for shard in watermarks:
+            settled = settled_items(shard)
+            upper_ids[shard] = settled.aggregate(upper=Max("id"))["upper"] or 0
+            span = settled.filter(id__lte=upper_ids[shard]).aggregate(
+                first=Min("created_at"), last=Max("created_at")
+            )
+            if span["first"]:
+                first = min(first or span["first"], span["first"])
+                last = max(last or span["last"], span["last"])
+
+        chunks = []
+        if first:
+            day = timezone.localdate(first)
+            while day <= timezone.localdate(last):
+                chunks.append((day, day + timedelta(days=days_per_chunk), upper_ids))
+                day += timedelta(days=days_per_chunk)
+
+        if workers > 1 and len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(rebuild_range_in_thread, chunks))
+        else:
+            for chunk in chunks:
+                rebuild_range(*chunk)
+
+        for model, _ in ROLLUPS:
+            stale = model.objects.all()
+            if chunks:
+                stale = stale.exclude(date__gte=chunks[0][0], date__lt=chunks[-1][1])
+            stale.delete()
+
+        for shard, watermark in watermarks.items():
+            watermark.last_id = upper_ids[shard]
+            watermark.save(update_fields=["last_id", "updated_at"])
+    return len(chunks)
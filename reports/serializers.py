@@ -0,0 +1,21 @@
+from datetime import timedelta
+from django.utils import timezone
+from rest_framework import serializers
+
+
+class SalesRangeSerializer(serializers.Serializer):
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        attrs.setdefault("date_to", timezone.localdate())
+        attrs.setdefault("date_from", attrs["date_to"] - timedelta(days=29))
+        if attrs["date_from"] > attrs["date_to"]:
+            raise serializers.ValidationError("date_from must not be after date_to")
+        return attrs
+
+
+class SalesPointSerializer(serializers.Serializer):
+    date = serializers.DateField()
+    units = serializers.IntegerField()
+    revenue = serializers.IntegerField()
@@ -0,0 +1,11 @@
+from django.dispatch import receiver
+from orders.models import Order
+from orders.signals import orders_status_changing
+from .rollups import fold_completed_orders
+
+
+@receiver(orders_status_changing, sender=Order)
+def fold_paid_orders(sender, order_ids, to_status, using, **kwargs):
+    # Paid orders never change status again, so nothing is ever unfolded.
+    if to_status == Order.PAYMENT_STATUS_COMPLETE:
+        fold_completed_orders(order_ids, using)
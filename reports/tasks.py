@@ -0,0 +1,19 @@
+import logging
+import time
+from celery import shared_task
+from django.conf import settings
+from .rollups import update_sales_rollups
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(name="update_sales_rollups")
+def update_sales_rollups_task():
+    started = time.monotonic()
+    processed = update_sales_rollups(batch_size=settings.SALES_ROLLUP_BATCH_SIZE)
+    logger.info(
+        "Folded %s order items into sales rollups in %.2fs",
+        processed,
+        time.monotonic() - started,
+    )
+    return processed
@@ -0,0 +1,140 @@
+import pytest
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from orders.models import Order, OrderItem
+from products.models import Category, Product, ProductCategory
+from reports.models import DailyCategorySales, DailyProductSales, DailySales
+from orders.services import transition_orders
+from reports.rollups import fold_items, rebuild_sales_rollups, update_sales_rollups
+
+
+@pytest.fixture
+def user():
+    return get_user_model().objects.create_user(
+        email="admin@example.com",
+        username="admin@example.com",
+        password="password",
+        role="admin",
+    )
+
+
+@pytest.fixture
+def api_client(user):
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client
+
+
+@pytest.fixture
+def product(user):
+    product = Product.objects.create(name="Phone", price=100, stock=10, created_by=user)
+    category = Category.objects.create(name="Electronics")
+    ProductCategory.objects.create(product=product, category=category)
+    return product
+
+
+@pytest.fixture
+def sell(user, product):
+    def make_sale(quantity, days_ago=1, payment_status=Order.PAYMENT_STATUS_COMPLETE):
+        created_at = timezone.now() - timedelta(days=days_ago)
+        order = Order.objects.create(
+            user=user,
+            total_price=quantity * 100,
+            tracking_code=f"T{Order.objects.count()}",
+            payment_status=payment_status,
+        )
+        return OrderItem.objects.create(
+            order=order,
+            product=product,
+            order_item_price=100,
+            quantity=quantity,
+            created_at=created_at,
+        )
+
+    return make_sale
+
+
+def rollup_snapshot():
+    return [
+        sorted(model.objects.values_list("date", "units", "revenue"))
+        for model in (DailySales, DailyProductSales, DailyCategorySales)
+    ]
+
+
+@pytest.mark.django_db
+def test_update_sales_rollups_is_incremental(sell, product):
+    sell(2, days_ago=2)
+    sell(1, days_ago=1)
+    assert update_sales_rollups() == 2
+
+    sell(3, days_ago=1)
+    sell(5, days_ago=0)  # still inside the settling lag
+    OrderItem.objects.filter(quantity=5).update(created_at=timezone.now())
+    assert update_sales_rollups() == 1
+
+    yesterday = (timezone.now() - timedelta(days=1)).date()
+    assert DailySales.objects.get(date=yesterday).units == 4
+    assert DailyProductSales.objects.get(date=yesterday, product=product).revenue == 400
+    assert DailyCategorySales.objects.get(date=yesterday).units == 4
+
+
+@pytest.mark.django_db
+def test_rollups_count_orders_once_they_are_paid(sell):
+    pending = Order.PAYMENT_STATUS_PENDING
+    late = sell(2, payment_status=pending)
+    early = sell(3, payment_status=pending)
+    sell(7, payment_status=Order.PAYMENT_STATUS_FAILED)
+    transition_orders([early.order_id], Order.PAYMENT_STATUS_COMPLETE)
+    assert update_sales_rollups() == 3
+    assert DailySales.objects.get().units == 3
+
+    # Paid after the watermark passed it: folded by the status change.
+    transition_orders([late.order_id], Order.PAYMENT_STATUS_COMPLETE)
+    assert DailySales.objects.get().units == 5
+    assert update_sales_rollups() == 0
+
+    incremental = rollup_snapshot()
+    rebuild_sales_rollups(workers=1)
+    assert rollup_snapshot() == incremental
+
+
+@pytest.mark.django_db
+def test_folds_add_to_existing_rows(sell, product):
+    sell(2)
+    # Two folds of the same day, as from two shards, must both count.
+    fold_items(OrderItem.objects.all())
+    fold_items(OrderItem.objects.all())
+    assert DailySales.objects.get().units == 4
+    assert DailyProductSales.objects.get(product=product).revenue == 400
+    assert DailyCategorySales.objects.get().units == 4
+
+
+@pytest.mark.django_db
+def test_rebuild_matches_incremental(sell):
+    for days_ago, quantity in [(20, 1), (9, 2), (9, 3), (1, 4)]:
+        sell(quantity, days_ago=days_ago)
+    update_sales_rollups(batch_size=1)
+    incremental = rollup_snapshot()
+
+    DailySales.objects.update(units=0)
+    rebuild_sales_rollups(workers=1, days_per_chunk=3)
+    assert rollup_snapshot() == incremental
+    assert update_sales_rollups() == 0
+
+
+@pytest.mark.django_db
+def test_sales_series_endpoint(api_client, sell, product):
+    sell(2, days_ago=1)
+    update_sales_rollups()
+
+    response = api_client.get(reverse("reports:sales"))
+    assert response.status_code == 200
+    assert response.data["units"] == 2
+    assert response.data["revenue"] == 200
+
+    url = reverse("reports:product_sales", args=[product.id])
+    response = api_client.get(url, {"date_from": str(timezone.localdate())})
+    assert response.data["results"] == []
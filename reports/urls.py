@@ -0,0 +1,10 @@
+from django.urls import path
+from .views import CategorySalesView, ProductSalesView, SalesSeriesView
+
+app_name = "reports"
+
+urlpatterns = [
+    path("sales/", SalesSeriesView.as_view(), name="sales"),
+    path("sales/products/<int:product_id>/", ProductSalesView.as_view(), name="product_sales"),
+    path("sales/categories/<int:category_id>/", CategorySalesView.as_view(), name="category_sales"),
+]
@@ -0,0 +1,48 @@
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from orders.permissions import IsAdmin
+from .models import DailyCategorySales, DailyProductSales, DailySales
+from .serializers import SalesPointSerializer, SalesRangeSerializer
+
+
+class SalesSeriesView(APIView):
+    permission_classes = [IsAdmin]
+    model = DailySales
+
+    def get_queryset(self, **kwargs):
+        return self.model.objects.all()
+
+    def get(self, request, *args, **kwargs):
+        params = SalesRangeSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        points = (
+            self.get_queryset(**kwargs)
+            .filter(
+                date__gte=params.validated_data["date_from"],
+                date__lte=params.validated_data["date_to"],
+            )
+            .order_by("date")
+            .values("date", "units", "revenue")
+        )
+        data = SalesPointSerializer(points, many=True).data
+        return Response(
+            {
+                "units": sum(point["units"] for point in data),
+                "revenue": sum(point["revenue"] for point in data),
+                "results": data,
+            }
+        )
+
+
+class ProductSalesView(SalesSeriesView):
+    model = DailyProductSales
+
+    def get_queryset(self, product_id):
+        return self.model.objects.filter(product_id=product_id)
+
+
+class CategorySalesView(SalesSeriesView):
+    model = DailyCategorySales
+
+    def get_queryset(self, category_id):
+        return self.model.objects.filter(category_id=category_id)
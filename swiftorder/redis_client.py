@@ -0,0 +1,8 @@
+from functools import lru_cache
+import redis
+
+
+@lru_cache(maxsize=None)
+def get_redis(url):
+    """Return a shared client (and connection pool) for ``url``."""
+    return redis.Redis.from_url(url, decode_responses=True)
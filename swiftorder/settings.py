@@ -49,6 +49,8 @@ INSTALLED_APPS = [
     "orders",
     "payments",
     "products",
+    "reports",
+    "outbox",
 ]
 
 MIDDLEWARE = [
@@ -98,6 +100,23 @@ DATABASES = {
     }
 }
 
+# Databases holding orders, order items and order stats, picked per buyer by
+# orders.sharding.shard_for_user. Aliases other than "default" are configured
+# from DB_<ALIAS>_NAME/_USER/_PASSWORD/_HOST/_PORT, falling back to the
+# default database's values.
+ORDER_SHARDS = os.getenv("ORDER_SHARDS", "default").split(",")
+for alias in ORDER_SHARDS:
+    if alias not in DATABASES:
+        DATABASES[alias] = {
+            **DATABASES["default"],
+            **{
+                key: os.getenv(f"DB_{alias.upper()}_{key}")
+                for key in ("NAME", "USER", "PASSWORD", "HOST", "PORT")
+                if os.getenv(f"DB_{alias.upper()}_{key}")
+            },
+        }
+DATABASE_ROUTERS = ["orders.sharding.OrderShardRouter"]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -173,6 +192,105 @@ CELERY_BROKER_URL = "redis://redis:6379/0"
 CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_BACKEND = "django-db"
+CELERY_TASK_ROUTES = {
+    "process_checkout_jobs": {"queue": "checkout"},
+}
+CELERY_BEAT_SCHEDULE = {
+    "update-sales-rollups": {
+        "task": "update_sales_rollups",
+        "schedule": 60.0,
+    },
+    "relay-outbox": {
+        "task": "relay_outbox",
+        "schedule": 2.0,
+    },
+    "purge-outbox": {
+        "task": "purge_outbox",
+        "schedule": 60.0 * 60 * 24,
+    },
+    "expire-pending-orders": {
+        "task": "expire_pending_orders",
+        "schedule": 60.0 * 5,
+    },
+    "reap-stuck-checkout-jobs": {
+        "task": "reap_stuck_checkout_jobs",
+        "schedule": 60.0,
+    },
+    "purge-abandoned-carts": {
+        "task": "purge_abandoned_carts",
+        "schedule": 60.0 * 60,
+    },
+}
+
+# Orders
+# "random" relies on the unique index and retries on collision, "sequence"
+# emits time-ordered codes that are unique by construction: every process
+# leases its own worker id from Redis on ORDER_TRACKING_REDIS_URL, renewed
+# while in use and released ORDER_TRACKING_WORKER_TTL seconds after it stops.
+ORDER_TRACKING_CODE_GENERATOR = os.getenv("ORDER_TRACKING_CODE_GENERATOR", "random")
+ORDER_TRACKING_REDIS_URL = os.getenv(
+    "ORDER_TRACKING_REDIS_URL",
+    f"redis://{os.getenv('REDIS_HOST', 'redis_cache')}:{os.getenv('REDIS_PORT', '6379')}/2",
+)
+ORDER_TRACKING_WORKER_TTL = int(os.getenv("ORDER_TRACKING_WORKER_TTL", "300"))
+# Return 202 + a checkout job for every order instead of only for requests
+# sent with "Prefer: respond-async".
+ORDER_CHECKOUT_ASYNC = os.getenv("ORDER_CHECKOUT_ASYNC", "False") == "True"
+ORDER_CHECKOUT_BATCH_SIZE = int(os.getenv("ORDER_CHECKOUT_BATCH_SIZE", "20"))
+# Checkout jobs still processing this many seconds after a worker picked
+# them up are marked failed by reap_stuck_checkout_jobs.
+ORDER_CHECKOUT_JOB_TIMEOUT = int(os.getenv("ORDER_CHECKOUT_JOB_TIMEOUT", "300"))
+# Pending orders older than this are failed and their stock released by the
+# expire_pending_orders task, ORDER_EXPIRY_CHUNK_SIZE orders per transaction.
+ORDER_PENDING_EXPIRE_MINUTES = int(os.getenv("ORDER_PENDING_EXPIRE_MINUTES", "60"))
+ORDER_EXPIRY_CHUNK_SIZE = int(os.getenv("ORDER_EXPIRY_CHUNK_SIZE", "500"))
+
+# Monthly partitions of the orders tables (PostgreSQL only), maintained by
+# the manage_order_partitions command.
+ORDER_PARTITION_MONTHS_AHEAD = int(os.getenv("ORDER_PARTITION_MONTHS_AHEAD", "3"))
+ORDER_PARTITION_RETAIN_MONTHS = int(os.getenv("ORDER_PARTITION_RETAIN_MONTHS", "24"))
+
+# Sales rollups: items younger than the lag are left for the next run so
+# late-committing transactions are never skipped by the watermark.
+SALES_ROLLUP_LAG_SECONDS = int(os.getenv("SALES_ROLLUP_LAG_SECONDS", "60"))
+SALES_ROLLUP_BATCH_SIZE = int(os.getenv("SALES_ROLLUP_BATCH_SIZE", "5000"))
+
+# Carts: "orm" keeps them in the database, "redis" keeps each cart in a
+# Redis hash that expires CART_REDIS_TTL seconds after its last change.
+CART_STORE_BACKEND = os.getenv("CART_STORE_BACKEND", "orm")
+CART_REDIS_URL = os.getenv(
+    "CART_REDIS_URL",
+    f"redis://{os.getenv('REDIS_HOST', 'redis_cache')}:{os.getenv('REDIS_PORT', '6379')}/2",
+)
+CART_REDIS_TTL = int(os.getenv("CART_REDIS_TTL", str(60 * 60 * 24 * 7)))
+# Hold stock in Redis (on CART_REDIS_URL) for every cart line for
+# CART_RESERVATION_TTL seconds after its last change; see orders.reservations.
+CART_RESERVATIONS = os.getenv("CART_RESERVATIONS", "False") == "True"
+CART_RESERVATION_TTL = int(os.getenv("CART_RESERVATION_TTL", str(15 * 60)))
+# Cached cart representations, keyed by a version that every cart change
+# bumps. Product price edits don't bump it, so this also bounds how long a
+# cart can show an old price.
+CART_CACHE_TTL = int(os.getenv("CART_CACHE_TTL", "300"))
+# Database carts untouched for CART_EXPIRE_DAYS are deleted hourly in chunks
+# of CART_PURGE_CHUNK_SIZE with a pause between chunks.
+CART_EXPIRE_DAYS = int(os.getenv("CART_EXPIRE_DAYS", "30"))
+CART_PURGE_CHUNK_SIZE = int(os.getenv("CART_PURGE_CHUNK_SIZE", "1000"))
+CART_PURGE_PAUSE_SECONDS = float(os.getenv("CART_PURGE_PAUSE_SECONDS", "0.5"))
+
+# Transactional outbox: events published per relay batch, and how long sent
+# events are kept.
+OUTBOX_RELAY_BATCH_SIZE = int(os.getenv("OUTBOX_RELAY_BATCH_SIZE", "100"))
+OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", "7"))
+
+# Anonymous catalog responses (product list, categories, products by
+# category) are cached under a version that product/category changes bump.
+# Stock decrements at checkout don't bump it, so this also bounds how stale
+# a listed stock level can be.
+CATALOG_CACHE_TTL = int(os.getenv("CATALOG_CACHE_TTL", "600"))
+
+# Idempotency-Key replay window and in-flight lock lifetime, in seconds.
+IDEMPOTENCY_KEY_TTL = int(os.getenv("IDEMPOTENCY_KEY_TTL", str(60 * 60 * 24)))
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT", "60"))
 
 CACHES = {
     "default": {
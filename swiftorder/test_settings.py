@@ -0,0 +1,29 @@
+"""
+Settings for running the test suite without PostgreSQL or Redis:
+
+    python -m pytest --ds=swiftorder.test_settings
+
+Both ``default`` and a second order shard, ``orders_shard_1``, are in-memory
+SQLite databases, so the cross-shard tests run too. ``ORDER_SHARDS`` stays
+``["default"]``; those tests put buyers on the second shard explicitly.
+"""
+from .settings import *  # noqa: F401,F403
+
+SECRET_KEY = "test"
+DEBUG = False
+
+DATABASES = {
+    alias: {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}
+    for alias in ("default", "orders_shard_1")
+}
+ORDER_SHARDS = ["default"]
+
+CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+# The rate limiter talks to Redis directly and needs a shared cache.
+MIDDLEWARE = [name for name in MIDDLEWARE if "ratelimit" not in name]  # noqa: F405
+SILENCED_SYSTEM_CHECKS = ["django_ratelimit.E003", "django_ratelimit.W001"]
+
+CELERY_TASK_ALWAYS_EAGER = True
+CELERY_BROKER_URL = "memory://"
+CELERY_RESULT_BACKEND = "cache+memory://"
+EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
@@ -60,6 +60,7 @@ urlpatterns = [
     path("orders/", include("orders.urls", namespace="orders")),
     path("payments/", include("payments.urls", namespace="payments")),
     path("products/", include("products.urls", namespace="products")),
+    path("reports/", include("reports.urls", namespace="reports")),
 ]
 
 if settings.DEBUG: